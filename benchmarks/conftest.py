@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import shutil
+import textwrap
+from typing import TYPE_CHECKING
+
+import pytest
+
+from pytask_stata.shared import STATA_COMMANDS
+from tests.conftest import SysModulesSnapshot
+from tests.conftest import SysPathsSnapshot
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+
+LARGE_N_TASKS = 10_000
+"""Projects with at least this many tasks only run with ``--benchmark-large``."""
+
+_TASK_MODULE = """
+import pytask
+from pathlib import Path
+
+{tasks}
+"""
+
+_TASK_FUNCTION = """
+@pytask.mark.stata(script=Path("script_{i}.do"))
+def task_{i}(produces=Path("data/out_{i}.dta")):
+    pass
+"""
+
+_PARAMETRIZED_TASK_MODULE = """
+import pytask
+from pathlib import Path
+from pytask import task
+
+for i in range({n_tasks}):
+
+    @task(id=str(i))
+    @pytask.mark.stata(script=Path("script.do"), options=f"data/out_{{i}}")
+    def task_example(produces=Path(f"data/out_{{i}}.dta")):
+        pass
+"""
+
+_TASKS_PER_MODULE = 100
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--benchmark-large",
+        action="store_true",
+        help=f"Run benchmarks of projects with {LARGE_N_TASKS:,} tasks.",
+    )
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: list[pytest.Item]
+) -> None:
+    if config.getoption("--benchmark-large"):
+        return
+    skip = pytest.mark.skip(reason="Needs --benchmark-large.")
+    for item in items:
+        callspec = getattr(item, "callspec", None)
+        if callspec and callspec.params.get("n_tasks", 0) >= LARGE_N_TASKS:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _mock_stata() -> None:
+    """Require the mock Stata such that benchmarks measure the plugin, not Stata."""
+    if not any(shutil.which(executable) for executable in STATA_COMMANDS):
+        pytest.skip("Benchmarks need the stata-mock package on PATH.")
+
+
+@pytest.fixture
+def restore_modules() -> Callable[[], None]:
+    """Return a function which unloads task modules imported by a benchmark round.
+
+    pytask does not import a task module again if it is already loaded, so every round
+    must start without the modules of the previous round.
+
+    """
+    sys_path_snapshot = SysPathsSnapshot()
+    sys_modules_snapshot = SysModulesSnapshot()
+
+    def restore() -> None:
+        sys_modules_snapshot.restore()
+        sys_path_snapshot.restore()
+
+    yield restore
+    restore()
+
+
+def create_project(
+    root: Path, n_tasks: int, layout: str = "functions", log_lines: int = 0
+) -> Path:
+    """Create a project with Stata tasks.
+
+    Parameters
+    ----------
+    root
+        The directory of the project.
+    n_tasks
+        The number of Stata tasks.
+    layout
+        ``"functions"`` defines one function and do-file per task in modules with up to
+        100 tasks. ``"parametrized"`` defines all tasks in a loop sharing one do-file.
+    log_lines
+        The number of lines every do-file displays to inflate its log.
+
+    """
+    display = "".join(f'display "line {i}"\n' for i in range(log_lines))
+
+    if layout == "functions":
+        root.mkdir(parents=True, exist_ok=True)
+        for i in range(n_tasks):
+            root.joinpath(f"script_{i}.do").write_text(f"{display}save data/out_{i}\n")
+        for start in range(0, n_tasks, _TASKS_PER_MODULE):
+            tasks = "".join(
+                _TASK_FUNCTION.format(i=i)
+                for i in range(start, min(start + _TASKS_PER_MODULE, n_tasks))
+            )
+            root.joinpath(f"task_{start}.py").write_text(
+                textwrap.dedent(_TASK_MODULE.format(tasks=tasks))
+            )
+
+    elif layout == "parametrized":
+        root.mkdir(parents=True, exist_ok=True)
+        root.joinpath("script.do").write_text(f"args out\n{display}save `out'\n")
+        root.joinpath("task_example.py").write_text(
+            textwrap.dedent(_PARAMETRIZED_TASK_MODULE.format(n_tasks=n_tasks))
+        )
+
+    else:
+        msg = f"Unknown layout {layout!r}."
+        raise ValueError(msg)
+
+    return root
@@ -0,0 +1,77 @@
+"""Benchmark the collection of Stata tasks."""
+
+from __future__ import annotations
+
+import statistics
+from pathlib import Path
+
+import pytask
+import pytest
+from pytask import ExitCode
+from pytask import build
+
+from benchmarks.conftest import LARGE_N_TASKS
+from benchmarks.conftest import create_project
+
+
+@pytest.mark.parametrize("layout", ["functions", "parametrized"])
+@pytest.mark.parametrize("n_tasks", [10, 1_000, 10_000])
+def test_collection(benchmark, restore_modules, tmp_path, n_tasks, layout):
+    """Measure a dry run and report the time spent collecting tasks."""
+    root = create_project(tmp_path, n_tasks, layout)
+    durations = []
+
+    def run():
+        session = build(paths=root, dry_run=True)
+        assert session.exit_code == ExitCode.OK
+        assert len(session.tasks) == n_tasks
+        durations.append(session.collection_end - session.collection_start)
+
+    benchmark.group = f"collection-{layout}"
+    benchmark.pedantic(
+        run, setup=restore_modules, rounds=3 if n_tasks < LARGE_N_TASKS else 1
+    )
+
+    benchmark.extra_info["n_tasks"] = n_tasks
+    benchmark.extra_info["collection_time"] = statistics.mean(durations)
+    benchmark.extra_info["collection_time_per_task"] = (
+        statistics.mean(durations) / n_tasks
+    )
+
+
+@pytest.mark.parametrize("n_tasks", [100, 1_000])
+def test_collect_stata_tasks(benchmark, restore_modules, tmp_path, n_tasks):
+    """Measure only the hook which turns parametrized functions into Stata tasks."""
+    root = create_project(tmp_path, 1, "parametrized")
+    session = build(paths=root, dry_run=True)
+    restore_modules()
+
+    def setup():
+        session.config.pop("stata_shared", None)
+        return (_create_task_functions(n_tasks),), {}
+
+    def run(functions):
+        for i, function in enumerate(functions):
+            task = session.hook.pytask_collect_task(
+                session=session,
+                path=root / "task_example.py",
+                name=f"task_example[{i}]",
+                obj=function,
+            )
+            assert task is not None
+
+    benchmark.group = "collection-hook"
+    benchmark.pedantic(run, setup=setup, rounds=5)
+    benchmark.extra_info["n_tasks"] = n_tasks
+
+
+def _create_task_functions(n_tasks):
+    functions = []
+    for i in range(n_tasks):
+
+        @pytask.mark.stata(script=Path("script.do"), options=f"data/out_{i}")
+        def task_example(produces=Path(f"data/out_{i}.dta")):
+            pass
+
+        functions.append(task_example)
+    return functions
@@ -0,0 +1,53 @@
+"""Benchmark the overhead of executing Stata tasks.
+
+The mock Stata starts fast, so the time per task is dominated by pytask-stata and
+pytask. The launch of the bare executable is measured as a reference.
+
+"""
+
+from __future__ import annotations
+
+import shutil
+import subprocess
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+
+from benchmarks.conftest import create_project
+from pytask_stata.shared import STATA_COMMANDS
+
+
+@pytest.mark.parametrize("log_lines", [0, 10_000])
+@pytest.mark.parametrize("layout", ["functions", "parametrized"])
+@pytest.mark.parametrize("n_tasks", [10, 100])
+def test_execution(  # noqa: PLR0913, PLR0917
+    benchmark, restore_modules, tmp_path, n_tasks, layout, log_lines
+):
+    """Measure building all tasks and report the time per task."""
+    root = create_project(tmp_path, n_tasks, layout, log_lines)
+
+    def run():
+        session = build(paths=root, force=True)
+        assert session.exit_code == ExitCode.OK
+        return session.execution_end - session.execution_start
+
+    benchmark.group = "execution"
+    duration = benchmark.pedantic(run, setup=restore_modules, rounds=3)
+
+    benchmark.extra_info["n_tasks"] = n_tasks
+    benchmark.extra_info["execution_time_per_task"] = duration / n_tasks
+
+
+def test_stata_launch(benchmark, tmp_path):
+    """Measure running a do-file with the executable alone as a reference."""
+    executable = next(filter(None, map(shutil.which, STATA_COMMANDS)))
+    tmp_path.joinpath("script.do").write_text("save out\n")
+
+    benchmark.group = "execution"
+    benchmark(
+        subprocess.run,
+        [executable, "-e", "do", "script.do", "-script"],
+        cwd=tmp_path,
+        check=True,
+    )
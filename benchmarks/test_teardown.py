@@ -0,0 +1,60 @@
+"""Benchmark checking the logs of Stata tasks for errors."""
+
+from __future__ import annotations
+
+import pytest
+from pytask import Mark
+from pytask import PathNode
+from pytask import PythonNode
+from pytask import Session
+from pytask import Task
+
+from pytask_stata.dta import parse_expectations
+from pytask_stata.execute import pytask_execute_task_teardown
+from pytask_stata.frames import write_dta
+
+
+@pytest.mark.parametrize("max_bytes", [None, 64 * 1024])
+@pytest.mark.parametrize("log_lines", [100, 100_000, 1_000_000])
+def test_teardown(benchmark, tmp_path, log_lines, max_bytes):
+    """Measure the teardown of a successful task for logs of different lengths."""
+    log = tmp_path.joinpath("task_example_py_task_example.log")
+    with log.open("w") as file:
+        file.writelines(f'. display "line {i}"\nline {i}\n' for i in range(log_lines))
+        file.write("\nend of do-file\n")
+    # The headers of .dta products are checked against the expectations of the mark.
+    product = tmp_path.joinpath("out.dta")
+    write_dta(product, {"id": "double"}, 1, [{"id": [1.0]}])
+
+    task = Task(
+        base_name="task_example",
+        path=tmp_path.joinpath("task_example.py"),
+        function=lambda: None,
+        depends_on={
+            "_cwd": PythonNode(value=tmp_path.as_posix()),
+            "_log_name": PythonNode(value="task_example_py_task_example"),
+        },
+        produces={"produces": PathNode.from_path(product)},
+        markers=[
+            Mark(
+                "stata",
+                (),
+                {"expect": {product: parse_expectations({"variables": ["id"]})}},
+            )
+        ],
+    )
+    session = Session(
+        config={
+            "root": tmp_path,
+            "stata_check_log_lines": 10,
+            "stata_check_log_bytes": max_bytes,
+            "stata_keep_log": True,
+            "stata_log_dir": None,
+            "stata_profile": False,
+        }
+    )
+
+    benchmark.group = "teardown"
+    benchmark(pytask_execute_task_teardown, session, task)
+
+    benchmark.extra_info["log_size"] = log.stat().st_size
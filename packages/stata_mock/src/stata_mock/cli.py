@@ -2,28 +2,50 @@
 
 from __future__ import annotations
 
+import os
 import re
+import shlex
 import sys
+import time
 from pathlib import Path
+from typing import TextIO
 
 INVALID_SYNTAX = 198
 UNKNOWN_COMMAND = 199
+FILE_NOT_FOUND = 601
 MINIMUM_ARGUMENTS = 4
 
+_TYPES = {
+    "byte": (65530, 1, "%8.0g"),
+    "int": (65529, 2, "%8.0g"),
+    "long": (65528, 4, "%12.0g"),
+    "float": (65527, 4, "%9.0g"),
+    "double": (65526, 8, "%10.0g"),
+}
+"""The codes, widths and default formats of numeric types in the format 118."""
+
 
 def main() -> int:
     """Run a tiny subset of Stata syntax for pytask-stata tests."""
-    parsed = _parse_invocation(sys.argv[1:])
+    args = sys.argv[1:]
+    if args == ["-q"]:
+        return _run_console(sys.stdin, sys.stdout)
+
+    parsed = _parse_invocation(args)
     if parsed is None:
         return INVALID_SYNTAX
 
     script, options, log = parsed
-    lines, error_code = _run_script(script, options)
+    with log.open("w") as file:
+        session = _Session(stream=file)
+        session.emit(f"running mock Stata for {script.name}")
+        error_code = session.run_do_file(script, options)
 
-    lines.append(
-        f"r({error_code})" if error_code is not None else "end of mock do-file"
-    )
-    log.write_text("\n".join(lines) + "\n")
+        if error_code is None:
+            session.emit("end of mock do-file")
+        else:
+            session.emit("end of do-file")
+            session.emit(f"r({error_code});")
     return 0
 
 
@@ -34,52 +56,198 @@ def _parse_invocation(args: list[str]) -> tuple[Path, list[str], Path] | None:
     script = Path(args[2]).resolve()
     options = args[3:-1]
     log_arg = args[-1]
-    log = (
-        script.with_suffix(".log")
-        if log_arg == "-"
-        else Path.cwd() / f"{log_arg.removeprefix('-')}.log"
-    )
+    # Like Stata, write the log to the working directory.
+    log_name = log_arg.removeprefix("-") or script.stem
+    log = Path.cwd() / f"{log_name}.log"
     return script, options, log
 
 
-def _run_script(script: Path, options: list[str]) -> tuple[list[str], int | None]:
-    lines = [f"running mock Stata for {script.name}"]
-    macros: dict[str, str] = {}
-
-    for raw_line in script.read_text().splitlines():
+def _run_console(stdin: TextIO, stdout: TextIO) -> int:
+    """Read commands from stdin like Stata's console mode."""
+    session = _Session(stream=stdout)
+    for raw_line in stdin:
         line = raw_line.strip()
-        if not line or line.startswith("*"):
+        if not line:
             continue
+        if line.split(",")[0].strip() == "exit":
+            break
 
-        line = _expand_local_macros(line, macros)
-        lines.append(f". {line}")
-        error_code = _execute_line(line, macros, options)
+        session.emit(f". {line}")
+        start = time.perf_counter()
+        error_code = session.execute(_expand_local_macros(line, session.macros))
         if error_code is not None:
-            return lines, error_code
+            session.emit(f"r({error_code});")
+        else:
+            session.emit_timing(start)
+        stdout.flush()
+    return 0
+
+
+class _Session:
+    """The state of a mock Stata session."""
 
-    return lines, None
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+        self.logs: dict[str, Path] = {}
+        self.macros: dict[str, str] = {}
+        self.rc = 0
+        self.rmsg = False
+        self.n_obs = 0
+        self.variables: list[tuple[str, str]] = []
 
+    def emit(self, line: str) -> None:
+        self.stream.write(line + "\n")
+        self.stream.flush()
+        for log in self.logs.values():
+            with log.open("a") as file:
+                file.write(line + "\n")
 
-def _execute_line(line: str, macros: dict[str, str], options: list[str]) -> int | None:
-    command, _, rest = line.partition(" ")
-    command = command.lower()
-    rest = rest.strip()
+    def emit_timing(self, start: float) -> None:
+        """Report the time of a command like Stata does with ``set rmsg on``."""
+        if self.rmsg:
+            elapsed = time.perf_counter() - start
+            self.emit(f"r; t={elapsed:.2f} {time.strftime('%H:%M:%S')}")
 
-    if command == "args":
-        macros.update(dict(zip(rest.split(), options, strict=False)))
-    elif command == "sysuse":
+    def run_do_file(self, script: Path, options: list[str]) -> int | None:
+        """Run a do-file with its own local macros."""
+        outer_macros, self.macros = self.macros, {}
+        try:
+            for raw_line in script.read_text().splitlines():
+                line = raw_line.strip()
+                if not line or line.startswith("*"):
+                    continue
+
+                line = _expand_local_macros(line, self.macros)
+                self.emit(f". {line}")
+                start = time.perf_counter()
+                error_code = self.execute(line, options)
+                if error_code is not None:
+                    # Like Stata, write the error code of an uncaptured error.
+                    self.emit(f"r({error_code});")
+                    return error_code
+                self.emit_timing(start)
+        finally:
+            self.macros = outer_macros
         return None
-    elif command == "save":
-        return _save_dataset(rest)
-    elif command in {"error", "exit"}:
-        return int(rest.split()[0])
-    else:
-        return UNKNOWN_COMMAND
 
-    return None
+    def execute(self, line: str, options: list[str] | None = None) -> int | None:
+        prefixes = []
+        command, _, rest = line.partition(" ")
+        while command.lower() in {"capture", "noisily", "quietly"}:
+            prefixes.append(command.lower())
+            command, _, rest = rest.strip().partition(" ")
+
+        error_code = self._execute_command(command.lower(), rest.strip(), options)
+        if "capture" in prefixes:
+            self.rc = error_code or 0
+            return None
+        return error_code
+
+    def _execute_command(  # noqa: C901, PLR0911, PLR0912
+        self, command: str, rest: str, options: list[str] | None
+    ) -> int | None:
+        if command == "args":
+            self.macros.update(dict(zip(rest.split(), options or [], strict=False)))
+        elif command == "local":
+            return self._define_local(rest)
+        elif command == "set":
+            return self._set(rest)
+        elif command == "clear":
+            self.n_obs, self.variables = 0, []
+        elif command == "sysuse":
+            return None
+        elif command in {"generate", "gen"}:
+            return self._generate(rest)
+        elif command == "sleep":
+            time.sleep(int(rest) / 1000)
+        elif command == "save":
+            return _save_dataset(rest, self.n_obs, self.variables)
+        elif command == "use":
+            return _use_dataset(rest)
+        elif command == "cd":
+            return _change_directory(rest)
+        elif command in {"erase", "rm"}:
+            return _erase_file(rest)
+        elif command in {"do", "run", "include"}:
+            return self._do(rest, echo_end=command == "do")
+        elif command == "log":
+            return self._log(rest)
+        elif command == "display":
+            self.emit(_parse_display(rest, self.rc))
+        elif command in {"error", "exit"}:
+            return int(rest.split(maxsplit=1)[0])
+        else:
+            return UNKNOWN_COMMAND
 
+        return None
+
+    def _define_local(self, rest: str) -> int | None:
+        name, _, value = rest.partition(" ")
+        value = value.strip()
+        if value.startswith("="):
+            value = value.removeprefix("=").strip()
+            value = str(self.rc) if value == "_rc" else value.strip("\"'")
+        self.macros[name] = _strip_compound_quotes(value)
+        return None
 
-def _save_dataset(rest: str) -> int | None:
+    def _set(self, rest: str) -> int | None:
+        setting, _, value = rest.partition(" ")
+        if setting == "rmsg":
+            self.rmsg = value.strip() == "on"
+        elif setting == "obs":
+            self.n_obs = int(value)
+        return None
+
+    def _generate(self, rest: str) -> int | None:
+        """Add a variable whose values are all zero."""
+        declaration = rest.partition("=")[0].split()
+        if len(declaration) == 1:
+            declaration.insert(0, "float")
+        if len(declaration) != 2 or declaration[0] not in _TYPES:  # noqa: PLR2004
+            return INVALID_SYNTAX
+        kind, name = declaration
+        self.variables.append((name, kind))
+        return None
+
+    def _do(self, rest: str, *, echo_end: bool = False) -> int | None:
+        arguments = _split_arguments(rest)
+        if not arguments:
+            return INVALID_SYNTAX
+
+        script = Path(arguments[0])
+        if script.suffix == "":
+            script = script.with_suffix(".do")
+        if not script.is_absolute():
+            script = Path.cwd() / script
+        if not script.exists():
+            return FILE_NOT_FOUND
+        error_code = self.run_do_file(script, arguments[1:])
+        if echo_end:
+            self.emit("end of do-file")
+        return error_code
+
+    def _log(self, rest: str) -> int | None:
+        subcommand, _, rest = rest.partition(" ")
+        target, _, log_options = rest.partition(",")
+        name = _parse_log_name(log_options)
+
+        if subcommand == "using":
+            path = Path(_split_arguments(target)[0])
+            if not path.is_absolute():
+                path = Path.cwd() / path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("")
+            self.logs[name] = path
+        elif subcommand == "close":
+            self.logs.pop(target.strip() or "<unnamed>", None)
+        else:
+            return INVALID_SYNTAX
+        return None
+
+
+def _save_dataset(
+    rest: str, n_obs: int, variables: list[tuple[str, str]]
+) -> int | None:
     target = _parse_save_target(rest)
     if not target:
         return INVALID_SYNTAX
@@ -90,12 +258,124 @@ def _save_dataset(rest: str) -> int | None:
     if not path.is_absolute():
         path = Path.cwd() / path
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text("mock Stata dataset\n")
+    path.write_bytes(_render_dataset(n_obs, variables))
+    return None
+
+
+def _render_dataset(n_obs: int, variables: list[tuple[str, str]]) -> bytes:
+    """Render a dataset of zeros in the format 118 with the current timestamp."""
+    timestamp = os.environ.get(
+        "STATA_MOCK_TIMESTAMP", time.strftime("%d %b %Y %H:%M")
+    ).encode()
+    n_vars = len(variables)
+    header = (
+        b"<stata_dta><header><release>118</release><byteorder>LSF</byteorder>"
+        b"<K>" + n_vars.to_bytes(2, "little") + b"</K>"
+        b"<N>" + n_obs.to_bytes(8, "little") + b"</N><label>\x00\x00</label>"
+        b"<timestamp>" + bytes([len(timestamp)]) + timestamp + b"</timestamp>"
+        b"</header>"
+    )
+    types = b"".join(_TYPES[kind][0].to_bytes(2, "little") for _, kind in variables)
+    names = b"".join(name.encode().ljust(129, b"\x00") for name, _ in variables)
+    formats = b"".join(
+        _TYPES[kind][2].encode().ljust(57, b"\x00") for _, kind in variables
+    )
+    width = sum(_TYPES[kind][1] for _, kind in variables)
+    sections = [
+        b"<variable_types>" + types + b"</variable_types>",
+        b"<varnames>" + names + b"</varnames>",
+        b"<sortlist>" + bytes(2 * (n_vars + 1)) + b"</sortlist>",
+        b"<formats>" + formats + b"</formats>",
+        b"<value_label_names>" + bytes(129 * n_vars) + b"</value_label_names>",
+        b"<variable_labels>" + bytes(321 * n_vars) + b"</variable_labels>",
+        b"<characteristics></characteristics>",
+        b"<data>" + bytes(n_obs * width) + b"</data>",
+        b"<strls></strls>",
+        b"<value_labels></value_labels>",
+    ]
+    offsets = [0, len(header)]
+    position = len(header) + len(b"<map></map>") + 14 * 8
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+    offsets.extend([position, position + len(b"</stata_dta>")])
+    table = b"".join(offset.to_bytes(8, "little") for offset in offsets)
+    return header + b"<map>" + table + b"</map>" + b"".join(sections) + b"</stata_dta>"
+
+
+def _use_dataset(rest: str) -> int | None:
+    target = _parse_save_target(rest)
+    if not target:
+        return INVALID_SYNTAX
+
+    path = Path(target)
+    if path.suffix == "":
+        path = path.with_suffix(".dta")
+    if not path.is_absolute():
+        path = Path.cwd() / path
+    return None if path.exists() else FILE_NOT_FOUND
+
+
+def _erase_file(rest: str) -> int | None:
+    arguments = _split_arguments(rest)
+    if not arguments:
+        return INVALID_SYNTAX
+
+    path = Path(arguments[0])
+    if not path.is_absolute():
+        path = Path.cwd() / path
+    if not path.exists():
+        return FILE_NOT_FOUND
+    path.unlink()
+    return None
+
+
+def _change_directory(rest: str) -> int | None:
+    arguments = _split_arguments(rest)
+    if not arguments or not Path(arguments[0]).is_dir():
+        return INVALID_SYNTAX
+    os.chdir(arguments[0])
     return None
 
 
 def _expand_local_macros(line: str, macros: dict[str, str]) -> str:
-    return re.sub(r"`([^']+)'", lambda match: macros.get(match.group(1), ""), line)
+    return re.sub(
+        r"`(?!\")([^']+)'", lambda match: macros.get(match.group(1), ""), line
+    )
+
+
+def _strip_compound_quotes(text: str) -> str:
+    return re.sub(r"`\"(.*?)\"'", r"\1", text)
+
+
+def _split_arguments(text: str) -> list[str]:
+    """Split arguments while respecting simple and compound double quotes."""
+    return shlex.split(re.sub(r"`\"(.*?)\"'", r'"\1"', text))
+
+
+def _parse_display(rest: str, rc: int) -> str:
+    text = _strip_compound_quotes(rest.strip())
+    if text == "_rc":
+        return str(rc)
+    text = re.sub(r"c\((\w+)\)", lambda match: _get_c_value(match.group(1)), text)
+    return text.replace('"', "")
+
+
+def _get_c_value(name: str) -> str:
+    executable = Path(sys.argv[0]).name.upper()
+    values = {
+        "stata_version": "18",
+        "edition_real": next(
+            (edition for edition in ("MP", "SE") if edition in executable), "BE"
+        ),
+        "processors_lic": str(os.cpu_count() or 1),
+    }
+    return values.get(name, "")
+
+
+def _parse_log_name(log_options: str) -> str:
+    match = re.search(r"name\((\w+)\)", log_options)
+    return match.group(1) if match else "<unnamed>"
 
 
 def _parse_save_target(rest: str) -> str:
@@ -1,5 +1,13 @@
 from __future__ import annotations
 
+from pytask_stata.discovery import StataInfo
+from pytask_stata.discovery import get_stata_info
+from pytask_stata.dta import DtaHeader
+from pytask_stata.dta import DtaVariable
+from pytask_stata.dta import read_dta_header
+from pytask_stata.process import DoFileResult
+from pytask_stata.process import run_do_file
+
 try:
     from ._version import version as __version__  # ty: ignore[unresolved-import]
 except ImportError:
@@ -8,4 +16,13 @@ except ImportError:
     __version__ = "unknown"
 
 
-__all__ = ["__version__"]
+__all__ = [
+    "DoFileResult",
+    "DtaHeader",
+    "DtaVariable",
+    "StataInfo",
+    "__version__",
+    "get_stata_info",
+    "read_dta_header",
+    "run_do_file",
+]
@@ -0,0 +1,385 @@
+"""Archive the logs of Stata tasks in compressed, append-only stores.
+
+Every build writes one store per run. The log of a task is appended as a compressed
+frame after the task has finished, and a line with its task, offset, and length is
+appended to the index of the run. The original log is removed, so only two files per
+run remain. A single log is restored by decompressing its frame without reading the
+rest of the store.
+
+Logs are compressed with Zstandard if the standard library provides it and with gzip
+otherwise. Old runs are evicted by age or by the total size of the archive.
+
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+import zlib
+from dataclasses import asdict
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import NoReturn
+
+import click
+from pytask import ColoredCommand
+from pytask import ExecutionReport
+from pytask import ExitCode
+from pytask import Session
+from pytask import TaskOutcome
+from pytask import console
+from pytask import has_mark
+from pytask import hookimpl
+from rich.table import Table
+
+from pytask_stata.execute import get_log_path_of_task
+from pytask_stata.shared import parse_memory
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+try:
+    from compression import zstd  # ty: ignore[unresolved-import]
+except ImportError:  # pragma: no cover
+    zstd = None
+
+
+ARCHIVE_DIRECTORY = ".pytask/stata-logs"
+"""The default directory of the archive relative to the project's root."""
+
+CHUNK_SIZE = 1024 * 1024
+
+CODEC = "zstd" if zstd is not None else "gzip"
+"""The codec of new frames. Frames remember their codec, so archives can be mixed."""
+
+
+@dataclass(frozen=True)
+class ArchivedLog:
+    """The entry of a log in the index of a run.
+
+    Attributes
+    ----------
+    task
+        The name of the task.
+    run
+        The id of the run.
+    offset
+        The position of the compressed frame in the store of the run.
+    length
+        The number of bytes of the compressed frame.
+    size
+        The number of bytes of the uncompressed log.
+    codec
+        The codec of the frame, ``"zstd"`` or ``"gzip"``.
+    outcome
+        The outcome of the task.
+    time
+        The time when the log was archived in seconds since the epoch.
+
+    """
+
+    task: str
+    run: str
+    offset: int
+    length: int
+    size: int
+    codec: str
+    outcome: str
+    time: float
+
+
+class LogArchive:
+    """An archive of Stata logs with one store and one index per run.
+
+    Parameters
+    ----------
+    directory
+        The directory of the archive.
+    run
+        The id of the current run. A new id is created from the current time and the
+        process id if it is not given.
+
+    """
+
+    def __init__(self, directory: Path, run: str | None = None) -> None:
+        self.directory = directory
+        self.run = run or _create_run_id()
+
+    def add(self, task: str, log: Path, outcome: str) -> ArchivedLog:
+        """Compress a log and append it to the store of the current run."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        compressor = _create_compressor(CODEC)
+        size = 0
+        with self._store(self.run).open("ab") as store, log.open("rb") as file:
+            offset = store.seek(0, os.SEEK_END)
+            while chunk := file.read(CHUNK_SIZE):
+                size += len(chunk)
+                store.write(compressor.compress(chunk))
+            store.write(compressor.flush())
+            length = store.tell() - offset
+
+        entry = ArchivedLog(
+            task=task,
+            run=self.run,
+            offset=offset,
+            length=length,
+            size=size,
+            codec=CODEC,
+            outcome=outcome,
+            time=time.time(),
+        )
+        with self._index(self.run).open("a") as file:
+            file.write(json.dumps(asdict(entry)) + "\n")
+        return entry
+
+    def runs(self) -> list[str]:
+        """Get the ids of all runs from the oldest to the newest."""
+        if not self.directory.exists():
+            return []
+        return sorted(path.stem for path in self.directory.glob("*.index"))
+
+    def entries(self, run: str | None = None) -> list[ArchivedLog]:
+        """Get the entries of one or all runs."""
+        entries = []
+        for run_ in self.runs() if run is None else [run]:
+            path = self._index(run_)
+            if not path.exists():
+                continue
+            with path.open() as file:
+                entries.extend(ArchivedLog(**json.loads(line)) for line in file if line)
+        return entries
+
+    def find(self, task: str, run: str | None = None) -> ArchivedLog:
+        """Find the latest log of a task.
+
+        The task can be given by its full name or by a suffix of it, like the name of
+        the module and the function.
+
+        """
+        matches = [entry for entry in self.entries(run) if _matches(entry.task, task)]
+        if not matches:
+            msg = f"There is no archived log of a task matching {task!r}."
+            raise LookupError(msg)
+
+        names = sorted({entry.task for entry in matches})
+        if len(names) > 1:
+            msg = f"The name {task!r} matches multiple tasks:\n\n" + "\n".join(names)
+            raise LookupError(msg)
+        return matches[-1]
+
+    def stream(self, entry: ArchivedLog, write: Callable[[bytes], Any]) -> None:
+        """Decompress a log in chunks and pass them to ``write``."""
+        decompressor = _create_decompressor(entry.codec)
+        with self._store(entry.run).open("rb") as store:
+            store.seek(entry.offset)
+            remaining = entry.length
+            while remaining > 0:
+                chunk = store.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                write(decompressor.decompress(chunk))
+
+    def evict(self, max_age: float | None = None, max_size: int | None = None) -> None:
+        """Remove the oldest runs which are older or exceed the size of the archive.
+
+        The current run is never removed.
+
+        Parameters
+        ----------
+        max_age
+            The maximum age of runs in days.
+        max_size
+            The maximum size of all stores and indices in bytes.
+
+        """
+        runs = [run for run in self.runs() if run != self.run]
+        now = time.time()
+        total = sum(self._size(run) for run in [*runs, self.run])
+        for run in runs:
+            modified = self._index(run).stat().st_mtime
+            is_too_old = max_age is not None and now - modified > max_age * 86_400
+            is_too_large = max_size is not None and total > max_size
+            if not (is_too_old or is_too_large):
+                continue
+            total -= self._size(run)
+            self._store(run).unlink(missing_ok=True)
+            self._index(run).unlink(missing_ok=True)
+
+    def _store(self, run: str) -> Path:
+        return self.directory / f"{run}.logs"
+
+    def _index(self, run: str) -> Path:
+        return self.directory / f"{run}.index"
+
+    def _size(self, run: str) -> int:
+        return sum(
+            path.stat().st_size
+            for path in (self._store(run), self._index(run))
+            if path.exists()
+        )
+
+
+@hookimpl
+def pytask_parse_config(config: dict[str, Any]) -> None:
+    """Parse the configuration of the archive."""
+    config["stata_log_archive"] = (
+        LogArchive(
+            config["root"] / (config.get("stata_log_archive_dir") or ARCHIVE_DIRECTORY)
+        )
+        if config.get("stata_log_archive")
+        else None
+    )
+    max_age = config.get("stata_log_archive_max_age")
+    config["stata_log_archive_max_age"] = None if max_age is None else float(max_age)
+    max_size = config.get("stata_log_archive_max_size")
+    config["stata_log_archive_max_size"] = (
+        None if max_size is None else parse_memory(max_size)
+    )
+
+
+@hookimpl(tryfirst=True)
+def pytask_execute_task_process_report(
+    session: Session, report: ExecutionReport
+) -> None:
+    """Move the log of a finished Stata task into the archive."""
+    archive = session.config.get("stata_log_archive")
+    task = report.task
+    if (
+        archive is None
+        or not has_mark(task, "stata")
+        or report.outcome not in (TaskOutcome.SUCCESS, TaskOutcome.FAIL)
+    ):
+        return
+
+    log = get_log_path_of_task(session, task)
+    if log.exists():
+        archive.add(task.name, log, report.outcome.name.lower())
+        log.unlink()
+
+
+@hookimpl
+def pytask_unconfigure(session: Session) -> None:
+    """Evict old runs from the archive."""
+    archive = session.config.get("stata_log_archive")
+    if archive is not None:
+        archive.evict(
+            max_age=session.config["stata_log_archive_max_age"],
+            max_size=session.config["stata_log_archive_max_size"],
+        )
+
+
+@hookimpl
+def pytask_extend_command_line_interface(cli: click.Group) -> None:
+    """Add the command to show archived logs."""
+    cli.add_command(stata_log)
+
+
+@click.command(name="stata-log", cls=ColoredCommand)
+@click.argument("task", required=False)
+@click.option("--run", default=None, help="The id of the run. Defaults to the latest.")
+@click.option(
+    "--list",
+    "list_",
+    is_flag=True,
+    help="List the archived logs instead of showing one.",
+)
+@click.option(
+    "--archive-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help=(
+        f"The directory of the archive. Defaults to {ARCHIVE_DIRECTORY} in the "
+        "current or a parent directory."
+    ),
+)
+def stata_log(
+    *, task: str | None, run: str | None, list_: bool, archive_dir: Path | None
+) -> NoReturn:
+    """Show the archived log of a Stata task."""
+    directory = archive_dir or _find_archive_directory(Path.cwd())
+    if directory is None or not directory.exists():
+        console.print(f"There is no archive of Stata logs in {ARCHIVE_DIRECTORY}.")
+        sys.exit(ExitCode.FAILED)
+    archive = LogArchive(directory)
+
+    if list_ or task is None:
+        entries = [
+            entry
+            for entry in archive.entries(run)
+            if task is None or _matches(entry.task, task)
+        ]
+        console.print(_create_table(entries))
+        sys.exit(ExitCode.OK)
+
+    try:
+        entry = archive.find(task, run)
+    except LookupError as e:
+        console.print(str(e))
+        sys.exit(ExitCode.FAILED)
+
+    stdout = click.get_binary_stream("stdout")
+    archive.stream(entry, stdout.write)
+    stdout.flush()
+    sys.exit(ExitCode.OK)
+
+
+def _matches(name: str, query: str) -> bool:
+    """Check whether the name of a task matches a query.
+
+    Examples
+    --------
+    >>> _matches("/project/task_a.py::task_b[0]", "task_a.py::task_b[0]")
+    True
+    >>> _matches("/project/task_a.py::task_b[0]", "task_b[0]")
+    True
+    >>> _matches("/project/task_a.py::task_b[0]", "b[0]")
+    False
+
+    """
+    return name == query or name.endswith(("/" + query, "::" + query))
+
+
+def _find_archive_directory(start: Path) -> Path | None:
+    """Find the archive in a directory or one of its parents."""
+    for directory in (start, *start.parents):
+        if directory.joinpath(ARCHIVE_DIRECTORY).is_dir():
+            return directory / ARCHIVE_DIRECTORY
+    return None
+
+
+def _create_run_id() -> str:
+    now = datetime.now(tz=timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    return f"{now}-{os.getpid()}"
+
+
+def _create_compressor(codec: str) -> Any:
+    if codec == "zstd":
+        return zstd.ZstdCompressor()  # ty: ignore[possibly-missing-attribute]
+    return zlib.compressobj(wbits=31)
+
+
+def _create_decompressor(codec: str) -> Any:
+    if codec == "zstd":
+        if zstd is None:
+            msg = "The log is compressed with Zstandard which needs Python 3.14."
+            raise RuntimeError(msg)
+        return zstd.ZstdDecompressor()
+    return zlib.decompressobj(wbits=31)
+
+
+def _create_table(entries: list[ArchivedLog]) -> Table:
+    table = Table(title="Archived Stata logs", title_justify="left")
+    table.add_column("Run")
+    table.add_column("Task", overflow="fold")
+    table.add_column("Outcome")
+    table.add_column("Size", justify="right")
+    for entry in entries:
+        table.add_row(entry.run, entry.task, entry.outcome, f"{entry.size} B")
+    return table
@@ -0,0 +1,153 @@
+"""Run many Stata processes concurrently from one event loop.
+
+With the subprocess backend, every running Stata task occupies a worker of
+pytask-parallel which does nothing but wait for its Stata process. The async backend
+runs Stata tasks from the main process instead. Ready tasks are started with
+:func:`~pytask_stata.process.run_do_file`, and a single event loop waits for the
+processes and checks their logs, so hundreds of Stata processes can run at the same
+time without a Python worker each. Other tasks run in the main process while the Stata
+processes are running.
+
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import subprocess
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import cast
+
+from pytask import ExecutionReport
+from pytask import PathNode
+from pytask import PTask
+from pytask import PythonNode
+from pytask import Session
+from pytask import has_mark
+from pytask import hookimpl
+
+from pytask_stata.execute import finish_task
+from pytask_stata.execute import get_log_path_of_task
+from pytask_stata.execute import get_options
+from pytask_stata.execute import print_log_line
+from pytask_stata.execute import set_up_task
+from pytask_stata.process import DoFileResult
+from pytask_stata.process import run_do_file
+from pytask_stata.resources import get_resources
+from pytask_stata.seats import create_limiter
+from pytask_stata.seats import run_with_seat_async
+from pytask_stata.usage import get_usage_path
+from pytask_stata.usage import write_usage
+
+if TYPE_CHECKING:
+    from pytask_stata.seats import SeatLimiter
+
+
+@hookimpl(tryfirst=True)
+def pytask_execute_build(session: Session) -> bool | None:
+    """Execute tasks and run Stata tasks concurrently in an event loop."""
+    if (
+        session.config["stata_backend"] != "async"
+        or session.config["dry_run"]
+        or session.config["explain"]
+        or session.scheduler is None
+    ):
+        return None
+    return asyncio.run(_execute_build(session))
+
+
+async def _execute_build(session: Session) -> bool:
+    """Start ready tasks and finish them as soon as their Stata process exits."""
+    scheduler = cast("Any", session.scheduler)
+    limiter = create_limiter(session.config)
+    running: dict[asyncio.Task[DoFileResult], PTask] = {}
+    try:
+        while scheduler.is_active():
+            n_free = session.config["stata_async_max_tasks"] - len(running)
+            # The scheduler returns ready tasks sorted by ascending priority.
+            for name in reversed(scheduler.get_ready(n_free) if n_free > 0 else []):
+                task = cast("PTask", session.dag.nodes[name])
+                if not has_mark(task, "stata"):
+                    report = session.hook.pytask_execute_task_protocol(
+                        session=session, task=task
+                    )
+                    session.execution_reports.append(report)
+                    scheduler.done(task.signature)
+                elif (report := set_up_task(session, task)) is not None:
+                    finish_task(session, task, report)
+                else:
+                    coroutine = _run_task(session, task, limiter)
+                    running[asyncio.create_task(coroutine)] = task
+
+                if session.should_stop:
+                    return True
+
+            if not running:
+                continue
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                finish_task(session, task, _create_report(session, task, future))
+                if session.should_stop:
+                    return True
+    finally:
+        for future in running:
+            future.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+    return True
+
+
+async def _run_task(
+    session: Session, task: PTask, limiter: SeatLimiter | None
+) -> DoFileResult:
+    """Run the do-file of a task while holding a seat."""
+    executable = cast("PythonNode", task.depends_on["_executable"]).load()
+    script = cast("PathNode", task.depends_on["_script"]).path
+    options = get_options(task)
+    cwd = Path(cast("PythonNode", task.depends_on["_cwd"]).load())
+    log = get_log_path_of_task(session, task)
+
+    return await run_with_seat_async(
+        functools.partial(
+            run_do_file,
+            executable,
+            script,
+            options,
+            cwd=cwd,
+            log=log,
+            resources=get_resources(task),
+            follow_log=session.config["stata_stream_log"],
+            n_lines=session.config["stata_check_log_lines"],
+            max_bytes=session.config["stata_check_log_bytes"],
+            on_line=functools.partial(print_log_line, script.name),
+            profile=session.config["stata_profile"],
+        ),
+        limiter,
+        log,
+        retries=session.config["stata_license_retries"],
+    )
+
+
+def _create_report(
+    session: Session, task: PTask, future: asyncio.Task[DoFileResult]
+) -> ExecutionReport:
+    """Create the report of a task whose Stata process has finished."""
+    try:
+        result = future.result()
+        write_usage(get_usage_path(session.config["root"], task), result.usage)
+        # An error code in the log is reported by the teardown with the log's tail.
+        if result.returncode and result.error_code is None:
+            raise subprocess.CalledProcessError(  # noqa: TRY301
+                result.returncode, result.script.as_posix()
+            )
+        session.hook.pytask_execute_task_teardown(session=session, task=task)
+    except KeyboardInterrupt:  # pragma: no cover
+        session.should_stop = True
+        return ExecutionReport.from_task_and_exception(task, sys.exc_info())
+    except Exception:  # noqa: BLE001
+        return ExecutionReport.from_task_and_exception(task, sys.exc_info())
+    return ExecutionReport.from_task(task)
@@ -0,0 +1,205 @@
+"""Run many Stata tasks in one Stata process.
+
+For large parametrized sweeps over small do-files, starting Stata for every task takes
+longer than running the scripts. The batch backend groups ready Stata tasks which share
+the executable and working directory. A driver do-file runs the scripts one after
+another, each with its own log, and records their return codes. Afterwards, the results
+are mapped back to the tasks such that pytask reports and tracks every task on its own.
+
+Since the tasks of a batch share one Stata process, each task is attributed the usage
+of the whole process, and limits like timeouts and following the log are not supported.
+
+"""
+
+from __future__ import annotations
+
+import functools
+import sys
+import tempfile
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import cast
+
+from pytask import ExecutionReport
+from pytask import PathNode
+from pytask import PTask
+from pytask import PythonNode
+from pytask import Session
+from pytask import has_mark
+from pytask import hookimpl
+
+from pytask_stata.driver import check_return_code
+from pytask_stata.driver import parse_return_codes
+from pytask_stata.driver import render_run_commands
+from pytask_stata.execute import finish_task
+from pytask_stata.execute import get_log_path_of_task
+from pytask_stata.execute import get_options
+from pytask_stata.execute import set_up_task
+from pytask_stata.process import ProcessUsage
+from pytask_stata.process import run_stata_process
+from pytask_stata.resources import get_resources
+from pytask_stata.seats import create_limiter
+from pytask_stata.seats import run_with_seat
+from pytask_stata.usage import get_usage_path
+from pytask_stata.usage import write_usage
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from pytask_stata.seats import SeatLimiter
+    from pytask_stata.shared import StataResources
+
+
+@hookimpl(tryfirst=True)
+def pytask_execute_build(session: Session) -> bool | None:
+    """Execute tasks and run ready Stata tasks in batches."""
+    if (
+        session.config["stata_backend"] != "batch"
+        or session.config["dry_run"]
+        or session.config["explain"]
+        or session.scheduler is None
+    ):
+        return None
+
+    scheduler = session.scheduler
+    while scheduler.is_active():
+        # The scheduler returns ready tasks sorted by ascending priority.
+        ready_tasks = [
+            cast("PTask", session.dag.nodes[name])
+            for name in reversed(scheduler.get_ready(len(session.dag.nodes)))
+        ]
+
+        batch = []
+        for task in ready_tasks:
+            if not has_mark(task, "stata"):
+                report = session.hook.pytask_execute_task_protocol(
+                    session=session, task=task
+                )
+                session.execution_reports.append(report)
+                scheduler.done(task.signature)
+            elif (report := set_up_task(session, task)) is not None:
+                finish_task(session, task, report)
+            else:
+                batch.append(task)
+
+            if session.should_stop:
+                return True
+
+        for group in _group_tasks(batch, session.config["stata_batch_size"]):
+            for task, report in run_batch(session, group):
+                finish_task(session, task, report)
+
+            if session.should_stop:
+                return True
+
+    return True
+
+
+def run_batch(
+    session: Session, tasks: list[PTask]
+) -> Iterator[tuple[PTask, ExecutionReport]]:
+    """Run Stata tasks sharing the executable and working directory in one process."""
+    executable, cwd = _get_group_key(tasks[0])
+    scripts = [_get_script_arguments(session, task) for task in tasks]
+
+    try:
+        return_codes, usage = _run_driver(
+            executable,
+            cwd,
+            scripts,
+            create_limiter(session.config),
+            session.config["stata_license_retries"],
+            profile=session.config["stata_profile"],
+        )
+    except Exception:  # noqa: BLE001
+        exc_info = sys.exc_info()
+        for task in tasks:
+            yield task, ExecutionReport.from_task_and_exception(task, exc_info)
+        return
+
+    for task in tasks:
+        write_usage(get_usage_path(session.config["root"], task), usage)
+
+    for i, (task, (script, _, log, _)) in enumerate(zip(tasks, scripts, strict=True)):
+        try:
+            if str(i) not in return_codes:
+                msg = f"Stata stopped before it ran {script.as_posix()!r}."
+                raise RuntimeError(msg)  # noqa: TRY301
+            check_return_code(return_codes[str(i)], script, log)
+            session.hook.pytask_execute_task_teardown(session=session, task=task)
+        except KeyboardInterrupt:  # pragma: no cover
+            session.should_stop = True
+            report = ExecutionReport.from_task_and_exception(task, sys.exc_info())
+        except Exception:  # noqa: BLE001
+            report = ExecutionReport.from_task_and_exception(task, sys.exc_info())
+        else:
+            report = ExecutionReport.from_task(task)
+        yield task, report
+
+
+def _run_driver(  # noqa: PLR0913
+    executable: str,
+    cwd: Path,
+    scripts: list[tuple[Path, list[str], Path, StataResources]],
+    limiter: SeatLimiter | None,
+    license_retries: int,
+    *,
+    profile: bool = False,
+) -> tuple[dict[str, int], ProcessUsage]:
+    """Run the do-files with a driver.
+
+    Returns the return codes by position and the usage of the Stata process.
+
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        driver = Path(tmp, "pytask_stata_batch.do")
+        commands = []
+        for i, (script, options, log, resources) in enumerate(scripts):
+            commands.extend(
+                render_run_commands(
+                    script, options, cwd, log, str(i), resources, profile=profile
+                )
+            )
+        driver.write_text("\n".join(commands) + "\n")
+
+        cmd = [executable, "-e", "do", driver.as_posix(), f"-{driver.stem}"]
+        driver_log = driver.with_suffix(".log")
+        usage = run_with_seat(
+            functools.partial(run_stata_process, cmd, cwd=Path(tmp), log=driver_log),
+            limiter,
+            driver_log,
+            retries=license_retries,
+        )
+
+        if not driver_log.exists():
+            return {}, usage
+        with driver_log.open(errors="replace") as file:
+            return parse_return_codes(file), usage
+
+
+def _group_tasks(tasks: list[PTask], batch_size: int | None) -> Iterator[list[PTask]]:
+    """Group tasks by executable and working directory in batches."""
+    groups: dict[tuple[str, Path], list[PTask]] = {}
+    for task in tasks:
+        groups.setdefault(_get_group_key(task), []).append(task)
+
+    for group in groups.values():
+        iterator = iter(group)
+        while batch := list(islice(iterator, batch_size)):
+            yield batch
+
+
+def _get_group_key(task: PTask) -> tuple[str, Path]:
+    executable = cast("PythonNode", task.depends_on["_executable"]).load()
+    cwd = cast("PythonNode", task.depends_on["_cwd"]).load()
+    return executable, Path(cwd)
+
+
+def _get_script_arguments(
+    session: Session, task: PTask
+) -> tuple[Path, list[str], Path, StataResources]:
+    script = cast("PathNode", task.depends_on["_script"]).path
+    log = get_log_path_of_task(session, task)
+    log.parent.mkdir(parents=True, exist_ok=True)
+    return script, get_options(task), log, get_resources(task)
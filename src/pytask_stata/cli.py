@@ -2,9 +2,13 @@
 
 from __future__ import annotations
 
+from pathlib import Path
+
 import click
 from pytask import hookimpl
 
+from pytask_stata.shared import STATA_BACKENDS
+
 
 @hookimpl
 def pytask_extend_command_line_interface(cli: click.Group) -> None:
@@ -24,5 +28,290 @@ def pytask_extend_command_line_interface(cli: click.Group) -> None:
             type=click.IntRange(min=1),
             default=10,
         ),
+        click.Option(
+            ["--stata-check-log-bytes"],
+            help=(
+                "Maximum number of bytes read from the end of the log file when "
+                "searching for non-zero exit codes."
+            ),
+            type=click.IntRange(min=1),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-stream-log"],
+            help=(
+                "Follow the log while a do-file is running, print its lines and stop "
+                "Stata as soon as an error code appears."
+            ),
+            is_flag=True,
+        ),
+        click.Option(
+            ["--stata-log-dir"],
+            help=(
+                "Directory of the logs of Stata tasks, for example, on a local disk. "
+                "Defaults to the directories of the task modules."
+            ),
+            type=click.Path(file_okay=False, path_type=Path),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-log-archive"],
+            help=(
+                "Move the logs of Stata tasks into a compressed archive. Show them "
+                "with 'pytask stata-log'."
+            ),
+            is_flag=True,
+        ),
+        click.Option(
+            ["--stata-log-archive-dir"],
+            help=(
+                "Directory of the log archive. Defaults to .pytask/stata-logs in the "
+                "project's root."
+            ),
+            type=click.Path(file_okay=False, path_type=Path),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-log-archive-max-age"],
+            help="Remove runs from the log archive which are older than these days.",
+            type=click.FloatRange(min=0),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-log-archive-max-size"],
+            help=(
+                "Size like '1G' after which the oldest runs are removed from the log "
+                "archive."
+            ),
+            type=str,
+            default=None,
+        ),
+        click.Option(
+            ["--stata-timeout"],
+            help="Stop Stata tasks which run longer than this number of seconds.",
+            type=click.FloatRange(min=0, min_open=True),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-idle-timeout"],
+            help=(
+                "Stop Stata tasks whose log does not grow for this number of seconds."
+            ),
+            type=click.FloatRange(min=0, min_open=True),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-max-rss"],
+            help="Stop Stata tasks whose resident memory exceeds a size like '16G'.",
+            type=str,
+            default=None,
+        ),
+        click.Option(
+            ["--stata-infer-dependencies"],
+            help=(
+                "Scan do-files for the files they read and write and add them as "
+                "dependencies and products."
+            ),
+            is_flag=True,
+        ),
+        click.Option(
+            ["--stata-track-includes"],
+            help=(
+                "Rerun tasks when do-files or ado-files change which the script runs "
+                "directly or indirectly."
+            ),
+            is_flag=True,
+        ),
+        click.Option(
+            ["--stata-adopath"],
+            help=(
+                "Directory with project-local ado-files which are tracked with "
+                "--stata-track-includes. Can be passed multiple times."
+            ),
+            type=click.Path(file_okay=False, path_type=Path),
+            multiple=True,
+        ),
+        click.Option(
+            ["--stata-max-concurrent"],
+            help=(
+                "Maximum number of Stata processes which run at the same time across "
+                "all builds sharing the license directory."
+            ),
+            type=click.IntRange(min=1),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-license-dir"],
+            help=(
+                "Directory of the lock files for --stata-max-concurrent. Defaults to "
+                ".pytask/stata-seats in the project's root."
+            ),
+            type=click.Path(file_okay=False, path_type=Path),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-license-retries"],
+            help="Number of retries of a do-file if no Stata license was available.",
+            type=click.IntRange(min=0),
+            default=0,
+        ),
+        click.Option(
+            ["--stata-cores"],
+            help=(
+                "Number of cores which Stata tasks requesting cores may use at the "
+                "same time. Defaults to the number of cores of the host."
+            ),
+            type=click.IntRange(min=1),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-memory"],
+            help=(
+                "Memory like '64G' which Stata tasks requesting memory may use at the "
+                "same time."
+            ),
+            type=str,
+            default=None,
+        ),
+        click.Option(
+            ["--stata-slowest"],
+            help=(
+                "Number of the slowest Stata tasks shown with their resource usage "
+                "at the end. Use 0 to hide them."
+            ),
+            type=click.IntRange(min=0),
+            default=5,
+        ),
+        click.Option(
+            ["--stata-usage-file"],
+            help=(
+                "Write the resource usage of all executed Stata tasks to a .json or "
+                ".csv file."
+            ),
+            type=click.Path(dir_okay=False, path_type=Path),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-profile"],
+            help=(
+                "Time every command of the do-files and show the slowest commands and "
+                "source lines at the end."
+            ),
+            is_flag=True,
+        ),
+        click.Option(
+            ["--stata-hash-dta"],
+            help=(
+                "Hash the .dta files of Stata tasks without their timestamps, so that "
+                "tasks are skipped if their datasets were saved with the same data."
+            ),
+            is_flag=True,
+        ),
+        click.Option(
+            ["--stata-output-cache"],
+            help=(
+                "Store the products and logs of Stata tasks by the hash of their "
+                "inputs and restore them instead of running Stata."
+            ),
+            is_flag=True,
+        ),
+        click.Option(
+            ["--stata-output-cache-dir"],
+            help=(
+                "Directory of the output cache which can be shared by clones and "
+                "machines. Defaults to .pytask/stata-cache in the project's root."
+            ),
+            type=click.Path(file_okay=False, path_type=Path),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-output-cache-max-size"],
+            help=(
+                "Size like '50G' after which the least recently used entries are "
+                "removed from the output cache."
+            ),
+            type=str,
+            default=None,
+        ),
+        click.Option(
+            ["--stata-backend"],
+            help=(
+                "How do-files are executed. 'subprocess' starts a new Stata process "
+                "for every task, 'pool' reuses persistent Stata sessions, 'batch' "
+                "runs ready tasks together in one Stata process, 'async' runs "
+                "Stata processes concurrently from one event loop and 'cluster' "
+                "submits every task as a job to a cluster scheduler."
+            ),
+            type=click.Choice(STATA_BACKENDS),
+            default="subprocess",
+        ),
+        click.Option(
+            ["--stata-pool-size"],
+            help=(
+                "Number of persistent Stata sessions. Defaults to the number of "
+                "workers."
+            ),
+            type=click.IntRange(min=1),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-pool-max-tasks"],
+            help="Number of tasks after which a persistent Stata session is replaced.",
+            type=click.IntRange(min=1),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-pool-max-memory"],
+            help=(
+                "Memory like '4G' after which a persistent Stata session is replaced."
+            ),
+            type=str,
+            default=None,
+        ),
+        click.Option(
+            ["--stata-batch-size"],
+            help="Maximum number of do-files run in one Stata process with 'batch'.",
+            type=click.IntRange(min=1),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-async-max-tasks"],
+            help=(
+                "Maximum number of Stata processes run at the same time with 'async'. "
+                "Defaults to the number of CPUs."
+            ),
+            type=click.IntRange(min=1),
+            default=None,
+        ),
+        click.Option(
+            ["--stata-cluster-submit"],
+            help=(
+                "Command which submits a job script with 'cluster', like 'sbatch "
+                "--parsable'. Defaults to a local spool."
+            ),
+            type=str,
+            default=None,
+        ),
+        click.Option(
+            ["--stata-cluster-cancel"],
+            help="Command which cancels a job with 'cluster', like 'scancel'.",
+            type=str,
+            default=None,
+        ),
+        click.Option(
+            ["--stata-cluster-status"],
+            help=(
+                "Command which checks whether a job with 'cluster' is queued or "
+                "running, like 'squeue -h -j'."
+            ),
+            type=str,
+            default=None,
+        ),
+        click.Option(
+            ["--stata-cluster-poll-interval"],
+            help="Seconds between checks whether a job on the cluster finished.",
+            type=click.FloatRange(min=0, min_open=True),
+            default=None,
+        ),
     ]
     cli.commands["build"].params.extend(additional_parameters)
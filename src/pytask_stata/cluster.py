@@ -0,0 +1,296 @@
+"""Run do-files as jobs of a cluster scheduler like Slurm or PBS.
+
+Every task is run by a job script which changes into the directory of the log, runs
+Stata with a wrapper named after the log and writes the exit status of Stata to a
+file. The job script is submitted with a configurable command like ``sbatch`` and the
+task waits until the status file appears. A job which is cancelled while it is queued,
+whose node fails or which is killed cannot write the file, so the task also asks the
+scheduler with a status command whether the job still exists. Afterwards, the log is
+checked for errors like with the other backends, so the directory of the jobs and the
+logs must be on a file system which is shared with the nodes of the cluster.
+
+Without a configured command, jobs are submitted to the local spool of
+:mod:`pytask_stata.spool`.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import shlex
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from pytask_stata.driver import render_wrapper
+from pytask_stata.logs import read_log_tail
+from pytask_stata.process import ProcessUsage
+from pytask_stata.process import create_watchdog
+from pytask_stata.shared import StataResources
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Sequence
+    from pathlib import Path
+
+    from pytask_stata.process import Watchdog
+
+
+JOBS_DIRECTORY = ".pytask/stata-jobs"
+SPOOL_DIRECTORY = ".pytask/stata-spool"
+STATUS_FILE = "status"
+
+
+@dataclass(frozen=True)
+class ClusterConfig:
+    """The configuration of the submission of jobs.
+
+    Attributes
+    ----------
+    submit
+        The command which submits a job script. The path of the job script replaces
+        ``{script}`` or is appended.
+    cancel
+        The command which cancels a job. The id of the job replaces ``{job_id}`` or is
+        appended.
+    directory
+        The directory of the job scripts, which is shared with the cluster.
+    status
+        The command which checks whether a job is queued or running, like ``squeue -h
+        -j``. The id of the job replaces ``{job_id}`` or is appended. The job is gone if
+        the command fails or prints nothing.
+    poll_interval
+        The number of seconds between checks whether a job finished.
+    header
+        Lines added to the top of every job script, like ``#SBATCH`` directives. The
+        placeholders ``{name}`` and ``{cores}`` are replaced with the name of the log
+        and the requested cores.
+
+    """
+
+    submit: tuple[str, ...]
+    cancel: tuple[str, ...] | None
+    directory: Path
+    status: tuple[str, ...] | None = None
+    poll_interval: float = 2.0
+    header: tuple[str, ...] = ()
+
+
+def get_spool_commands(
+    spool: Path,
+) -> tuple[tuple[str, ...], tuple[str, ...], tuple[str, ...]]:
+    """Get the commands which submit, cancel and check jobs of a local spool."""
+    command = (sys.executable, "-m", "pytask_stata.spool")
+    submit = (*command, "submit", spool.as_posix())
+    cancel = (*command, "cancel", spool.as_posix())
+    status = (*command, "status", spool.as_posix())
+    return submit, cancel, status
+
+
+def format_command(command: Sequence[str], placeholder: str, value: str) -> list[str]:
+    """Replace a placeholder in a command or append the value.
+
+    Examples
+    --------
+    >>> format_command(["sbatch", "--parsable"], "script", "job.sh")
+    ['sbatch', '--parsable', 'job.sh']
+    >>> format_command(["qsub", "{script}", "-V"], "script", "job.sh")
+    ['qsub', 'job.sh', '-V']
+
+    """
+    key = f"{{{placeholder}}}"
+    if any(key in part for part in command):
+        return [part.replace(key, value) for part in command]
+    return [*command, value]
+
+
+def render_job_script(
+    executable: str,
+    wrapper: Path,
+    log: Path,
+    status: Path,
+    header: Sequence[str] = (),
+) -> str:
+    """Render a job script which runs Stata and writes its exit status to a file.
+
+    The status is also written if the scheduler terminates the job. The file is renamed
+    into place so that it is never read while it is written.
+
+    """
+    run = [executable, "-e", "do", wrapper.as_posix(), f"-{log.stem}"]
+    return "\n".join(
+        [
+            "#!/bin/sh",
+            *header,
+            f"status={shlex.quote(status.as_posix())}",
+            "finish() {",
+            '    echo "$1" > "$status.tmp" && mv "$status.tmp" "$status"',
+            '    exit "$1"',
+            "}",
+            "trap 'finish 143' TERM",
+            f"cd {shlex.quote(log.parent.as_posix())} || finish 1",
+            shlex.join(run),
+            "finish $?",
+            "",
+        ]
+    )
+
+
+def run_job(  # noqa: PLR0913, PLR0917
+    config: ClusterConfig,
+    executable: str,
+    script: Path,
+    options: Sequence[str],
+    cwd: Path,
+    log: Path,
+    resources: StataResources | None = None,
+    *,
+    n_lines: int = 10,
+    profile: bool = False,
+) -> ProcessUsage:
+    """Submit a job which runs a do-file and wait until it finished.
+
+    The limits of the resources are checked from the submission on, so the time in
+    the queue of the scheduler counts towards them. If the job exceeds them or the wait
+    is interrupted, the job is cancelled. If the job ends without writing its status,
+    the task fails.
+
+    """
+    resources = resources or StataResources()
+    directory = config.directory / _get_job_name(log)
+    directory.mkdir(parents=True, exist_ok=True)
+    status = directory / STATUS_FILE
+    status.unlink(missing_ok=True)
+    log.parent.mkdir(parents=True, exist_ok=True)
+    log.unlink(missing_ok=True)
+
+    wrapper = directory / f"{log.stem}.do"
+    wrapper.write_text(
+        render_wrapper(
+            script,
+            options,
+            resources,
+            cwd=None if cwd == log.parent else cwd,
+            profile=profile,
+        )
+    )
+    header = [
+        line.format(name=log.stem, cores=resources.cores or 1) for line in config.header
+    ]
+    job = directory / "job.sh"
+    job.write_text(render_job_script(executable, wrapper, log, status, header))
+
+    start = time.perf_counter()
+    job_id = submit_job(config, job)
+    print(f"Submitted job {job_id} which runs {script.as_posix()}.")  # noqa: T201
+    watchdog = create_watchdog(resources, log, lambda: None)
+    try:
+        returncode = _wait_for_status(
+            status,
+            lambda: job_exists(config, job_id),
+            watchdog,
+            config.poll_interval,
+            n_lines,
+        )
+    except JobLostError as e:
+        msg = (
+            f"The job {job_id} ended without writing its exit status. It might have "
+            "been cancelled, its node might have failed or it might have been killed."
+        )
+        if log.exists():
+            tail = "\n".join(read_log_tail(log, n_lines))
+            msg += f" Here are the last {n_lines} lines of the log:\n\n{tail}"
+        raise RuntimeError(msg) from e
+    except BaseException:
+        cancel_job(config, job_id)
+        raise
+
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, job.as_posix())
+    return ProcessUsage(wall_time=time.perf_counter() - start)
+
+
+def submit_job(config: ClusterConfig, job: Path) -> str:
+    """Submit a job script and return the id of the job.
+
+    The id is the last word of the output such that the outputs of ``sbatch``, ``sbatch
+    --parsable`` and ``qsub`` are understood.
+
+    """
+    result = subprocess.run(  # noqa: S603
+        format_command(config.submit, "script", job.as_posix()),
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode:
+        msg = (
+            f"Submitting the job {job.as_posix()!r} failed with exit code "
+            f"{result.returncode}.\n\n{result.stderr or result.stdout}"
+        )
+        raise RuntimeError(msg)
+    words = result.stdout.split()
+    return words[-1].split(";")[0] if words else ""
+
+
+def job_exists(config: ClusterConfig, job_id: str) -> bool:
+    """Ask the scheduler whether a job is queued or running.
+
+    Without a status command, the job is assumed to exist.
+
+    """
+    if config.status is None or not job_id:
+        return True
+    result = subprocess.run(  # noqa: S603
+        format_command(config.status, "job_id", job_id),
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return result.returncode == 0 and bool(result.stdout.strip())
+
+
+def cancel_job(config: ClusterConfig, job_id: str) -> None:
+    """Cancel a job if a command to cancel jobs is configured."""
+    if config.cancel is None or not job_id:
+        return
+    subprocess.run(  # noqa: S603
+        format_command(config.cancel, "job_id", job_id),
+        capture_output=True,
+        check=False,
+    )
+
+
+class JobLostError(Exception):
+    """The job ended without writing its exit status."""
+
+
+def _wait_for_status(
+    status: Path,
+    exists: Callable[[], bool],
+    watchdog: Watchdog | None,
+    poll_interval: float,
+    n_lines: int,
+) -> int:
+    """Wait until the job wrote its exit status.
+
+    The job writes its status before it ends, so the file is checked once more after
+    the job is gone.
+
+    """
+    while not status.exists():
+        if watchdog is not None and (reason := watchdog.check()) is not None:
+            raise RuntimeError(watchdog.format_error(reason, n_lines))
+        if not exists() and not status.exists():
+            raise JobLostError
+        time.sleep(poll_interval)
+    text = status.read_text().strip()
+    return int(text) if text.isdigit() else 1
+
+
+def _get_job_name(log: Path) -> str:
+    """Get a unique name of the job directory of a task from the path of its log."""
+    digest = hashlib.sha256(log.as_posix().encode()).hexdigest()[:8]
+    return f"{log.stem}-{digest}"
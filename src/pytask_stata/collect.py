@@ -3,15 +3,24 @@
 from __future__ import annotations
 
 import functools
-import subprocess
+import hashlib
+import os
+import tempfile
+import time
 import warnings
+from dataclasses import asdict
+from dataclasses import replace
 from pathlib import Path
+from typing import TYPE_CHECKING
 from typing import Any
+from typing import TypeVar
 from typing import cast
 
 from pytask import Mark
 from pytask import NodeInfo
 from pytask import PathNode
+from pytask import PNode
+from pytask import PPathNode
 from pytask import PTask
 from pytask import PythonNode
 from pytask import Session
@@ -23,9 +32,44 @@ from pytask import is_task_function
 from pytask import parse_dependencies_from_task_function
 from pytask import parse_products_from_task_function
 from pytask import remove_marks
+from pytask.tree_util import tree_leaves
 
+from pytask_stata.cluster import SPOOL_DIRECTORY
+from pytask_stata.cluster import ClusterConfig
+from pytask_stata.cluster import get_spool_commands
+from pytask_stata.cluster import run_job
+from pytask_stata.discovery import find_stata_edition
+from pytask_stata.discovery import get_stata_info
+from pytask_stata.driver import check_return_code
+from pytask_stata.driver import render_wrapper
+from pytask_stata.dta import DTA_SUFFIX
+from pytask_stata.dta import DtaExpectation
+from pytask_stata.dta import parse_expectations
+from pytask_stata.execute import print_log_line
+from pytask_stata.partitions import Partitioning
+from pytask_stata.partitions import parse_partitioning
+from pytask_stata.pool import PoolConfig
+from pytask_stata.pool import get_pool
+from pytask_stata.process import ProcessUsage
+from pytask_stata.process import run_stata_process
+from pytask_stata.scanner import find_includes
+from pytask_stata.seats import SeatLimiter
+from pytask_stata.seats import create_limiter
+from pytask_stata.seats import run_with_seat
+from pytask_stata.shared import StataResources
 from pytask_stata.shared import convert_task_id_to_name_of_log_file
+from pytask_stata.shared import get_log_directory
 from pytask_stata.shared import stata
+from pytask_stata.usage import get_usage_path
+from pytask_stata.usage import write_usage
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from pytask_stata.scanner import ScanCache
+
+
+T = TypeVar("T")
 
 
 def run_stata_script(
@@ -34,16 +78,111 @@ def run_stata_script(
     _options: list[str],
     _log_name: str,
     _cwd: Path,
+    *,
+    _log_dir: Path | None = None,
+    _backend: str = "subprocess",
+    _pool_config: PoolConfig | None = None,
+    _cluster_config: ClusterConfig | None = None,
+    _stream_log: bool = False,
+    _check_log_lines: int = 10,
+    _limiter: SeatLimiter | None = None,
+    _license_retries: int = 0,
+    _resources: StataResources | None = None,
+    _usage_file: Path | None = None,
+    _profile: bool = False,
+    _frame_arguments: list[str] | None = None,
+    _print_log_line: Callable[[str, str], None] = print_log_line,
     **_kwargs: Any,
 ) -> None:
     """Run an R script."""
-    cmd = [_executable, "-e", "do", _script.as_posix(), *_options, f"-{_log_name}"]
-    print("Executing " + " ".join(cmd) + ".")  # noqa: T201
-    subprocess.run(cmd, cwd=_cwd, check=True)  # noqa: S603
+    options = [*_options, *(_frame_arguments or [])]
+    cwd = Path(_cwd)
+    log_dir = cwd if _log_dir is None else _log_dir
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log = log_dir / f"{_log_name}.log"
+
+    if _backend == "pool":
+        print(f"Executing {_script.as_posix()} in a persistent Stata session.")  # noqa: T201
+        start = time.perf_counter()
+        return_code = get_pool(_executable, _pool_config or PoolConfig()).run(
+            _script,
+            options,
+            cwd,
+            log,
+            _resources,
+            n_lines=_check_log_lines,
+            profile=_profile,
+        )
+        if _usage_file is not None:
+            write_usage(_usage_file, ProcessUsage(time.perf_counter() - start))
+        check_return_code(return_code, _script, log)
+        return
+
+    if _backend == "cluster":
+        usage = run_with_seat(
+            functools.partial(
+                run_job,
+                cast("ClusterConfig", _cluster_config),
+                _executable,
+                _script,
+                options,
+                cwd,
+                log,
+                _resources,
+                n_lines=_check_log_lines,
+                profile=_profile,
+            ),
+            _limiter,
+            log,
+            retries=_license_retries,
+        )
+        if _usage_file is not None:
+            write_usage(_usage_file, usage)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Stata writes the log to the directory where it starts and names it after the
+        # do-file. A wrapper named after the task gives every task its own log even if
+        # tasks share the do-file, and changes into the working directory of the task.
+        script = Path(tmp, f"{_log_name}.do")
+        script.write_text(
+            render_wrapper(
+                _script,
+                options,
+                _resources or StataResources(),
+                cwd=None if log_dir == cwd else cwd,
+                profile=_profile,
+            )
+        )
+
+        cmd = [_executable, "-e", "do", script.as_posix(), f"-{_log_name}"]
+        print(  # noqa: T201
+            "Executing "
+            + " ".join([_executable, "-e", "do", _script.as_posix(), *options])
+            + "."
+        )
+        usage = run_with_seat(
+            functools.partial(
+                run_stata_process,
+                cmd,
+                cwd=log_dir,
+                log=log,
+                follow_log=_stream_log,
+                n_lines=_check_log_lines,
+                on_line=functools.partial(_print_log_line, _script.name),
+                resources=_resources,
+            ),
+            _limiter,
+            log,
+            retries=_license_retries,
+        )
+
+    if _usage_file is not None:
+        write_usage(_usage_file, usage)
 
 
 @hookimpl
-def pytask_collect_task(
+def pytask_collect_task(  # noqa: PLR0915
     session: Session, path: Path, name: str, obj: Any
 ) -> Task | None:
     """Perform some checks and prepare the task function."""
@@ -63,12 +202,22 @@ def pytask_collect_task(
             )
             raise ValueError(msg)
 
-        mark = _parse_stata_mark(mark=marks[0])
-        script, options = stata(**marks[0].kwargs)
-        cast("Any", obj).pytask_meta.markers.append(mark)
+        kwargs = dict(marks[0].kwargs)
+        expect = kwargs.pop("expect", None)
+        partitioning = parse_partitioning(
+            kwargs.pop("partition_by", None), kwargs.pop("n_partitions", None)
+        )
+        script, options, requested = stata(**kwargs)
+        resources = _apply_default_limits(session.config, requested)
+        _check_limits(session.config, name, resources)
 
         # Collect the nodes in @pytask.mark.julia and validate them.
         path_nodes = Path.cwd() if path is None else path.parent
+        expectations = _parse_expectations(expect, path_nodes)
+        mark = _create_stata_mark(
+            script, options, resources, expectations, partitioning
+        )
+        cast("Any", obj).pytask_meta.markers.append(mark)
 
         if isinstance(script, str):
             warnings.warn(
@@ -78,13 +227,7 @@ def pytask_collect_task(
             )
             script = Path(script)
 
-        script_node = session.hook.pytask_collect_node(
-            session=session,
-            path=path_nodes,
-            node_info=NodeInfo(
-                arg_name="script", path=(), value=script, task_path=path, task_name=name
-            ),
-        )
+        script_node = _collect_script_node(session, path_nodes, path, name, script)
 
         if not (isinstance(script_node, PathNode) and script_node.path.suffix == ".do"):
             msg = (
@@ -105,27 +248,27 @@ def pytask_collect_task(
             ),
         )
 
-        executable_node = session.hook.pytask_collect_node(
-            session=session,
-            path=path_nodes,
-            node_info=NodeInfo(
-                arg_name="_executable",
-                path=(),
-                value=session.config["stata"],
-                task_path=path,
-                task_name=name,
+        edition = resources.edition or "default"
+        executable_node = _share(
+            session,
+            ("_executable", edition),
+            lambda: _collect_shared_node(
+                session,
+                path_nodes,
+                "_executable",
+                edition,
+                _find_executable(session, resources.edition),
             ),
         )
-
-        cwd_node = session.hook.pytask_collect_node(
-            session=session,
-            path=path_nodes,
-            node_info=NodeInfo(
-                arg_name="_cwd",
-                path=(),
-                value=path.parent.as_posix(),
-                task_path=path,
-                task_name=name,
+        cwd_node = _share(
+            session,
+            ("_cwd", path.parent),
+            lambda: _collect_shared_node(
+                session,
+                path_nodes,
+                "_cwd",
+                path.parent.as_posix(),
+                path.parent.as_posix(),
             ),
         )
 
@@ -135,6 +278,9 @@ def pytask_collect_task(
         products = parse_products_from_task_function(
             session, path, name, path_nodes, obj
         )
+        _check_expected_products(name, expectations, products)
+        if partitioning is not None:
+            _check_partitioned_task(name, dependencies, products)
 
         # Add script
         dependencies["_script"] = script_node
@@ -142,7 +288,25 @@ def pytask_collect_task(
         dependencies["_cwd"] = cwd_node
         dependencies["_executable"] = executable_node
 
-        partialed = functools.partial(run_stata_script, _cwd=path.parent)
+        partialed = functools.partial(
+            run_stata_script,
+            _cwd=path.parent,
+            _backend=session.config["stata_backend"],
+            _pool_config=_share(
+                session, ("pool_config",), lambda: _create_pool_config(session)
+            ),
+            _cluster_config=_share(
+                session, ("cluster_config",), lambda: _create_cluster_config(session)
+            ),
+            _stream_log=session.config["stata_stream_log"],
+            _check_log_lines=session.config["stata_check_log_lines"],
+            _limiter=_share(
+                session, ("limiter",), lambda: create_limiter(session.config)
+            ),
+            _license_retries=session.config["stata_license_retries"],
+            _resources=resources,
+            _profile=session.config["stata_profile"],
+        )
         markers = obj.pytask_meta.markers if hasattr(obj, "pytask_meta") else []  # ty: ignore[unresolved-attribute]
 
         task: PTask
@@ -164,11 +328,16 @@ def pytask_collect_task(
                 markers=markers,
             )
 
-        # Add log_name node that depends on the task id.
-        if session.config["platform"] == "win32":
-            log_name = convert_task_id_to_name_of_log_file(task)
-        else:
-            log_name = ""
+        task.function = functools.partial(
+            task.function,
+            _log_dir=get_log_directory(
+                path.parent, session.config["root"], session.config["stata_log_dir"]
+            ),
+            _usage_file=get_usage_path(session.config["root"], task),
+        )
+
+        # Add log_name node that depends on the task id, so every task has its own log.
+        log_name = convert_task_id_to_name_of_log_file(task)
 
         log_name_node = session.hook.pytask_collect_node(
             session=session,
@@ -183,12 +352,324 @@ def pytask_collect_task(
         )
         task.depends_on["_log_name"] = log_name_node
 
+        if session.config["stata_track_includes"]:
+            includes_node = session.hook.pytask_collect_node(
+                session=session,
+                path=path_nodes,
+                node_info=NodeInfo(
+                    arg_name="_includes",
+                    path=(),
+                    value=PythonNode(
+                        value=_hash_includes(
+                            session.config["stata_scan_cache"],
+                            script_node.path,
+                            cast("list[str]", options),
+                            path.parent,
+                            session.config["stata_adopath"],
+                        ),
+                        hash=True,
+                    ),
+                    task_path=path,
+                    task_name=name,
+                ),
+            )
+            task.depends_on["_includes"] = includes_node
+
+        if session.config["stata_infer_dependencies"]:
+            _infer_nodes(
+                session.config["stata_scan_cache"],
+                task,
+                script_node.path,
+                cast("list[str]", options),
+                path.parent,
+            )
+
         return task
     return None
 
 
+@hookimpl
+def pytask_collect_modify_tasks(session: Session, tasks: list[PTask]) -> None:
+    """Add the inferred dependencies of do-files.
+
+    Only files which exist or which are produced by another task are added. Other
+    files might be created and removed by the do-file itself.
+
+    """
+    if "stata_scan_cache" not in session.config:
+        return
+    session.config["stata_scan_cache"].save()
+
+    if not session.config["stata_infer_dependencies"]:
+        return
+
+    products = {path for task in tasks for path in _get_paths(task.produces)}
+    for task in tasks:
+        inferred = task.attributes.pop("stata_inferred_dependencies", [])
+        own_products = set(_get_paths(task.produces))
+        nodes = [
+            PathNode.from_path(path)
+            for path in inferred
+            if (path.exists() or path in products) and path not in own_products
+        ]
+        if nodes:
+            task.depends_on["_inferred_dependencies"] = nodes
+
+
 def _parse_stata_mark(mark: Mark) -> Mark:
     """Parse a Stata mark."""
-    script, options = stata(**mark.kwargs)
+    kwargs = dict(mark.kwargs)
+    expectations = _parse_expectations(kwargs.pop("expect", None), Path.cwd())
+    partitioning = parse_partitioning(
+        kwargs.pop("partition_by", None), kwargs.pop("n_partitions", None)
+    )
+    return _create_stata_mark(*stata(**kwargs), expectations, partitioning)
+
+
+def _create_stata_mark(
+    script: str | Path | None,
+    options: Any,
+    resources: StataResources,
+    expectations: dict[Path, DtaExpectation] | None = None,
+    partitioning: Partitioning | None = None,
+) -> Mark:
+    """Create a Stata mark from the parsed arguments."""
     parsed_kwargs = {"script": script or None, "options": options or []}
+    parsed_kwargs.update(
+        {key: value for key, value in asdict(resources).items() if value is not None}
+    )
+    if expectations:
+        parsed_kwargs["expect"] = expectations
+    if partitioning is not None:
+        parsed_kwargs["partition_by"] = partitioning.key
+        parsed_kwargs["n_partitions"] = partitioning.n_partitions
     return Mark("stata", (), parsed_kwargs)
+
+
+def _parse_expectations(value: Any, root: Path) -> dict[Path, DtaExpectation]:
+    """Parse the expectations of datasets by the paths of the products."""
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        msg = (
+            "'expect' must be a dict which maps the paths of .dta products to their "
+            f"expectations, but it is {value!r}."
+        )
+        raise TypeError(msg)
+    return {
+        Path(os.path.normpath(root.joinpath(key))): parse_expectations(expectation)
+        for key, expectation in value.items()
+    }
+
+
+def _check_expected_products(
+    name: str, expectations: dict[Path, DtaExpectation], products: Any
+) -> None:
+    """Check that expectations only refer to .dta products of the task."""
+    datasets = {path for path in _get_paths(products) if path.suffix == DTA_SUFFIX}
+    unknown = [path.as_posix() for path in expectations if path not in datasets]
+    if unknown:
+        msg = (
+            f"The expectations of task {name!r} refer to {unknown}, which are not .dta "
+            "products of the task."
+        )
+        raise ValueError(msg)
+
+
+def _check_partitioned_task(
+    name: str, dependencies: dict[str, Any], products: dict[str, Any]
+) -> None:
+    """Check that a partitioned task splits one dataset and produces one dataset.
+
+    The dataset which is split must be passed to its own argument, so that it can be
+    replaced by the partitions.
+
+    """
+    datasets = [
+        node
+        for node in dependencies.values()
+        if isinstance(node, PPathNode) and node.path.suffix == DTA_SUFFIX
+    ]
+    outputs = tree_leaves(products)  # ty: ignore[invalid-argument-type]
+    if len(datasets) != 1 or not (
+        len(outputs) == 1
+        and isinstance(outputs[0], PPathNode)
+        and outputs[0].path.suffix == DTA_SUFFIX
+    ):
+        msg = (
+            f"The partitioned task {name!r} must have exactly one argument with a .dta "
+            "file as a dependency, which is split, and exactly one .dta file as a "
+            "product, to which the partial outputs are appended."
+        )
+        raise ValueError(msg)
+
+
+def _check_limits(config: dict[str, Any], name: str, resources: StataResources) -> None:
+    """Check that the backend can enforce the limits of a task."""
+    if config["stata_backend"] == "batch" and resources.has_limits():
+        msg = (
+            f"Task {name!r} limits its Stata process with 'timeout', 'idle_timeout' or "
+            "'max_rss', but the 'batch' backend cannot enforce limits since all tasks "
+            "of a batch run in one Stata process. Use another backend or remove the "
+            "limits."
+        )
+        raise ValueError(msg)
+
+
+def _apply_default_limits(
+    config: dict[str, Any], resources: StataResources
+) -> StataResources:
+    """Apply the global limits of Stata processes which the task does not set."""
+    return replace(
+        resources,
+        **{
+            name: config[f"stata_{name}"]
+            for name in ("timeout", "idle_timeout", "max_rss")
+            if getattr(resources, name) is None
+        },
+    )
+
+
+def _collect_script_node(
+    session: Session, path_nodes: Path, path: Path, name: str, script: Any
+) -> PNode:
+    """Collect the node of the do-file."""
+
+    def collect() -> PNode:
+        return session.hook.pytask_collect_node(
+            session=session,
+            path=path_nodes,
+            node_info=NodeInfo(
+                arg_name="script", path=(), value=script, task_path=path, task_name=name
+            ),
+        )
+
+    # Parametrized tasks often share the script, so its node is collected once.
+    if isinstance(script, Path):
+        return _share(session, ("script", path_nodes, script), collect)
+    return collect()
+
+
+def _share(session: Session, key: tuple[Any, ...], create: Callable[[], T]) -> T:
+    """Create an object once per session and share it between tasks with the same key.
+
+    Collecting the same nodes and arguments for every task dominates the collection of
+    large parametrized projects.
+
+    """
+    shared = session.config.setdefault("stata_shared", {})
+    if key not in shared:
+        shared[key] = create()
+    return shared[key]
+
+
+def _collect_shared_node(
+    session: Session, path: Path, arg_name: str, key: str, value: Any
+) -> PNode:
+    """Collect a node which does not belong to a single task.
+
+    The key distinguishes the signatures of shared nodes with the same argument name.
+
+    """
+    return session.hook.pytask_collect_node(
+        session=session,
+        path=path,
+        node_info=NodeInfo(
+            arg_name=arg_name,
+            path=(key,),
+            value=value,
+            task_path=None,
+            task_name="pytask-stata",
+        ),
+    )
+
+
+def _find_executable(session: Session, edition: str | None) -> str | None:
+    """Find the executable of the requested edition or use the configured one."""
+    if edition is None:
+        return session.config["stata"]
+    info = get_stata_info(session.config)
+    if info is not None and info.edition == edition:
+        return session.config["stata"]
+    info = find_stata_edition(session.config["root"], edition)
+    return None if info is None else info.executable
+
+
+def _infer_nodes(
+    cache: ScanCache, task: PTask, script: Path, options: list[str], cwd: Path
+) -> None:
+    """Scan the do-file and add the files it reads and writes to the task.
+
+    Inferred products are added immediately. Inferred dependencies are stored on the
+    task and added once all tasks are collected. Files which the do-file saves and
+    erases itself are neither products nor dependencies.
+
+    """
+    resolved = cache.scan(script).resolve(options, cwd)
+    declared = {
+        *_get_paths(task.depends_on),
+        *_get_paths(task.produces),
+        *resolved["temporary"],
+    }
+
+    products = [path for path in resolved["product"] if path not in declared]
+    if products:
+        task.produces["_inferred_products"] = [
+            PathNode.from_path(path) for path in products
+        ]
+
+    task.attributes["stata_inferred_dependencies"] = [
+        path
+        for path in (*resolved["dependency"], *resolved["include"])
+        if path not in declared and path not in products
+    ]
+
+
+def _hash_includes(
+    cache: ScanCache,
+    script: Path,
+    options: list[str],
+    cwd: Path,
+    adopath: list[Path],
+) -> str:
+    """Hash the content of all do-files and ado-files the script runs."""
+    includes = find_includes(cache, script, options, cwd, adopath)
+    lines = [f"{path.as_posix()} {cache.digest(path)}" for path in includes]
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+def _get_paths(nodes: Any) -> list[Path]:
+    """Get the paths of all path nodes in a tree of nodes."""
+    return [node.path for node in tree_leaves(nodes) if isinstance(node, PPathNode)]
+
+
+def _create_pool_config(session: Session) -> PoolConfig | None:
+    """Create the configuration of the pool of persistent Stata sessions."""
+    if session.config["stata_backend"] != "pool":
+        return None
+    return PoolConfig(
+        size=session.config["stata_pool_size"],
+        max_tasks=session.config["stata_pool_max_tasks"],
+        max_memory=session.config["stata_pool_max_memory"],
+    )
+
+
+def _create_cluster_config(session: Session) -> ClusterConfig | None:
+    """Create the configuration of the submission of jobs to a cluster."""
+    if session.config["stata_backend"] != "cluster":
+        return None
+    submit = session.config["stata_cluster_submit"]
+    cancel = session.config["stata_cluster_cancel"]
+    status = session.config["stata_cluster_status"]
+    if submit is None:
+        submit, cancel, status = get_spool_commands(
+            session.config["root"] / SPOOL_DIRECTORY
+        )
+    return ClusterConfig(
+        submit=submit,
+        cancel=cancel,
+        directory=session.config["stata_cluster_dir"],
+        status=status,
+        poll_interval=session.config["stata_cluster_poll_interval"],
+        header=tuple(session.config["stata_cluster_header"]),
+    )
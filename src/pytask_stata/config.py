@@ -2,13 +2,21 @@
 
 from __future__ import annotations
 
-import shutil
+import os
+import shlex
 import sys
 from typing import Any
 
 from pytask import hookimpl
 
-from pytask_stata.shared import STATA_COMMANDS
+from pytask_stata.cluster import JOBS_DIRECTORY
+from pytask_stata.discovery import locate_stata
+from pytask_stata.scanner import CACHE_FILE
+from pytask_stata.scanner import ScanCache
+from pytask_stata.seats import SEATS_DIRECTORY
+from pytask_stata.shared import STATA_BACKENDS
+from pytask_stata.shared import _to_list
+from pytask_stata.shared import parse_memory
 
 
 @hookimpl
@@ -17,8 +25,137 @@ def pytask_parse_config(config: dict[str, Any]) -> None:
     config["markers"]["stata"] = "Tasks which are executed with Stata."
     config["platform"] = sys.platform
 
-    if not config.get("stata"):
-        config["stata"] = next(
-            (executable for executable in STATA_COMMANDS if shutil.which(executable)),
-            None,
+    # Stata is probed lazily with get_stata_info since it starts Stata.
+    config["stata"] = config.get("stata") or locate_stata(config["root"])
+
+    config["stata_infer_dependencies"] = bool(config.get("stata_infer_dependencies"))
+    config["stata_track_includes"] = bool(config.get("stata_track_includes"))
+    config["stata_adopath"] = [
+        config["root"] / path for path in _to_list(config.get("stata_adopath") or [])
+    ]
+    if config["stata_infer_dependencies"] or config["stata_track_includes"]:
+        config["stata_scan_cache"] = ScanCache(config["root"] / ".pytask" / CACHE_FILE)
+
+    log_dir = config.get("stata_log_dir")
+    config["stata_log_dir"] = None if log_dir is None else config["root"] / log_dir
+
+    config["stata_license_dir"] = config["root"] / (
+        config.get("stata_license_dir") or SEATS_DIRECTORY
+    )
+    config["stata_license_retries"] = int(config.get("stata_license_retries") or 0)
+    max_concurrent = config.get("stata_max_concurrent")
+    config["stata_max_concurrent"] = (
+        None if max_concurrent is None else int(max_concurrent)
+    )
+
+    config["stata_cores"] = int(config.get("stata_cores") or os.cpu_count() or 1)
+    if config.get("stata_memory") is not None:
+        config["stata_memory"] = parse_memory(config["stata_memory"])
+
+    for name in ("stata_timeout", "stata_idle_timeout"):
+        value = config.get(name)
+        config[name] = None if value is None else float(value)
+    max_rss = config.get("stata_max_rss")
+    config["stata_max_rss"] = None if max_rss is None else parse_memory(max_rss)
+
+    slowest = config.get("stata_slowest")
+    config["stata_slowest"] = 5 if slowest is None else int(slowest)
+    if config.get("stata_usage_file") is not None:
+        config["stata_usage_file"] = config["root"] / config["stata_usage_file"]
+    config["stata_profile"] = bool(config.get("stata_profile"))
+
+    config["stata_backend"] = _parse_backend(config.get("stata_backend"), config)
+    config["stata_pool_size"] = _parse_pool_size(config.get("stata_pool_size"), config)
+    config["stata_async_max_tasks"] = int(
+        config.get("stata_async_max_tasks") or os.cpu_count() or 1
+    )
+    if config.get("stata_pool_max_memory") is not None:
+        config["stata_pool_max_memory"] = parse_memory(config["stata_pool_max_memory"])
+
+    config["stata_cluster_submit"] = _parse_command(config.get("stata_cluster_submit"))
+    config["stata_cluster_cancel"] = _parse_command(config.get("stata_cluster_cancel"))
+    config["stata_cluster_status"] = _parse_command(config.get("stata_cluster_status"))
+    config["stata_cluster_dir"] = config["root"] / (
+        config.get("stata_cluster_dir") or JOBS_DIRECTORY
+    )
+    config["stata_cluster_poll_interval"] = float(
+        config.get("stata_cluster_poll_interval") or 2.0
+    )
+    config["stata_cluster_header"] = [
+        str(line) for line in _to_list(config.get("stata_cluster_header") or [])
+    ]
+
+
+def _parse_backend(value: Any, config: dict[str, Any]) -> str:
+    """Parse the backend which executes do-files."""
+    backend = value or "subprocess"
+    if backend not in STATA_BACKENDS:
+        msg = f"'stata_backend' must be one of {STATA_BACKENDS}, but it is {backend!r}."
+        raise ValueError(msg)
+    if backend == "pool" and config["platform"] == "win32":
+        msg = (
+            "The 'pool' backend needs Stata's console mode which is not available on "
+            "Windows."
+        )
+        raise ValueError(msg)
+    if backend == "pool" and (
+        config.get("stata_max_concurrent") is not None
+        or config.get("stata_license_retries")
+    ):
+        msg = (
+            "The 'pool' backend does not support 'stata_max_concurrent' and "
+            "'stata_license_retries' since its sessions hold a license for the whole "
+            "build. Limit the number of sessions with 'stata_pool_size' instead."
+        )
+        raise ValueError(msg)
+    if backend == "cluster" and config["platform"] == "win32":
+        msg = (
+            "The 'cluster' backend runs shell scripts which are not supported on "
+            "Windows."
         )
+        raise ValueError(msg)
+    if backend == "batch":
+        unsupported = [
+            name
+            for name in (
+                "stata_stream_log",
+                "stata_timeout",
+                "stata_idle_timeout",
+                "stata_max_rss",
+            )
+            if config.get(name)
+        ]
+        if unsupported:
+            msg = (
+                f"The 'batch' backend does not support {unsupported} since all tasks "
+                "of a batch run in one Stata process. Use another backend or remove "
+                "the options."
+            )
+            raise ValueError(msg)
+    return backend
+
+
+def _parse_command(value: Any) -> tuple[str, ...] | None:
+    """Parse a command given as a string or a list of arguments.
+
+    Examples
+    --------
+    >>> _parse_command("sbatch --parsable")
+    ('sbatch', '--parsable')
+    >>> _parse_command(["qsub", "-V"])
+    ('qsub', '-V')
+
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        return tuple(shlex.split(value))
+    return tuple(map(str, value))
+
+
+def _parse_pool_size(value: Any, config: dict[str, Any]) -> int:
+    """Parse the number of persistent Stata sessions."""
+    if value is None:
+        n_workers = config.get("n_workers")
+        return n_workers if isinstance(n_workers, int) else 1
+    return int(value)
@@ -0,0 +1,238 @@
+"""Find the Stata executable and probe its version and capabilities.
+
+Searching the ``PATH`` for all possible names of Stata's executable and starting Stata
+to ask for its version is slow, especially on network file systems. The results are
+cached in the ``.pytask`` folder and reused as long as the ``PATH`` and the
+modification time of the executable do not change.
+
+Starting Stata might also occupy a seat of the license. The configuration therefore
+only looks up the executable on the ``PATH``, which is cached in the same file, and
+Stata is probed once a Stata task needs the information, like its edition.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from dataclasses import asdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from pytask_stata.shared import STATA_COMMANDS
+
+CACHE_FILE = "stata-executables.json"
+
+PROBE_TIMEOUT = 60
+"""The number of seconds Stata has to answer the probe."""
+
+_PROBE = """
+display "pytask-stata-version " c(stata_version)
+display "pytask-stata-edition " c(edition_real)
+display "pytask-stata-processors " c(processors_lic)
+"""
+
+
+@dataclass(frozen=True)
+class StataInfo:
+    """Information on a Stata executable.
+
+    Attributes
+    ----------
+    executable
+        The name of the executable as it is called.
+    path
+        The resolved path to the executable.
+    mtime
+        The modification time of the executable used to invalidate the cache.
+    edition
+        The edition of Stata like ``"MP"``, ``"SE"``, or ``"BE"``.
+    version
+        The version of Stata like ``"18"``.
+    processors
+        The number of processors the license allows Stata MP to use.
+
+    """
+
+    executable: str
+    path: str
+    mtime: float
+    edition: str | None = None
+    version: str | None = None
+    processors: int | None = None
+
+
+def locate_stata(root: Path) -> str | None:
+    """Return the first name of Stata's executable which is found on the ``PATH``.
+
+    The result is cached like the information of :func:`find_stata` without starting
+    Stata. A missing executable is not cached since Stata might be installed later.
+
+    """
+    cache_path = root / ".pytask" / CACHE_FILE
+    cache = _read_cache(cache_path)
+    key = _create_location_key()
+
+    entry = cache.get(key, {})
+    if "path" in entry and _get_mtime(entry["path"]) == entry.get("mtime"):
+        return entry["executable"]
+
+    for name in STATA_COMMANDS:
+        if path := shutil.which(name):
+            break
+    else:
+        return None
+
+    cache[key] = {"executable": name, "path": path, "mtime": _get_mtime(path)}
+    _write_cache(cache_path, cache)
+    return name
+
+
+def get_stata_info(config: dict[str, Any]) -> StataInfo | None:
+    """Return the information on the configured executable of Stata.
+
+    The configuration does not contain the version, edition and licensed processors of
+    Stata since they are only known after Stata was started. This function probes the
+    executable on the first call of a session or reads the information from the cache.
+
+    """
+    if "stata_info" not in config:
+        executable = config["stata"]
+        config["stata_info"] = (
+            None if executable is None else find_stata(config["root"], executable)
+        )
+    return config["stata_info"]
+
+
+def find_stata(root: Path, executable: str | None = None) -> StataInfo | None:
+    """Find the Stata executable and return its cached or probed information.
+
+    Parameters
+    ----------
+    root
+        The root of the project which contains the ``.pytask`` folder.
+    executable
+        An executable configured by the user. Otherwise, all names in
+        :data:`~pytask_stata.shared.STATA_COMMANDS` are searched on the ``PATH``.
+
+    """
+    cache_path = root / ".pytask" / CACHE_FILE
+    cache = _read_cache(cache_path)
+    key = _create_cache_key(executable)
+
+    if key in cache:
+        try:
+            info = StataInfo(**cache[key])
+        except TypeError:
+            pass
+        else:
+            if _get_mtime(info.path) == info.mtime:
+                return info
+
+    for name in [executable] if executable else STATA_COMMANDS:
+        if path := shutil.which(name):
+            break
+    else:
+        return None
+
+    info = probe_stata(name, path)
+
+    cache[key] = asdict(info)
+    _write_cache(cache_path, cache)
+    return info
+
+
+def find_stata_edition(root: Path, edition: str) -> StataInfo | None:
+    """Find an executable of a specific edition of Stata on the ``PATH``."""
+    for name in STATA_COMMANDS:
+        if _guess_edition(name) == edition and shutil.which(name):
+            return find_stata(root, name)
+    return None
+
+
+def probe_stata(executable: str, path: str) -> StataInfo:
+    """Start Stata once to ask for its version, edition and licensed processors."""
+    values = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        probe = Path(tmp, "probe.do")
+        probe.write_text(_PROBE)
+        cmd = [path, "-e", "do", probe.as_posix(), f"-{probe.stem}"]
+        try:
+            subprocess.run(  # noqa: S603
+                cmd, cwd=tmp, check=True, capture_output=True, timeout=PROBE_TIMEOUT
+            )
+            log = probe.with_suffix(".log").read_text(errors="replace")
+        except (OSError, subprocess.SubprocessError):
+            log = ""
+
+    for match in re.finditer(r"^pytask-stata-(\w+) +(\S+)", log, flags=re.MULTILINE):
+        values[match.group(1)] = match.group(2)
+
+    processors = values.get("processors", "")
+    return StataInfo(
+        executable=executable,
+        path=path,
+        mtime=_get_mtime(path) or 0.0,
+        edition=values.get("edition") or _guess_edition(executable),
+        version=values.get("version"),
+        processors=int(processors) if processors.isdigit() else None,
+    )
+
+
+def _guess_edition(executable: str) -> str:
+    """Guess the edition from the name of the executable.
+
+    Examples
+    --------
+    >>> _guess_edition("StataMP-64")
+    'MP'
+    >>> _guess_edition("stata-se")
+    'SE'
+    >>> _guess_edition("stata")
+    'BE'
+
+    """
+    name = executable.upper()
+    if "MP" in name:
+        return "MP"
+    if "SE" in name:
+        return "SE"
+    return "BE"
+
+
+def _create_cache_key(executable: str | None) -> str:
+    raw_key = json.dumps([os.environ.get("PATH", ""), executable, STATA_COMMANDS])
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
+
+def _create_location_key() -> str:
+    raw_key = json.dumps(["location", os.environ.get("PATH", ""), STATA_COMMANDS])
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
+
+def _get_mtime(path: str) -> float | None:
+    try:
+        return Path(path).stat().st_mtime
+    except OSError:
+        return None
+
+
+def _read_cache(path: Path) -> dict[str, dict[str, Any]]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(path: Path, cache: dict[str, dict[str, Any]]) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(cache, indent=2))
+    except OSError:
+        pass
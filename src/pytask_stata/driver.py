@@ -0,0 +1,152 @@
+"""Render Stata commands which run do-files inside an existing Stata session.
+
+Other execution modes than a fresh ``stata -e do`` process, like a persistent worker,
+send these commands to Stata. Each script writes its own log and reports its return
+code with a marker line which can be parsed from Stata's output.
+
+"""
+
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING
+
+from pytask_stata.shared import StataResources
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from collections.abc import Sequence
+    from pathlib import Path
+
+
+RC_MARKER = "pytask-stata-rc"
+LOG_NAME = "pytask_stata"
+PROFILE_COMMAND = "set rmsg on"
+
+
+def quote(value: str) -> str:
+    """Wrap a value in Stata's compound double quotes.
+
+    Examples
+    --------
+    >>> print(quote('say "hi"'))
+    `"say "hi""'
+
+    """
+    return f'`"{value}"\''
+
+
+def render_run_commands(  # noqa: PLR0913, PLR0917
+    script: Path,
+    options: Sequence[str],
+    cwd: Path,
+    log: Path,
+    token: str,
+    resources: StataResources | None = None,
+    *,
+    profile: bool = False,
+) -> list[str]:
+    """Render the commands to run a do-file with its own log and return code.
+
+    The session is cleared before the script runs so that it behaves as if it was
+    executed in a fresh Stata process. Errors are captured such that the session
+    survives and the return code is displayed with a marker line containing the token.
+    Requested resources are applied before the script runs and reset afterwards. If the
+    script is profiled, Stata reports the time of every command in the log.
+
+    """
+    resources = resources or StataResources()
+    arguments = " ".join(quote(option) for option in options)
+    return [
+        f"cd {quote(cwd.as_posix())}",
+        "clear all",
+        *resources.setup_commands(),
+        f"log using {quote(log.as_posix())}, text replace name({LOG_NAME})",
+        *([PROFILE_COMMAND] if profile else []),
+        f"capture noisily do {quote(script.as_posix())} {arguments}".rstrip(),
+        "local pytask_stata_rc = _rc",
+        *(["set rmsg off"] if profile else []),
+        f"log close {LOG_NAME}",
+        *resources.reset_commands(),
+        f'display "{RC_MARKER} {token} `pytask_stata_rc\'"',
+    ]
+
+
+def render_wrapper(
+    script: Path,
+    options: Sequence[str],
+    resources: StataResources,
+    cwd: Path | None = None,
+    *,
+    profile: bool = False,
+) -> str:
+    """Render a do-file which applies the resources and runs the script.
+
+    If a working directory is given, the wrapper changes into it before it runs the
+    script. Stata opens the log of the wrapper before, so the log stays where Stata was
+    started. If the script is profiled, Stata reports the time of every command.
+
+    Examples
+    --------
+    >>> from pathlib import Path
+    >>> print(render_wrapper(Path("a.do"), ["b"], StataResources(cores=2)))
+    set processors 2
+    do `"a.do"' `"b"'
+    <BLANKLINE>
+    >>> print(render_wrapper(Path("a.do"), [], StataResources(), cwd=Path("/p")))
+    cd `"/p"'
+    do `"a.do"'
+    <BLANKLINE>
+    >>> print(render_wrapper(Path("a.do"), [], StataResources(), profile=True))
+    set rmsg on
+    do `"a.do"'
+    <BLANKLINE>
+
+    """
+    arguments = " ".join(quote(option) for option in options)
+    run = f"do {quote(script.as_posix())} {arguments}".rstrip()
+    cd = [] if cwd is None else [f"cd {quote(cwd.as_posix())}"]
+    rmsg = [PROFILE_COMMAND] if profile else []
+    return "\n".join([*cd, *resources.setup_commands(), *rmsg, run]) + "\n"
+
+
+def parse_return_code(line: str, token: str) -> int | None:
+    """Parse the return code from a marker line with the given token.
+
+    Examples
+    --------
+    >>> parse_return_code("pytask-stata-rc abc 601", "abc")
+    601
+    >>> parse_return_code("pytask-stata-rc abc `rc'", "abc") is None
+    True
+
+    """
+    match = re.match(rf"{RC_MARKER} {re.escape(token)} ([0-9]+)$", line.strip())
+    return int(match.group(1)) if match else None
+
+
+def parse_return_codes(lines: Iterable[str]) -> dict[str, int]:
+    """Parse the return codes of all marker lines by their tokens.
+
+    Examples
+    --------
+    >>> parse_return_codes(["pytask-stata-rc 0 0", "other", "pytask-stata-rc 1 601"])
+    {'0': 0, '1': 601}
+
+    """
+    return_codes = {}
+    for line in lines:
+        match = re.match(rf"{RC_MARKER} (\S+) ([0-9]+)$", line.strip())
+        if match:
+            return_codes[match.group(1)] = int(match.group(2))
+    return return_codes
+
+
+def check_return_code(return_code: int, script: Path, log: Path) -> None:
+    """Raise an error if a do-file did not finish successfully."""
+    if return_code:
+        msg = (
+            f"An error occurred. Stata returned r({return_code}) while running "
+            f"{script.as_posix()!r}. See the log at {log.as_posix()!r}."
+        )
+        raise RuntimeError(msg)
@@ -0,0 +1,642 @@
+"""Read the headers of Stata's ``.dta`` files and hash their content.
+
+:func:`read_dta_header` reads the number of observations and the descriptions of the
+variables from the header of a dataset without reading the data. The file is
+memory-mapped, so only the pages of the header are read even for datasets with many
+gigabytes. The sizes of the sections in the header are checked against the size of the
+file, so truncated datasets are detected.
+
+Stata writes the time of saving into the header of every dataset. Hashing the file
+without this field yields a hash which only changes if the data changed, so a task which
+saves the same data again does not invalidate the tasks which depend on the dataset.
+
+Two layouts of headers are understood.
+
+- Formats 117 to 119 (Stata 13 and later) wrap every section into tags like
+  ``<timestamp>``. The header contains the release, the byte order, the number of
+  variables and observations, the label of the dataset, and the timestamp. It is
+  followed by a map of the offsets of all sections and the descriptions of the
+  variables.
+- Formats 105 to 115 (Stata 5 to 12) have a binary header with fixed offsets. The
+  timestamp occupies the 18 bytes after the label of the dataset. Only the formats 113
+  to 115 are read by :func:`read_dta_header`.
+
+Files in other formats are hashed completely.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+from dataclasses import dataclass
+from dataclasses import field
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Literal
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+DTA_SUFFIX = ".dta"
+HASH_CACHE_FILE = "stata-dta-hashes.json"
+
+HEADER_SIZE = 1024
+"""The number of bytes which contain the header of any known format."""
+
+_XML_SIZES = {117: (2, 4, 1), 118: (2, 8, 2), 119: (4, 8, 2)}
+"""The sizes of the number of variables, observations and the length of the label."""
+
+_XML_DESCRIPTOR_SIZES = {
+    117: (33, 2, 49, 81),
+    118: (129, 2, 57, 321),
+    119: (129, 4, 57, 321),
+}
+"""The sizes of names, sort entries, formats and labels of variables."""
+
+_XML_TYPES = {
+    32768: ("strL", 8),
+    65526: ("double", 8),
+    65527: ("float", 4),
+    65528: ("long", 4),
+    65529: ("int", 2),
+    65530: ("byte", 1),
+}
+_BINARY_TYPES = {
+    251: ("byte", 1),
+    252: ("int", 2),
+    253: ("long", 4),
+    254: ("float", 4),
+    255: ("double", 8),
+}
+_MAX_STR_XML = 2045
+_MAX_STR_BINARY = 244
+
+_DATA_SECTION = 9
+"""The index of the offset of the data in the map of the formats 117 to 119."""
+
+_EXPECTATIONS = ("n_obs", "min_obs", "variables", "types")
+
+
+@dataclass(frozen=True)
+class DtaVariable:
+    """The description of a variable in a ``.dta`` file.
+
+    Attributes
+    ----------
+    name
+        The name of the variable.
+    type
+        The storage type like ``"double"``, ``"str20"`` or ``"strL"``.
+    format
+        The display format like ``"%9.0g"``.
+    value_label
+        The name of the value label attached to the variable.
+    label
+        The label of the variable.
+
+    """
+
+    name: str
+    type: str
+    format: str
+    value_label: str
+    label: str
+
+
+@dataclass(frozen=True)
+class DtaHeader:
+    """The metadata of a ``.dta`` file.
+
+    Attributes
+    ----------
+    release
+        The format of the file like ``118``.
+    byteorder
+        The byte order of numbers in the file.
+    n_obs
+        The number of observations.
+    label
+        The label of the dataset.
+    timestamp
+        The time when the dataset was saved like ``"18 Oct 2026 14:05"``.
+    variables
+        The descriptions of the variables.
+    size
+        The size of the file in bytes.
+    data_offset
+        The position of the first observation in the file.
+
+    """
+
+    release: int
+    byteorder: Literal["little", "big"]
+    n_obs: int
+    label: str
+    timestamp: str
+    variables: tuple[DtaVariable, ...] = ()
+    size: int = 0
+    data_offset: int = 0
+
+    @property
+    def n_vars(self) -> int:
+        """The number of variables."""
+        return len(self.variables)
+
+    @property
+    def data_size(self) -> int:
+        """The number of bytes of the data, which Stata needs to hold it in memory.
+
+        Long strings (``strL``) are only counted with the size of their references.
+
+        """
+        return self.n_obs * sum(get_type_width(var.type) for var in self.variables)
+
+
+@dataclass(frozen=True)
+class DtaExpectation:
+    """The expected properties of a ``.dta`` file.
+
+    Attributes
+    ----------
+    n_obs
+        The exact number of observations.
+    min_obs
+        The minimum number of observations.
+    variables
+        The names of variables which must be in the dataset.
+    types
+        The storage types of variables like ``{"id": "long"}``.
+
+    """
+
+    n_obs: int | None = None
+    min_obs: int | None = None
+    variables: tuple[str, ...] = ()
+    types: dict[str, str] = field(default_factory=dict)
+
+
+def read_dta_header(path: Path) -> DtaHeader:
+    """Read the metadata of a ``.dta`` file without reading its data.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a dataset in a supported format or it is truncated.
+
+    """
+    with path.open("rb") as file:
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            msg = f"{path.as_posix()!r} is empty."
+            raise ValueError(msg) from None
+        with buffer:
+            try:
+                if buffer[:11] == b"<stata_dta>":
+                    return _read_xml_header(buffer)
+                return _read_binary_header(buffer)
+            except (IndexError, KeyError, ValueError) as e:
+                msg = f"{path.as_posix()!r} is not a valid Stata dataset. {e}"
+                raise ValueError(msg) from None
+
+
+def get_type_width(type_: str) -> int:
+    """Get the number of bytes of a value of a storage type.
+
+    Examples
+    --------
+    >>> get_type_width("double"), get_type_width("str12"), get_type_width("strL")
+    (8, 12, 8)
+
+    """
+    if type_.startswith("str") and type_ != "strL":
+        return int(type_[3:])
+    widths = {**dict(_XML_TYPES.values()), **dict(_BINARY_TYPES.values())}
+    return widths[type_]
+
+
+def parse_expectations(value: Any) -> DtaExpectation:
+    """Parse the expected properties of a ``.dta`` file.
+
+    Examples
+    --------
+    >>> parse_expectations({"min_obs": 10, "variables": ["id", "income"]})
+    DtaExpectation(n_obs=None, min_obs=10, variables=('id', 'income'), types={})
+
+    """
+    if isinstance(value, DtaExpectation):
+        return value
+    if not isinstance(value, dict) or not set(value) <= set(_EXPECTATIONS):
+        msg = (
+            f"Expectations of a dataset must be a dict with the keys {_EXPECTATIONS}, "
+            f"but they are {value!r}."
+        )
+        raise ValueError(msg)
+    for name in ("n_obs", "min_obs"):
+        if value.get(name) is not None and (
+            isinstance(value[name], bool)
+            or not isinstance(value[name], int)
+            or value[name] < 0
+        ):
+            msg = f"{name!r} must be a non-negative integer, but it is {value[name]!r}."
+            raise ValueError(msg)
+    variables = value.get("variables") or []
+    if isinstance(variables, str):
+        variables = variables.split()
+    types = value.get("types") or {}
+    return DtaExpectation(
+        n_obs=value.get("n_obs"),
+        min_obs=value.get("min_obs"),
+        variables=tuple(map(str, variables)),
+        types={str(name): str(type_) for name, type_ in types.items()},
+    )
+
+
+def check_expectation(header: DtaHeader, expectation: DtaExpectation) -> list[str]:
+    """Check a dataset against expectations and return the violations.
+
+    Examples
+    --------
+    >>> variable = DtaVariable("id", "long", "%12.0g", "", "")
+    >>> header = DtaHeader(118, "little", 5, "", "", (variable,))
+    >>> expectation = DtaExpectation(min_obs=10, types={"id": "int"})
+    >>> for problem in check_expectation(header, expectation):
+    ...     print(problem)
+    The dataset has 5 observations, but at least 10 are expected.
+    The variable 'id' has the type 'long', but 'int' is expected.
+
+    """
+    problems = []
+    if expectation.n_obs is not None and header.n_obs != expectation.n_obs:
+        problems.append(
+            f"The dataset has {header.n_obs} observations, but {expectation.n_obs} "
+            "are expected."
+        )
+    if expectation.min_obs is not None and header.n_obs < expectation.min_obs:
+        problems.append(
+            f"The dataset has {header.n_obs} observations, but at least "
+            f"{expectation.min_obs} are expected."
+        )
+
+    types = {variable.name: variable.type for variable in header.variables}
+    missing = [name for name in expectation.variables if name not in types]
+    if missing:
+        problems.append(f"The variables {missing} are missing.")
+    for name, type_ in expectation.types.items():
+        if name not in types:
+            if name not in missing:
+                problems.append(f"The variable {name!r} is missing.")
+        elif types[name] != type_:
+            problems.append(
+                f"The variable {name!r} has the type {types[name]!r}, but {type_!r} "
+                "is expected."
+            )
+    return problems
+
+
+def _read_xml_header(buffer: mmap.mmap) -> DtaHeader:
+    """Read the header of the formats 117 to 119."""
+    release, position = _read_tag(buffer, b"release", len(b"<stata_dta><header>"))
+    byteorder_tag, position = _read_tag(buffer, b"byteorder", position)
+    version = int(release)
+    k_size, n_size, label_size = _XML_SIZES[version]
+    byteorder: Literal["little", "big"] = "little" if byteorder_tag == b"LSF" else "big"
+    encoding = "latin-1" if version == 117 else "utf-8"  # noqa: PLR2004
+
+    counts = []
+    for tag, size in ((b"K", k_size), (b"N", n_size)):
+        position = _skip(buffer, b"<" + tag + b">", position)
+        counts.append(int.from_bytes(buffer[position : position + size], byteorder))
+        position = _skip(buffer, b"</" + tag + b">", position + size)
+    n_vars, n_obs = counts
+
+    position = _skip(buffer, b"<label>", position)
+    length = int.from_bytes(buffer[position : position + label_size], byteorder)
+    position += label_size
+    label = _decode(buffer[position : position + length], encoding)
+    position = _skip(buffer, b"</label>", position + length)
+    timestamp, position = _read_tag(buffer, b"timestamp", position)
+    position = _skip(buffer, b"</header>", position)
+
+    position = _skip(buffer, b"<map>", position)
+    offsets = [
+        int.from_bytes(buffer[start : start + 8], byteorder)
+        for start in range(position, position + 14 * 8, 8)
+    ]
+    position = _skip(buffer, b"</map>", position + 14 * 8)
+    if offsets[-1] > len(buffer):
+        msg = f"The file has {len(buffer)} bytes, but {offsets[-1]} are expected."
+        raise ValueError(msg)
+
+    name_size, sort_size, format_size, variable_label_size = _XML_DESCRIPTOR_SIZES[
+        version
+    ]
+    codes, position = _read_section(buffer, b"variable_types", position, n_vars, 2)
+    types = [_get_xml_type(int.from_bytes(code, byteorder)) for code in codes]
+    names, position = _read_section(buffer, b"varnames", position, n_vars, name_size)
+    _, position = _read_section(buffer, b"sortlist", position, n_vars + 1, sort_size)
+    formats, position = _read_section(buffer, b"formats", position, n_vars, format_size)
+    value_labels, position = _read_section(
+        buffer, b"value_label_names", position, n_vars, name_size
+    )
+    labels, _ = _read_section(
+        buffer, b"variable_labels", position, n_vars, variable_label_size
+    )
+
+    header = DtaHeader(
+        release=version,
+        byteorder=byteorder,
+        n_obs=n_obs,
+        label=label,
+        timestamp=_decode(timestamp[1:], encoding),
+        variables=_create_variables(
+            types, names, formats, value_labels, labels, encoding
+        ),
+        size=len(buffer),
+        data_offset=offsets[_DATA_SECTION] + len(b"<data>"),
+    )
+    # The data section is wrapped into ``<data>`` and ``</data>``.
+    data_size = offsets[_DATA_SECTION + 1] - offsets[_DATA_SECTION] - 13
+    _check_data_size(header, data_size)
+    return header
+
+
+def _read_binary_header(buffer: mmap.mmap) -> DtaHeader:
+    """Read the header of the formats 113 to 115."""
+    version = buffer[0]
+    if not 113 <= version <= 115 or buffer[1] not in (1, 2) or buffer[2] != 1:  # noqa: PLR2004
+        msg = "The format is not supported."
+        raise ValueError(msg)
+    byteorder: Literal["little", "big"] = "big" if buffer[1] == 1 else "little"
+    n_vars = int.from_bytes(buffer[4:6], byteorder)
+    n_obs = int.from_bytes(buffer[6:10], byteorder)
+    label = _decode(buffer[10:91], "latin-1")
+    timestamp = _decode(buffer[91:109], "latin-1")
+
+    position = 109
+    types = [_get_binary_type(code) for code in buffer[position : position + n_vars]]
+    position += n_vars
+    sizes = [("name", 33), ("sort", 2), ("format", 12 if version == 113 else 49)]  # noqa: PLR2004
+    sizes += [("value_label", 33), ("label", 81)]
+    fields: dict[str, list[bytes]] = {}
+    for name, size in sizes:
+        count = n_vars + 1 if name == "sort" else n_vars
+        fields[name] = [
+            buffer[start : start + size]
+            for start in range(position, position + count * size, size)
+        ]
+        position += count * size
+
+    # Skip the expansion fields which end with a field of type 0 and length 0.
+    while True:
+        kind = buffer[position]
+        length = int.from_bytes(buffer[position + 1 : position + 5], byteorder)
+        position += 5 + length
+        if kind == 0 and length == 0:
+            break
+
+    header = DtaHeader(
+        release=version,
+        byteorder=byteorder,
+        n_obs=n_obs,
+        label=label,
+        timestamp=timestamp,
+        variables=_create_variables(
+            types,
+            fields["name"],
+            fields["format"],
+            fields["value_label"],
+            fields["label"],
+            "latin-1",
+        ),
+        size=len(buffer),
+        data_offset=position,
+    )
+    # Value labels may follow the data.
+    _check_data_size(header, len(buffer) - position, exact=False)
+    return header
+
+
+def _read_section(
+    buffer: mmap.mmap, tag: bytes, position: int, count: int, size: int
+) -> tuple[list[bytes], int]:
+    """Read a section of fixed-size entries of the formats 117 to 119."""
+    position = _skip(buffer, b"<" + tag + b">", position)
+    entries = [
+        buffer[start : start + size]
+        for start in range(position, position + count * size, size)
+    ]
+    position = _skip(buffer, b"</" + tag + b">", position + count * size)
+    return entries, position
+
+
+def _create_variables(  # noqa: PLR0913, PLR0917
+    types: list[str],
+    names: list[bytes],
+    formats: list[bytes],
+    value_labels: list[bytes],
+    labels: list[bytes],
+    encoding: str,
+) -> tuple[DtaVariable, ...]:
+    return tuple(
+        DtaVariable(
+            name=_decode(name, encoding),
+            type=type_,
+            format=_decode(format_, encoding),
+            value_label=_decode(value_label, encoding),
+            label=_decode(label, encoding),
+        )
+        for type_, name, format_, value_label, label in zip(
+            types, names, formats, value_labels, labels, strict=True
+        )
+    )
+
+
+def _get_xml_type(code: int) -> str:
+    if 1 <= code <= _MAX_STR_XML:
+        return f"str{code}"
+    return _XML_TYPES[code][0]
+
+
+def _get_binary_type(code: int) -> str:
+    if 1 <= code <= _MAX_STR_BINARY:
+        return f"str{code}"
+    return _BINARY_TYPES[code][0]
+
+
+def _check_data_size(header: DtaHeader, size: int, *, exact: bool = True) -> None:
+    """Check that the file contains the data of all observations."""
+    if size < header.data_size or (exact and size != header.data_size):
+        msg = (
+            f"The data of {header.n_obs} observations needs {header.data_size} bytes, "
+            f"but the file contains {max(size, 0)} bytes of data."
+        )
+        raise ValueError(msg)
+
+
+def _decode(value: bytes, encoding: str) -> str:
+    """Decode a null-terminated string."""
+    return value.split(b"\x00", 1)[0].decode(encoding, errors="replace")
+
+
+def find_timestamp(header: bytes) -> tuple[int, int] | None:
+    r"""Find the start and end of the timestamp in the header of a ``.dta`` file.
+
+    Returns ``None`` if the header does not belong to a known format or the dataset has
+    no timestamp.
+
+    Examples
+    --------
+    >>> header = (
+    ...     b"<stata_dta><header><release>117</release><byteorder>LSF</byteorder>"
+    ...     b"<K>\x02\x00</K><N>\x05\x00\x00\x00</N><label>\x00</label>"
+    ...     b"<timestamp>\x1118 Oct 2026 14:05</timestamp></header>"
+    ... )
+    >>> start, end = find_timestamp(header)
+    >>> header[start:end]
+    b'\x1118 Oct 2026 14:05'
+    >>> header = bytes([114, 2, 1, 0]) + bytes(87) + b"18 Oct 2026 14:05\x00"
+    >>> find_timestamp(header)
+    (91, 109)
+    >>> find_timestamp(b"mock Stata dataset") is None
+    True
+
+    """
+    try:
+        if header.startswith(b"<stata_dta>"):
+            return _find_xml_timestamp(header)
+        return _find_binary_timestamp(header)
+    except (IndexError, KeyError, ValueError):
+        return None
+
+
+def _find_xml_timestamp(header: bytes) -> tuple[int, int]:
+    """Find the timestamp in the header of formats 117 to 119."""
+    release, position = _read_tag(header, b"release", len(b"<stata_dta><header>"))
+    byteorder, position = _read_tag(header, b"byteorder", position)
+    k_size, n_size, label_size = _XML_SIZES[int(release)]
+    order = "little" if byteorder == b"LSF" else "big"
+
+    for tag, size in ((b"K", k_size), (b"N", n_size)):
+        position = _skip(header, b"<" + tag + b">", position)
+        position = _skip(header, b"</" + tag + b">", position + size)
+
+    position = _skip(header, b"<label>", position)
+    length = int.from_bytes(header[position : position + label_size], order)
+    position = _skip(header, b"</label>", position + label_size + length)
+
+    start = _skip(header, b"<timestamp>", position)
+    end = start + 1 + header[start]
+    _skip(header, b"</timestamp>", end)
+    return start, end
+
+
+def _find_binary_timestamp(header: bytes) -> tuple[int, int]:
+    """Find the timestamp in the header of formats 105 to 115."""
+    if header[1] not in (1, 2) or header[2] != 1:
+        msg = "Unknown format."
+        raise ValueError(msg)
+    if 108 <= header[0] <= 115:  # noqa: PLR2004
+        start = 10 + 81
+    elif 105 <= header[0] <= 107:  # noqa: PLR2004
+        start = 10 + 32
+    else:
+        msg = f"Format {header[0]} has no timestamp."
+        raise ValueError(msg)
+    return start, start + 18
+
+
+def _skip(header: bytes | mmap.mmap, expected: bytes, position: int) -> int:
+    """Skip the expected bytes at a position and return the position after them."""
+    if header[position : position + len(expected)] != expected:
+        msg = f"Expected {expected!r} at position {position}."
+        raise ValueError(msg)
+    return position + len(expected)
+
+
+def _read_tag(
+    header: bytes | mmap.mmap, tag: bytes, position: int
+) -> tuple[bytes, int]:
+    """Read the content of a tag and return it with the position after the tag."""
+    start = _skip(header, b"<" + tag + b">", position)
+    end = header.find(b"</" + tag + b">", start)
+    if end == -1:
+        msg = f"The tag {tag!r} is not closed."
+        raise ValueError(msg)
+    return header[start:end], end + len(tag) + 3
+
+
+def hash_dta(path: Path) -> str:
+    """Hash a ``.dta`` file without the timestamp in its header.
+
+    The file is memory-mapped and hashed with BLAKE2b, so even large datasets are
+    hashed without copying them into memory.
+
+    """
+    hasher = hashlib.blake2b(digest_size=32)
+    with path.open("rb") as file:
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            return hasher.hexdigest()
+        with buffer, memoryview(buffer) as view:
+            timestamp = find_timestamp(buffer[:HEADER_SIZE])
+            if timestamp is None:
+                hasher.update(view)
+            else:
+                hasher.update(view[: timestamp[0]])
+                hasher.update(view[timestamp[1] :])
+    return hasher.hexdigest()
+
+
+class DtaHashCache:
+    """A cache of the hashes of ``.dta`` files.
+
+    A hash is reused as long as the size, the modification time and the inode of the
+    file did not change.
+
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = path
+        self._hashes: dict[str, tuple[int, int, int, str]] = {}
+        self._is_modified = False
+        if path is not None:
+            self._load(path)
+
+    def digest(self, path: Path) -> str | None:
+        """Return the hash of a ``.dta`` file or ``None`` if it does not exist."""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = path.as_posix()
+        signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        entry = self._hashes.get(key)
+        if entry is not None and entry[:3] == signature:
+            return entry[3]
+
+        digest = hash_dta(path)
+        self._hashes[key] = (*signature, digest)
+        self._is_modified = True
+        return digest
+
+    def save(self) -> None:
+        """Save the cache to disk if hashes were added."""
+        if self.path is None or not self._is_modified:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self._hashes))
+        self._is_modified = False
+
+    def _load(self, path: Path) -> None:
+        try:
+            data: dict[str, Any] = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict):
+            self._hashes = {key: tuple(value) for key, value in data.items()}
@@ -0,0 +1,320 @@
+"""Start the Stata tasks on the critical path first.
+
+Stata tasks take from seconds to hours. If ready tasks are started in an arbitrary
+order, the longest task might start last and most workers are idle at the end of the
+build. The duration of every successful Stata task is recorded in the ``.pytask`` folder
+by the id of the task and the hash of its do-file. Before the build starts, every task
+gets a priority by the expected duration of the longest path from the task to the end
+of the DAG. Priorities from ``try_first`` and ``try_last`` still take precedence.
+
+With the recorded durations, the duration of the build is estimated by simulating the
+schedule with the available workers.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import time
+from statistics import mean
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import cast
+
+from pytask import ExecutionReport
+from pytask import PathNode
+from pytask import Session
+from pytask import TaskOutcome
+from pytask import console
+from pytask import has_mark
+from pytask import hookimpl
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+    from collections.abc import Mapping
+    from pathlib import Path
+
+    from pytask import PTask
+
+
+DURATIONS_FILE = "stata-durations.json"
+
+
+class DurationHistory:
+    """The recorded durations of Stata tasks.
+
+    A duration is only valid for the do-file which was hashed when it was recorded.
+    Repeated runs are averaged with the previous estimate such that a single slow run
+    does not dominate.
+
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = path
+        self._durations: dict[str, dict[str, Any]] = {}
+        self._digests: dict[Path, str] = {}
+        self._is_modified = False
+        if path is not None:
+            self._load(path)
+
+    def digest(self, script: Path) -> str | None:
+        """Return the hash of a do-file or ``None`` if it cannot be read."""
+        if script not in self._digests:
+            try:
+                content = script.read_bytes()
+            except OSError:
+                return None
+            self._digests[script] = hashlib.sha256(content).hexdigest()
+        return self._digests[script]
+
+    def get(self, task_id: str, digest: str | None) -> float | None:
+        """Get the expected duration of a task with a do-file."""
+        entry = self._durations.get(task_id)
+        if entry is None or digest is None or entry["script"] != digest:
+            return None
+        return entry["duration"]
+
+    def record(self, task_id: str, digest: str | None, duration: float) -> None:
+        """Record the duration of a task."""
+        if digest is None:
+            return
+        previous = self.get(task_id, digest)
+        self._durations[task_id] = {
+            "script": digest,
+            "duration": duration if previous is None else (previous + duration) / 2,
+        }
+        self._is_modified = True
+
+    def save(self) -> None:
+        """Save the durations to disk if any were recorded."""
+        if self.path is None or not self._is_modified:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(self._durations))
+        self._is_modified = False
+
+    def _load(self, path: Path) -> None:
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict):
+            self._durations = data
+
+
+def compute_remaining_paths(
+    successors: Mapping[str, list[str]], durations: Mapping[str, float]
+) -> dict[str, float]:
+    """Compute the duration of the longest path from every task to the end of the DAG.
+
+    Examples
+    --------
+    >>> successors = {"a": ["b", "c"], "b": [], "c": ["d"], "d": []}
+    >>> durations = {"a": 1.0, "b": 10.0, "c": 2.0, "d": 3.0}
+    >>> compute_remaining_paths(successors, durations)
+    {'b': 10.0, 'd': 3.0, 'c': 5.0, 'a': 11.0}
+
+    """
+    remaining: dict[str, float] = {}
+    for task in _sort_topologically(successors)[::-1]:
+        remaining[task] = durations.get(task, 0.0) + max(
+            (remaining[successor] for successor in successors[task]), default=0.0
+        )
+    return remaining
+
+
+def estimate_makespan(
+    successors: Mapping[str, list[str]],
+    durations: Mapping[str, float],
+    priorities: Mapping[str, float],
+    n_workers: int,
+) -> float:
+    """Estimate the duration of a build by simulating the schedule.
+
+    Ready tasks with the highest priority are started whenever a worker is free.
+
+    Examples
+    --------
+    >>> successors = {"a": ["c"], "b": [], "c": []}
+    >>> durations = {"a": 2.0, "b": 3.0, "c": 2.0}
+    >>> estimate_makespan(successors, durations, {"a": 4.0, "b": 3.0, "c": 2.0}, 2)
+    4.0
+    >>> estimate_makespan(successors, durations, {"a": 0.0, "b": 3.0, "c": 2.0}, 1)
+    7.0
+
+    """
+    n_predecessors = dict.fromkeys(successors, 0)
+    for task in successors:
+        for successor in successors[task]:
+            n_predecessors[successor] += 1
+
+    ready = [(-priorities.get(task, 0.0), task) for task, n in n_predecessors.items()]
+    ready = [item for item in ready if n_predecessors[item[1]] == 0]
+    heapq.heapify(ready)
+    running: list[tuple[float, str]] = []
+    now = 0.0
+    while ready or running:
+        while ready and len(running) < n_workers:
+            _, task = heapq.heappop(ready)
+            heapq.heappush(running, (now + durations.get(task, 0.0), task))
+        now, task = heapq.heappop(running)
+        for successor in successors[task]:
+            n_predecessors[successor] -= 1
+            if n_predecessors[successor] == 0:
+                heapq.heappush(ready, (-priorities.get(successor, 0.0), successor))
+    return now
+
+
+def format_duration(seconds: float) -> str:
+    """Format a duration in hours, minutes and seconds.
+
+    Examples
+    --------
+    >>> format_duration(42.4)
+    '42s'
+    >>> format_duration(750)
+    '12m 30s'
+    >>> format_duration(3 * 3600 + 125)
+    '3h 02m'
+
+    """
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+
+@hookimpl
+def pytask_parse_config(config: dict[str, Any]) -> None:
+    """Load the recorded durations of Stata tasks."""
+    config["stata_durations"] = DurationHistory(
+        config["root"] / ".pytask" / DURATIONS_FILE
+    )
+
+
+@hookimpl(wrapper=True, tryfirst=True)
+def pytask_execute_build(session: Session) -> Generator[None, Any, Any]:
+    """Prioritize tasks on the critical path and estimate the duration of the build."""
+    scheduler = session.scheduler
+    if (
+        scheduler is not None
+        and hasattr(scheduler, "priorities")
+        and not session.config["dry_run"]
+        and not session.config["explain"]
+    ):
+        _prioritize_tasks(session, cast("Any", scheduler))
+    return (yield)
+
+
+def _prioritize_tasks(session: Session, scheduler: Any) -> None:
+    """Add the expected duration of the remaining path to the priorities of tasks."""
+    history: DurationHistory = session.config["stata_durations"]
+    tasks = [cast("PTask", node) for node in scheduler.dag.nodes.values()]
+    stata_tasks = [task for task in tasks if has_mark(task, "stata")]
+    if not stata_tasks:
+        return
+
+    known = {
+        task.signature: duration
+        for task in stata_tasks
+        if (duration := history.get(task.name, _digest(history, task))) is not None
+    }
+    # Tasks without a recorded duration are expected to take as long as the others.
+    default = mean(known.values()) if known else 1.0
+    durations = {
+        task.signature: known.get(task.signature, default)
+        if has_mark(task, "stata")
+        else 0.0
+        for task in tasks
+    }
+
+    successors = {name: list(scheduler.dag.successors(name)) for name in durations}
+    remaining = compute_remaining_paths(successors, durations)
+    longest = max(remaining.values())
+    if longest > 0:
+        # The marks try_first and try_last change the priority by one, so the
+        # remaining path only orders tasks with the same marks.
+        for name, path in remaining.items():
+            scheduler.priorities[name] = scheduler.priorities.get(name, 0) + (
+                path / (2 * longest)
+            )
+
+    if known:
+        makespan = estimate_makespan(
+            successors, durations, scheduler.priorities, _get_n_workers(session.config)
+        )
+        finish = time.strftime("%H:%M", time.localtime(time.time() + makespan))
+        console.print(
+            f"The Stata tasks take about {format_duration(makespan)} and finish "
+            f"around {finish} if all are executed. Durations are recorded for "
+            f"{len(known)} of {len(stata_tasks)} Stata tasks."
+        )
+        console.print()
+
+
+@hookimpl
+def pytask_execute_task_process_report(
+    session: Session, report: ExecutionReport
+) -> None:
+    """Record the duration of a successful Stata task.
+
+    Tasks run by the ``batch`` backend are not recorded since they only know the
+    duration of their whole batch.
+
+    """
+    task = report.task
+    usage = task.attributes.get("stata_usage")
+    if (
+        usage is not None
+        and report.outcome == TaskOutcome.SUCCESS
+        and session.config["stata_backend"] != "batch"
+    ):
+        history: DurationHistory = session.config["stata_durations"]
+        history.record(task.name, _digest(history, task), usage.wall_time)
+
+
+@hookimpl
+def pytask_execute_log_end(session: Session) -> None:
+    """Save the recorded durations."""
+    session.config["stata_durations"].save()
+
+
+def _digest(history: DurationHistory, task: PTask) -> str | None:
+    script = task.depends_on.get("_script")
+    return history.digest(script.path) if isinstance(script, PathNode) else None
+
+
+def _get_n_workers(config: dict[str, Any]) -> int:
+    """Get the number of Stata tasks which run at the same time."""
+    if config["stata_backend"] == "async":
+        n_workers = config["stata_async_max_tasks"]
+    else:
+        n_workers = config.get("n_workers")
+        n_workers = n_workers if isinstance(n_workers, int) else 1
+    if config["stata_max_concurrent"] is not None:
+        n_workers = min(n_workers, config["stata_max_concurrent"])
+    return max(n_workers, 1)
+
+
+def _sort_topologically(successors: Mapping[str, list[str]]) -> list[str]:
+    """Sort tasks such that every task comes before its successors."""
+    n_predecessors = dict.fromkeys(successors, 0)
+    for task in successors:
+        for successor in successors[task]:
+            n_predecessors[successor] += 1
+
+    ready = [task for task, n in n_predecessors.items() if n == 0]
+    order = []
+    while ready:
+        task = ready.pop()
+        order.append(task)
+        for successor in successors[task]:
+            n_predecessors[successor] -= 1
+            if n_predecessors[successor] == 0:
+                ready.append(successor)
+    return order
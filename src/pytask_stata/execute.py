@@ -2,25 +2,64 @@
 
 from __future__ import annotations
 
-import re
+import functools
+import sys
 from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
 from typing import cast
 
+from pytask import ExecutionReport
 from pytask import PathNode
+from pytask import PPathNode
 from pytask import PTask
-from pytask import PTaskWithPath
 from pytask import PythonNode
 from pytask import Session
+from pytask import console
+from pytask import get_marks
 from pytask import has_mark
 from pytask import hookimpl
+from pytask.tree_util import tree_leaves
 
+from pytask_stata.dta import DTA_SUFFIX
+from pytask_stata.dta import check_expectation
+from pytask_stata.dta import read_dta_header
+from pytask_stata.frames import FRAMES_DIRECTORY
+from pytask_stata.frames import get_frame_library
+from pytask_stata.frames import is_frame
+from pytask_stata.frames import materialize_frame
+from pytask_stata.frames import read_frame
+from pytask_stata.logs import find_error_code
+from pytask_stata.logs import read_log_tail
+from pytask_stata.pool import close_pools
+from pytask_stata.profiling import read_profile
 from pytask_stata.shared import STATA_COMMANDS
+from pytask_stata.shared import get_log_directory
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+FRAME_ARGUMENTS = "stata_frame_arguments"
 
 
 @hookimpl
 def pytask_execute_task_setup(session: Session, task: PTask) -> None:
-    """Check if Stata is found on the PATH."""
-    if has_mark(task, "stata") and session.config["stata"] is None:
+    """Check if Stata is found on the PATH and write the frames of the task."""
+    if not has_mark(task, "stata"):
+        return
+
+    if "_executable" in task.depends_on:
+        executable = cast("PythonNode", task.depends_on["_executable"]).load()
+    else:
+        executable = session.config["stata"]
+    edition = get_marks(task, "stata")[0].kwargs.get("edition")
+    if executable is None and edition is not None:
+        msg = (
+            f"The task requests Stata {edition}, but no executable of this edition is "
+            f"found on your PATH. We are looking for one of {STATA_COMMANDS}."
+        )
+        raise RuntimeError(msg)
+    if executable is None:
         msg = (
             "Stata is needed to run do-files, but it is not found on your PATH.\n\n"
             f"We are looking for one of {STATA_COMMANDS} on your PATH. If you have a"
@@ -29,6 +68,17 @@ def pytask_execute_task_setup(session: Session, task: PTask) -> None:
         )
         raise RuntimeError(msg)
 
+    _prepare_frames(session, task)
+
+    # Workers of pytask-parallel cannot print to the terminal of the main process.
+    if (
+        session.config.get("stata_stream_log")
+        and session.config.get("n_workers", 1) == 1
+    ):
+        task.function = functools.partial(
+            task.function, _print_log_line=create_log_printer(session)
+        )
+
 
 @hookimpl
 def pytask_execute_task_teardown(session: Session, task: PTask) -> None:
@@ -40,31 +90,224 @@ def pytask_execute_task_teardown(session: Session, task: PTask) -> None:
     Error codes have a preceding r and a number enclosed in round brackets like ``r(1)``
     or ``r(601)``.
 
+    If do-files are profiled, the durations of the commands are parsed from the log
+    before it might be removed.
+
+    Afterwards, the headers of the ``.dta`` products are read to detect truncated
+    datasets and to check the expectations of the mark, and the datasets of frame
+    products are read into their nodes.
+
     """
     if has_mark(task, "stata"):
-        if session.config["platform"] == "win32":
-            log_name_node = task.depends_on["_log_name"]
-            log_name = cast("PythonNode", log_name_node).load()
-            if isinstance(task, PTaskWithPath):
-                path_to_log = task.path.with_name(log_name).with_suffix(".log")
-            else:
-                path_to_log = Path.cwd() / f"{log_name}.log"
-        else:
-            node = task.depends_on["_script"]
-            path_to_log = cast("PathNode", node).path.with_suffix(".log")
+        path_to_log = get_log_path_of_task(session, task)
+        if session.config["stata_profile"]:
+            script = cast("PathNode", task.depends_on["_script"]).path
+            task.attributes["stata_profile"] = read_profile(path_to_log, script)
 
         n_lines = session.config["stata_check_log_lines"]
+        log_tail = read_log_tail(
+            path_to_log, n_lines, max_bytes=session.config["stata_check_log_bytes"]
+        )
+        if find_error_code(log_tail) is not None:
+            # Archived logs are removed once they are moved into the archive.
+            if (
+                not session.config["stata_keep_log"]
+                and session.config.get("stata_log_archive") is None
+            ):
+                path_to_log.unlink()
+
+            raise RuntimeError(
+                f"An error occurred. Here are the last {n_lines} lines of the log:"
+                "\n\n" + "\n".join(log_tail)
+            )
+
+        _check_datasets(task)
+        load_frame_products(session, task)
+
+
+def _check_datasets(task: PTask) -> None:
+    """Check that the .dta products are complete and match the expectations."""
+    expectations = get_marks(task, "stata")[0].kwargs.get("expect", {})
+    problems = []
+    for node in tree_leaves(task.produces):  # ty: ignore[invalid-argument-type]
+        if not (
+            isinstance(node, PPathNode)
+            and node.path.suffix == DTA_SUFFIX
+            and node.path.exists()
+        ):
+            continue
+        try:
+            header = read_dta_header(node.path)
+        except ValueError as e:
+            problems.append(str(e))
+            continue
+        if node.path in expectations:
+            problems.extend(
+                f"{node.name!r}: {problem}"
+                for problem in check_expectation(header, expectations[node.path])
+            )
+
+    if problems:
+        raise RuntimeError(
+            "The datasets produced by the task are invalid.\n\n"
+            + "\n".join(f"- {problem}" for problem in problems)
+        )
+
+
+def set_up_task(session: Session, task: PTask) -> ExecutionReport | None:
+    """Set up a task and return a report if the task does not need to run.
+
+    Backends which run Stata tasks themselves instead of pytask's executor call it
+    before they start a task.
+
+    """
+    session.hook.pytask_execute_task_log_start(session=session, task=task)
+    try:
+        session.hook.pytask_execute_task_setup(session=session, task=task)
+    except KeyboardInterrupt:  # pragma: no cover
+        session.should_stop = True
+        return ExecutionReport.from_task_and_exception(task, sys.exc_info())
+    except Exception:  # noqa: BLE001
+        return ExecutionReport.from_task_and_exception(task, sys.exc_info())
+    return None
+
+
+def finish_task(session: Session, task: PTask, report: ExecutionReport) -> None:
+    """Process the report of a task and mark it as done."""
+    session.hook.pytask_execute_task_process_report(session=session, report=report)
+    session.hook.pytask_execute_task_log_end(session=session, task=task, report=report)
+    session.execution_reports.append(report)
+    cast("Any", session.scheduler).done(task.signature)
+
+
+def print_log_line(script_name: str, line: str) -> None:
+    """Print a line of the log while the do-file is running.
+
+    The line is printed with pytask's console such that it appears above the live
+    display of the running tasks.
+
+    """
+    console.print(f"[{script_name}] {line}", markup=False, highlight=False)
+
 
-        log = path_to_log.read_text()
-        log_tail = log.split("\n")[-n_lines:]
-        for line in log_tail:
-            error_found = re.match(r"r\(([0-9]+)\)", line)
+def create_log_printer(session: Session) -> Callable[[str, str], None]:
+    """Create a function which prints lines of the log while a task is running.
 
-            if error_found:
-                if not session.config["stata_keep_log"]:
-                    path_to_log.unlink()
+    pytask captures the output of a task and shows it only after the task failed. The
+    capture is suspended while a line is printed, so it appears immediately.
 
-                raise RuntimeError(
-                    f"An error occurred. Here are the last {n_lines} lines of the log:"
-                    "\n\n" + "\n".join(log_tail)
-                )
+    """
+    capman = session.config["pm"].get_plugin("capturemanager")
+
+    def print_line(script_name: str, line: str) -> None:
+        if capman is None:
+            print_log_line(script_name, line)
+            return
+        capman.suspend()
+        try:
+            print_log_line(script_name, line)
+        finally:
+            capman.resume()
+
+    return print_line
+
+
+def get_options(task: PTask) -> list[str]:
+    """Get the options of a task followed by the paths of its frames."""
+    options = cast("PythonNode", task.depends_on["_options"]).load()
+    return [*options, *task.attributes.get(FRAME_ARGUMENTS, [])]
+
+
+def _prepare_frames(session: Session, task: PTask) -> None:
+    """Write the frames a task depends on and pass the paths of all frames to Stata.
+
+    The paths of the frames which the task depends on and the paths where the do-file
+    saves frame products are appended to the options in the order of the arguments.
+
+    """
+    frames = [
+        node.load()
+        for node in _get_frame_nodes(task.depends_on)
+        if is_frame(node.value)
+    ]
+    products = get_frame_products(task)
+    if not frames and not products:
+        return
+
+    arguments = [_materialize_frame(session, frame).as_posix() for frame in frames]
+    for name in products:
+        path = get_frame_product_path(session, task, name)
+        path.unlink(missing_ok=True)
+        arguments.append(path.as_posix())
+
+    task.attributes[FRAME_ARGUMENTS] = arguments
+    task.function = functools.partial(task.function, _frame_arguments=arguments)
+
+
+def _materialize_frame(session: Session, frame: Any) -> Path:
+    """Write a frame to a ``.dta`` file once per session.
+
+    Tasks which depend on the same frame reuse the file without converting the frame
+    again. The frame is kept with its path so that its id is not reused.
+
+    """
+    paths = session.config.setdefault("stata_frame_paths", {})
+    entry = paths.get(id(frame))
+    if entry is not None and entry[0] is frame and entry[1].exists():
+        return entry[1]
+    path = materialize_frame(frame, session.config["root"] / FRAMES_DIRECTORY)
+    paths[id(frame)] = (frame, path)
+    return path
+
+
+def load_frame_products(session: Session, task: PTask) -> None:
+    """Read the datasets which the do-file saved for frame products."""
+    for name, node in get_frame_products(task).items():
+        path = get_frame_product_path(session, task, name)
+        if not path.exists():
+            msg = (
+                f"The do-file did not save the frame product {name!r} to "
+                f"{path.as_posix()!r}, which is passed to it as an argument."
+            )
+            raise RuntimeError(msg)
+        node.save(read_frame(path, get_frame_library(node.value) or "pandas"))
+
+
+def _get_frame_nodes(nodes: dict[str, Any]) -> list[PythonNode]:
+    return [
+        node
+        for name, node in nodes.items()
+        if not name.startswith("_") and isinstance(node, PythonNode)
+    ]
+
+
+def get_frame_products(task: PTask) -> dict[str, PythonNode]:
+    """Get the products of a task which are stored in Python nodes."""
+    return {
+        name: node
+        for name, node in task.produces.items()
+        if not name.startswith("_") and isinstance(node, PythonNode)
+    }
+
+
+def get_frame_product_path(session: Session, task: PTask, name: str) -> Path:
+    """Get the path where the do-file saves the dataset of a frame product."""
+    log_name = cast("PythonNode", task.depends_on["_log_name"]).load()
+    directory = session.config["root"] / FRAMES_DIRECTORY / "products"
+    return directory / f"{log_name}-{name}.dta"
+
+
+def get_log_path_of_task(session: Session, task: PTask) -> Path:
+    """Get the path to the log file of a Stata task."""
+    cwd = cast("PythonNode", task.depends_on["_cwd"]).load()
+    log_name = cast("PythonNode", task.depends_on["_log_name"]).load()
+    directory = get_log_directory(
+        Path(cwd), session.config["root"], session.config["stata_log_dir"]
+    )
+    return directory / f"{log_name}.log"
+
+
+@hookimpl
+def pytask_unconfigure() -> None:
+    """Close the persistent Stata sessions of the main process."""
+    close_pools()
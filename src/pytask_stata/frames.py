@@ -0,0 +1,473 @@
+"""Convert data frames to and from ``.dta`` files in chunks.
+
+Stata tasks can depend on and produce data frames of pandas and Arrow tables of pyarrow
+which are stored in :class:`pytask.PythonNode`. Before a Stata task runs, every frame
+it depends on is written to a ``.dta`` file in ``.pytask/stata-frames`` named after the
+hash of its content. The file is hashed while it is written, so a frame is converted
+only once, and frames with the same content share the file. After the task, the ``.dta``
+files of frame products are read back into frames.
+
+Frames are converted in chunks of rows, so only one chunk is held in memory besides the
+frame itself. The files are written in the format 118 of Stata 14 and later without a
+timestamp, so the same frame always yields the same file.
+
+Neither pandas nor pyarrow are required by pytask-stata. Frames are recognized by their
+types and the libraries are only imported when frames are read from ``.dta`` files.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+import uuid
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Literal
+
+from pytask_stata.dta import get_type_width
+from pytask_stata.dta import read_dta_header
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from collections.abc import Iterator
+    from collections.abc import Sequence
+    from pathlib import Path
+
+
+FRAMES_DIRECTORY = ".pytask/stata-frames"
+CHUNK_SIZE = 100_000
+
+FrameLibrary = Literal["pandas", "pyarrow"]
+
+_MAX_STR = 2045
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,31}")
+
+_TYPES = {
+    "bool": "byte",
+    "boolean": "byte",
+    "int8": "int",
+    "uint8": "int",
+    "Int8": "int",
+    "UInt8": "int",
+    "int16": "long",
+    "uint16": "long",
+    "Int16": "long",
+    "UInt16": "long",
+    "float32": "float",
+    "float": "float",
+    "halffloat": "float",
+    "float16": "float",
+    "Float32": "float",
+}
+"""The Stata types of the types of columns. Other numbers are stored as doubles."""
+
+_STRING_TYPES = {"object", "string", "large_string", "str"}
+
+_CODES = {"byte": 65530, "int": 65529, "long": 65528, "float": 65527, "double": 65526}
+_FORMATS = {
+    "byte": "%8.0g",
+    "int": "%8.0g",
+    "long": "%12.0g",
+    "float": "%9.0g",
+    "double": "%10.0g",
+}
+_STRUCT = {"byte": "b", "int": "h", "long": "i", "float": "f", "double": "d"}
+_MISSING = {
+    "byte": 101,
+    "int": 32741,
+    "long": 2147483621,
+    "float": struct.unpack("<f", bytes.fromhex("0000007f"))[0],
+    "double": struct.unpack("<d", bytes.fromhex("000000000000e07f"))[0],
+}
+"""The system missing value ``.`` of every numeric type."""
+
+_PANDAS_DTYPES = {
+    "byte": "Int8",
+    "int": "Int16",
+    "long": "Int32",
+    "float": "float32",
+    "double": "float64",
+}
+_PYARROW_TYPES = {
+    "byte": "int8",
+    "int": "int16",
+    "long": "int32",
+    "float": "float32",
+    "double": "float64",
+}
+
+
+def is_frame(value: Any) -> bool:
+    """Indicate whether a value is a data frame of pandas or a table of pyarrow."""
+    cls = type(value)
+    module = cls.__module__.split(".", 1)[0]
+    return (module, cls.__name__) in {("pandas", "DataFrame"), ("pyarrow", "Table")}
+
+
+def get_frame_library(value: Any) -> FrameLibrary | None:
+    """Get the library of a frame."""
+    if not is_frame(value):
+        return None
+    return "pandas" if type(value).__module__.startswith("pandas") else "pyarrow"
+
+
+def materialize_frame(
+    frame: Any, directory: Path, chunk_size: int = CHUNK_SIZE
+) -> Path:
+    """Write a frame to a ``.dta`` file named after its content.
+
+    The frame is converted once into a temporary file while its content is hashed.
+    Afterwards, the file is renamed after the hash or removed if the file exists.
+
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    types = _get_types(frame, chunk_size)
+    hasher = hashlib.blake2b(digest_size=16)
+    tmp = directory / f".{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with tmp.open("wb") as file:
+            for block in render_dta(
+                types, len(frame), _iter_frame_chunks(frame, chunk_size), chunk_size
+            ):
+                hasher.update(block)
+                file.write(block)
+        path = directory / f"{hasher.hexdigest()}.dta"
+        if path.exists():
+            tmp.unlink()
+        else:
+            tmp.replace(path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def write_frame(frame: Any, path: Path, chunk_size: int = CHUNK_SIZE) -> None:
+    """Write a frame to a ``.dta`` file."""
+    write_dta(
+        path,
+        _get_types(frame, chunk_size),
+        len(frame),
+        _iter_frame_chunks(frame, chunk_size),
+        chunk_size,
+    )
+
+
+def read_frame(
+    path: Path, library: FrameLibrary = "pandas", chunk_size: int = CHUNK_SIZE
+) -> Any:
+    """Read a ``.dta`` file into a data frame of pandas or a table of pyarrow."""
+    types = {
+        variable.name: variable.type for variable in read_dta_header(path).variables
+    }
+    chunks = iter_dta(path, chunk_size)
+    if library == "pandas":
+        return _create_pandas_frame(types, chunks)
+    return _create_pyarrow_table(types, chunks)
+
+
+def write_dta(
+    path: Path,
+    types: dict[str, str],
+    n_obs: int,
+    chunks: Iterable[dict[str, Sequence[Any]]],
+    chunk_size: int = CHUNK_SIZE,
+) -> None:
+    """Write chunks of columns to a ``.dta`` file.
+
+    The file is written to a temporary file first and renamed afterwards, so it is
+    never read while it is incomplete.
+
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as file:
+        for block in render_dta(types, n_obs, chunks, chunk_size):
+            file.write(block)
+    tmp.replace(path)
+
+
+def render_dta(
+    types: dict[str, str],
+    n_obs: int,
+    chunks: Iterable[dict[str, Sequence[Any]]],
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """Render a ``.dta`` file in the format 118 from chunks of columns.
+
+    Parameters
+    ----------
+    types
+        The names of the variables and their Stata types like ``"double"`` or
+        ``"str12"``.
+    n_obs
+        The number of observations in all chunks.
+    chunks
+        The chunks of observations as mappings from the names of the variables to their
+        values. Missing values are ``None`` or NaN.
+    chunk_size
+        The maximum number of observations in a chunk.
+
+    """
+    for name in types:
+        if not _NAME.fullmatch(name):
+            msg = f"{name!r} is not a valid name of a Stata variable."
+            raise ValueError(msg)
+    k = len(types)
+    row = struct.Struct("<" + "".join(map(_get_struct_code, types.values())))
+
+    header = (
+        b"<stata_dta><header><release>118</release><byteorder>LSF</byteorder>"
+        b"<K>" + k.to_bytes(2, "little") + b"</K>"
+        b"<N>" + n_obs.to_bytes(8, "little") + b"</N>"
+        b"<label>\x00\x00</label><timestamp>\x00</timestamp></header>"
+    )
+    descriptors = [
+        b"<variable_types>"
+        + b"".join(
+            _get_type_code(type_).to_bytes(2, "little") for type_ in types.values()
+        )
+        + b"</variable_types>",
+        b"<varnames>"
+        + b"".join(name.encode().ljust(129, b"\x00") for name in types)
+        + b"</varnames>",
+        b"<sortlist>" + bytes(2 * (k + 1)) + b"</sortlist>",
+        b"<formats>"
+        + b"".join(
+            _get_format(type_).encode().ljust(57, b"\x00") for type_ in types.values()
+        )
+        + b"</formats>",
+        b"<value_label_names>" + bytes(129 * k) + b"</value_label_names>",
+        b"<variable_labels>" + bytes(321 * k) + b"</variable_labels>",
+        b"<characteristics></characteristics>",
+    ]
+    sizes = [
+        *map(len, descriptors),
+        len(b"<data></data>") + n_obs * row.size,
+        len(b"<strls></strls>"),
+        len(b"<value_labels></value_labels>"),
+    ]
+    offsets = [0, len(header)]
+    position = len(header) + len(b"<map></map>") + 14 * 8
+    for size in sizes:
+        offsets.append(position)
+        position += size
+    offsets.extend([position, position + len(b"</stata_dta>")])
+
+    yield header
+    yield b"<map>" + b"".join(offset.to_bytes(8, "little") for offset in offsets)
+    yield b"</map>" + b"".join(descriptors) + b"<data>"
+
+    n_written = 0
+    for chunk in chunks:
+        columns = [
+            _encode_column(chunk[name], type_, name) for name, type_ in types.items()
+        ]
+        n_rows = len(columns[0]) if columns else 0
+        if n_rows > chunk_size:
+            msg = f"A chunk has {n_rows} rows, but at most {chunk_size} are allowed."
+            raise ValueError(msg)
+        yield b"".join(row.pack(*values) for values in zip(*columns, strict=True))
+        n_written += n_rows
+    if n_written != n_obs:
+        msg = f"The chunks contain {n_written} observations instead of {n_obs}."
+        raise ValueError(msg)
+
+    yield b"</data><strls></strls><value_labels></value_labels></stata_dta>"
+
+
+def iter_dta(
+    path: Path, chunk_size: int = CHUNK_SIZE
+) -> Iterator[dict[str, list[Any]]]:
+    """Read the observations of a ``.dta`` file in chunks of columns.
+
+    Missing values are returned as ``None``.
+
+    """
+    header = read_dta_header(path)
+    types = [variable.type for variable in header.variables]
+    if "strL" in types:
+        msg = (
+            f"{path.as_posix()!r} contains long strings (strL) which are not supported."
+        )
+        raise ValueError(msg)
+    order = "<" if header.byteorder == "little" else ">"
+    row = struct.Struct(order + "".join(map(_get_struct_code, types)))
+    names = [variable.name for variable in header.variables]
+
+    with path.open("rb") as file:
+        if header.n_obs == 0 or row.size == 0:
+            return
+        with (
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer,
+            memoryview(buffer) as view,
+        ):
+            for start in range(0, header.n_obs, chunk_size):
+                stop = min(start + chunk_size, header.n_obs)
+                data = view[
+                    header.data_offset + start * row.size : header.data_offset
+                    + stop * row.size
+                ]
+                rows = list(row.iter_unpack(data))
+                data.release()
+                yield {
+                    name: _decode_column(values, type_)
+                    for name, type_, values in zip(
+                        names, types, zip(*rows, strict=True), strict=True
+                    )
+                }
+
+
+def _get_types(frame: Any, chunk_size: int) -> dict[str, str]:
+    """Get the Stata types of the columns of a frame.
+
+    The widths of string columns are the longest values in the column which requires to
+    read the frame once.
+
+    """
+    if get_frame_library(frame) == "pandas":
+        dtypes = {str(name): str(dtype) for name, dtype in frame.dtypes.items()}
+    else:
+        dtypes = {field.name: str(field.type) for field in frame.schema}
+
+    strings = [name for name, dtype in dtypes.items() if dtype in _STRING_TYPES]
+    widths = dict.fromkeys(strings, 1)
+    if strings:
+        for chunk in _iter_frame_chunks(frame, chunk_size, strings):
+            for name in strings:
+                widths[name] = max(
+                    [widths[name]]
+                    + [len(_encode_string(value, name)) for value in chunk[name]]
+                )
+
+    types = {}
+    for name, dtype in dtypes.items():
+        if name in widths:
+            if widths[name] > _MAX_STR:
+                msg = (
+                    f"The column {name!r} has strings with more than {_MAX_STR} bytes "
+                    "which are not supported."
+                )
+                raise ValueError(msg)
+            types[name] = f"str{widths[name]}"
+        elif dtype.startswith(("datetime", "timestamp", "date", "time", "category")):
+            msg = (
+                f"The column {name!r} has the type {dtype!r} which cannot be converted "
+                "to Stata. Convert it to numbers or strings first."
+            )
+            raise TypeError(msg)
+        else:
+            types[name] = _TYPES.get(dtype, "double")
+    return types
+
+
+def _iter_frame_chunks(
+    frame: Any, chunk_size: int, columns: Sequence[str] | None = None
+) -> Iterator[dict[str, list[Any]]]:
+    """Iterate over chunks of rows of a frame as lists of Python values."""
+    if get_frame_library(frame) == "pandas":
+        names = list(frame.columns) if columns is None else list(columns)
+        for start in range(0, len(frame), chunk_size):
+            chunk = frame.iloc[start : start + chunk_size][names]
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            yield {str(name): chunk[name].tolist() for name in names}
+    else:
+        table = frame if columns is None else frame.select(list(columns))
+        for batch in table.to_batches(max_chunksize=chunk_size):
+            yield batch.to_pydict()
+
+
+def _encode_column(values: Sequence[Any], type_: str, name: str) -> list[Any]:
+    """Encode the values of a column for :mod:`struct`."""
+    if type_.startswith("str"):
+        return [_encode_string(value, name) for value in values]
+    missing = _MISSING[type_]
+    if type_ in ("float", "double"):
+        return [missing if _is_missing(value) else value for value in values]
+    return [missing if value is None else int(value) for value in values]
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _encode_string(value: Any, name: str) -> bytes:
+    if value is None:
+        return b""
+    if not isinstance(value, str):
+        msg = f"The column {name!r} contains {value!r} which is not a string."
+        raise TypeError(msg)
+    return value.encode()
+
+
+def _decode_column(values: Sequence[Any], type_: str) -> list[Any]:
+    """Decode the values of a column and replace missing values with ``None``."""
+    if type_.startswith("str"):
+        return [value.split(b"\x00", 1)[0].decode(errors="replace") for value in values]
+    missing = _MISSING[type_]
+    return [None if value >= missing else value for value in values]
+
+
+def _get_struct_code(type_: str) -> str:
+    if type_.startswith("str"):
+        return f"{get_type_width(type_)}s"
+    return _STRUCT[type_]
+
+
+def _get_type_code(type_: str) -> int:
+    return get_type_width(type_) if type_.startswith("str") else _CODES[type_]
+
+
+def _get_format(type_: str) -> str:
+    return f"%{get_type_width(type_)}s" if type_.startswith("str") else _FORMATS[type_]
+
+
+def _create_pandas_frame(
+    types: dict[str, str], chunks: Iterable[dict[str, list[Any]]]
+) -> Any:
+    try:
+        import pandas as pd  # noqa: PLC0415
+    except ImportError as e:
+        msg = "Reading Stata datasets into data frames requires pandas."
+        raise ImportError(msg) from e
+
+    dtypes = {
+        name: "object" if type_.startswith("str") else _PANDAS_DTYPES[type_]
+        for name, type_ in types.items()
+    }
+    frames = [pd.DataFrame(chunk, columns=list(types)) for chunk in chunks]
+    frame = (
+        pd.concat(frames, ignore_index=True)
+        if frames
+        else pd.DataFrame(columns=list(types))
+    )
+    return frame.astype(dtypes)
+
+
+def _create_pyarrow_table(
+    types: dict[str, str], chunks: Iterable[dict[str, list[Any]]]
+) -> Any:
+    try:
+        import pyarrow as pa  # noqa: PLC0415
+    except ImportError as e:
+        msg = "Reading Stata datasets into Arrow tables requires pyarrow."
+        raise ImportError(msg) from e
+
+    schema = pa.schema(
+        [
+            (
+                name,
+                pa.string()
+                if type_.startswith("str")
+                else pa.type_for_alias(_PYARROW_TYPES[type_]),
+            )
+            for name, type_ in types.items()
+        ]
+    )
+    batches = [pa.RecordBatch.from_pydict(chunk, schema=schema) for chunk in chunks]
+    return pa.Table.from_batches(batches, schema=schema)
@@ -0,0 +1,120 @@
+"""Hash the ``.dta`` files of Stata tasks by their content.
+
+By default, the state of a file is the hash of its content. Since Stata writes the time
+of saving into every dataset, a task which saves the same data a minute later still
+invalidates all tasks which depend on the dataset. With ``stata_hash_dta``, every
+``.dta`` file which is a dependency or a product of a Stata task becomes a
+:class:`DtaNode` whose state is the hash of the file without the timestamp. Downstream
+tasks are skipped if the data did not change.
+
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from dataclasses import field
+from typing import TYPE_CHECKING
+from typing import Any
+
+from pytask import PathNode
+from pytask import has_mark
+from pytask import hookimpl
+from pytask.tree_util import tree_leaves
+from pytask.tree_util import tree_map
+
+from pytask_stata.dta import DTA_SUFFIX
+from pytask_stata.dta import HASH_CACHE_FILE
+from pytask_stata.dta import DtaHashCache
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytask import PTask
+    from pytask import Session
+
+
+@dataclass(kw_only=True)
+class DtaNode(PathNode):
+    """A node for a ``.dta`` file whose state ignores the timestamp of the file.
+
+    Attributes
+    ----------
+    cache
+        The cache of the hashes of files which is shared by all nodes.
+
+    """
+
+    cache: DtaHashCache | None = field(default=None, repr=False, compare=False)
+
+    def state(self) -> str | None:
+        """Calculate the state of the node.
+
+        The state is the hash of the file without the timestamp in its header.
+
+        """
+        if self.cache is None:
+            self.cache = DtaHashCache()
+        return self.cache.digest(self.path)
+
+
+@hookimpl
+def pytask_parse_config(config: dict[str, Any]) -> None:
+    """Parse the configuration of the hashing of ``.dta`` files."""
+    config["stata_hash_dta"] = bool(config.get("stata_hash_dta"))
+    if config["stata_hash_dta"]:
+        config["stata_dta_hashes"] = DtaHashCache(
+            config["root"] / ".pytask" / HASH_CACHE_FILE
+        )
+
+
+@hookimpl
+def pytask_collect_modify_tasks(session: Session, tasks: list[PTask]) -> None:
+    """Replace the nodes of ``.dta`` files of Stata tasks with content-hashed nodes.
+
+    The nodes are replaced in all tasks, so that tasks which are not run with Stata but
+    depend on a dataset of a Stata task are skipped as well.
+
+    """
+    if not session.config["stata_hash_dta"]:
+        return
+
+    paths = {
+        path
+        for task in tasks
+        if has_mark(task, "stata")
+        for path in _get_dta_paths([task.depends_on, task.produces])
+    }
+    if not paths:
+        return
+
+    cache = session.config["stata_dta_hashes"]
+    for task in tasks:
+        for nodes in (task.depends_on, task.produces):
+            for name, value in nodes.items():
+                nodes[name] = tree_map(
+                    lambda node: _convert_node(node, paths, cache), value
+                )
+
+
+@hookimpl
+def pytask_unconfigure(session: Session) -> None:
+    """Save the hashes of ``.dta`` files."""
+    if "stata_dta_hashes" in session.config:
+        session.config["stata_dta_hashes"].save()
+
+
+def _is_dta_node(node: Any) -> bool:
+    return type(node) is PathNode and node.path.suffix.lower() == DTA_SUFFIX
+
+
+def _get_dta_paths(nodes: Any) -> list[Path]:
+    """Get the paths of all ``.dta`` files in a tree of nodes."""
+    return [node.path for node in tree_leaves(nodes) if _is_dta_node(node)]
+
+
+def _convert_node(node: Any, paths: set[Path], cache: DtaHashCache) -> Any:
+    if not _is_dta_node(node) or node.path not in paths:
+        return node
+    return DtaNode(
+        name=node.name, path=node.path, attributes=node.attributes, cache=cache
+    )
@@ -0,0 +1,126 @@
+"""Read Stata's log files."""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+ERROR_CODE = re.compile(r"r\(([0-9]+)\)")
+"""The pattern of an error code like ``r(601)`` at the start of a line in a log."""
+
+END_OF_DO_FILE = "end of do-file"
+"""The line which Stata writes when it leaves a do-file."""
+
+BLOCK_SIZE = 64 * 1024
+
+
+def read_log_tail(
+    path: Path,
+    n_lines: int,
+    max_bytes: int | None = None,
+    block_size: int = BLOCK_SIZE,
+) -> list[str]:
+    """Read the last lines of a log file.
+
+    The file is read backwards in blocks until it contains enough lines such that
+    memory and time do not depend on the size of the log. The result is the same as
+    splitting the whole log at newlines and keeping the last ``n_lines`` lines.
+
+    Parameters
+    ----------
+    path
+        The path to the log file.
+    n_lines
+        The number of lines from the end of the file.
+    max_bytes
+        The maximum number of bytes read from the end of the file. If the limit is
+        reached before enough lines are found, fewer lines are returned.
+    block_size
+        The number of bytes read at once.
+
+    """
+    with path.open("rb") as file:
+        position = file.seek(0, os.SEEK_END)
+        limit = position if max_bytes is None else min(position, max_bytes)
+
+        blocks: list[bytes] = []
+        n_read = 0
+        n_newlines = 0
+        while n_read < limit and n_newlines < n_lines:
+            size = min(block_size, limit - n_read)
+            position -= size
+            file.seek(position)
+            block = file.read(size)
+            blocks.append(block)
+            n_read += size
+            n_newlines += block.count(b"\n")
+
+    lines = b"".join(reversed(blocks)).decode(errors="replace").split("\n")
+    # The first line is incomplete if the start of the file was not reached.
+    if position > 0:
+        lines = lines[1:]
+    return lines[-n_lines:]
+
+
+def find_error_code(lines: list[str]) -> int | None:
+    """Find the first error code in the lines of a log.
+
+    Examples
+    --------
+    >>> find_error_code([". error 601", "r(601);", "end of do-file"])
+    601
+    >>> find_error_code([". sysuse auto", "end of do-file"]) is None
+    True
+
+    """
+    for line in lines:
+        match = ERROR_CODE.match(line)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+class UncapturedErrorDetector:
+    """Detect uncaptured errors in the lines of a log while Stata is running.
+
+    An error code like ``r(601);`` alone does not mean that the do-file failed. A
+    do-file which runs another do-file with ``capture`` continues after the error of
+    the nested do-file. An error is uncaptured if Stata leaves a do-file and writes the
+    error code again in the do-file which ran it.
+
+    Examples
+    --------
+    >>> detector = UncapturedErrorDetector()
+    >>> lines = ["r(601);", "", "end of do-file", ". display 1"]
+    >>> [detector.feed(line) for line in lines]
+    [None, None, None, None]
+    >>> lines = ["r(601);", "", "end of do-file", "r(601);"]
+    >>> [detector.feed(line) for line in lines]
+    [None, None, None, 601]
+
+    """
+
+    def __init__(self) -> None:
+        self._error_code: int | None = None
+        self._has_left_do_file = False
+
+    def feed(self, line: str) -> int | None:
+        """Read the next line and return the error code if it is uncaptured."""
+        if not line.strip():
+            return None
+
+        match = ERROR_CODE.match(line)
+        if match:
+            if self._error_code is not None and self._has_left_do_file:
+                return self._error_code
+            self._error_code, self._has_left_do_file = int(match.group(1)), False
+        elif line.strip() == END_OF_DO_FILE and self._error_code is not None:
+            self._has_left_do_file = True
+        else:
+            self._error_code, self._has_left_do_file = None, False
+        return None
@@ -0,0 +1,434 @@
+"""Cache the products of Stata tasks by the hash of their inputs.
+
+pytask decides whether a task runs by comparing the states of its nodes with the
+database of the project. Switching branches or building in a fresh clone therefore runs
+every Stata task again, even if the same inputs produced the same products before.
+
+With ``stata_output_cache``, the products and the log of every successful Stata task
+are copied into a content-addressed store after the task finished. The key of an entry
+is the hash of the contents of the do-file, the do-files and ado-files it runs and the
+dependencies, the options, the paths of the products and the version and edition of
+Stata. If a task needs to
+run and its key is in the store, the files are copied back instead of starting Stata.
+
+Files are stored once by the hash of their content, so entries which share a dataset
+share the file. The store can be a directory shared by several clones or machines since
+all files are written to temporary files and renamed. Entries which were not used for
+the longest time are evicted if the store exceeds its maximum size.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import Counter
+from dataclasses import asdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import cast
+
+from pytask import PathNode
+from pytask import Persisted
+from pytask import PNode
+from pytask import PPathNode
+from pytask import PythonNode
+from pytask import TaskOutcome
+from pytask import has_mark
+from pytask import hookimpl
+from pytask.tree_util import tree_leaves
+
+from pytask_stata.discovery import find_stata
+from pytask_stata.discovery import get_stata_info
+from pytask_stata.execute import FRAME_ARGUMENTS
+from pytask_stata.execute import get_frame_product_path
+from pytask_stata.execute import get_frame_products
+from pytask_stata.execute import get_log_path_of_task
+from pytask_stata.execute import load_frame_products
+from pytask_stata.frames import is_frame
+from pytask_stata.hashing import DtaNode
+from pytask_stata.scanner import CACHE_FILE
+from pytask_stata.scanner import ScanCache
+from pytask_stata.scanner import find_includes
+from pytask_stata.shared import parse_memory
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+    from pytask import ExecutionReport
+    from pytask import PTask
+    from pytask import Session
+
+
+CACHE_DIRECTORY = ".pytask/stata-cache"
+"""The default directory of the cache relative to the project's root."""
+
+CACHE_VERSION = 2
+"""The version of the key. Increasing it invalidates all entries."""
+
+BLOCK_SIZE = 1024 * 1024
+"""The number of bytes read at once when files are hashed."""
+
+LOG = "<log>"
+"""The name of the log in the files of an entry."""
+
+_INTERNAL_DEPENDENCIES = {
+    "_script",
+    "_options",
+    "_cwd",
+    "_executable",
+    "_log_name",
+    "_includes",
+}
+"""Dependencies which are part of the key in another form or not at all."""
+
+
+class Restored(Persisted):
+    """Outcome if the products of a task were restored from the output cache."""
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """The entry of a task in the output cache.
+
+    Attributes
+    ----------
+    key
+        The hash of the inputs of the task.
+    task
+        The name of the task which created the entry.
+    files
+        The hashes of the stored files by their paths relative to the project's root or
+        :data:`LOG` for the log.
+    time
+        The time when the entry was created in seconds since the epoch.
+
+    """
+
+    key: str
+    task: str
+    files: dict[str, str]
+    time: float
+
+
+class OutputCache:
+    """A content-addressed store of the products of Stata tasks.
+
+    Entries are JSON files in ``entries`` named by their keys. The stored files are in
+    ``objects`` named by the hashes of their content. The modification time of an entry
+    is the time of its last use.
+
+    Parameters
+    ----------
+    directory
+        The directory of the store.
+
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def get(self, key: str) -> CacheEntry | None:
+        """Get the entry of a key if all of its files are stored."""
+        path = self._entry(key)
+        try:
+            entry = CacheEntry(**json.loads(path.read_text()))
+        except (OSError, ValueError, TypeError):
+            return None
+        if not all(self._object(digest).exists() for digest in entry.files.values()):
+            return None
+        path.touch()
+        return entry
+
+    def put(self, key: str, task: str, files: dict[str, Path]) -> CacheEntry:
+        """Store the files of a task under a key.
+
+        Files which do not exist, like a removed log, are skipped.
+
+        """
+        digests = {}
+        for name, path in files.items():
+            if not path.exists():
+                continue
+            digest = _hash_file(path)
+            target = self._object(digest)
+            if not target.exists():
+                _copy(path, target)
+            digests[name] = digest
+
+        entry = CacheEntry(key=key, task=task, files=digests, time=time.time())
+        path = self._entry(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(asdict(entry)))
+        tmp.replace(path)
+        return entry
+
+    def restore(self, entry: CacheEntry, files: dict[str, Path]) -> None:
+        """Copy the stored files of an entry to their paths."""
+        for name, path in files.items():
+            if name in entry.files:
+                _copy(self._object(entry.files[name]), path)
+
+    def evict(self, max_size: int) -> None:
+        """Remove the least recently used entries until the store fits into the size.
+
+        Afterwards, files which belong to no entry are removed.
+
+        """
+        entries = []
+        for path in self.directory.joinpath("entries").glob("*.json"):
+            try:
+                files = json.loads(path.read_text())["files"]
+                used = path.stat().st_mtime
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((used, path, set(files.values())))
+        entries.sort(key=lambda entry: entry[0])
+
+        sizes = {
+            path.name: path.stat().st_size
+            for path in self.directory.joinpath("objects").glob("*/*")
+            if not path.name.startswith(".")
+        }
+        references = Counter(digest for _, _, digests in entries for digest in digests)
+        total = sum(sizes.get(digest, 0) for digest in references)
+        for _, path, digests in entries:
+            if total <= max_size:
+                break
+            path.unlink(missing_ok=True)
+            references.subtract(digests)
+            total -= sum(
+                sizes.get(digest, 0) for digest in digests if not references[digest]
+            )
+
+        for digest in sizes:
+            if not references[digest]:
+                self._object(digest).unlink(missing_ok=True)
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / "entries" / f"{key}.json"
+
+    def _object(self, digest: str) -> Path:
+        return self.directory / "objects" / digest[:2] / digest
+
+
+@hookimpl
+def pytask_parse_config(config: dict[str, Any]) -> None:
+    """Parse the configuration of the output cache."""
+    config["stata_output_cache"] = (
+        OutputCache(
+            config["root"] / (config.get("stata_output_cache_dir") or CACHE_DIRECTORY)
+        )
+        if config.get("stata_output_cache")
+        else None
+    )
+    max_size = config.get("stata_output_cache_max_size")
+    config["stata_output_cache_max_size"] = (
+        None if max_size is None else parse_memory(max_size)
+    )
+    if config["stata_output_cache"] is not None and "stata_scan_cache" not in config:
+        config["stata_scan_cache"] = ScanCache(config["root"] / ".pytask" / CACHE_FILE)
+
+
+@hookimpl(wrapper=True)
+def pytask_execute_task_setup(
+    session: Session, task: PTask
+) -> Generator[None, Any, Any]:
+    """Restore the products of a task which needs to run from the cache.
+
+    The key is computed after all other implementations have run, so tasks which are
+    skipped are never looked up and frames are already written.
+
+    """
+    result = yield
+    cache: OutputCache | None = session.config["stata_output_cache"]
+    if (
+        cache is None
+        or not has_mark(task, "stata")
+        or session.config["dry_run"]
+        or session.config["explain"]
+    ):
+        return result
+
+    key = _create_key(session, task)
+    if key is None:
+        return result
+
+    entry = cache.get(key)
+    if entry is None:
+        task.attributes["stata_output_cache_key"] = key
+        return result
+
+    cache.restore(entry, _get_files(session, task))
+    load_frame_products(session, task)
+    raise Restored
+
+
+@hookimpl(wrapper=True)
+def pytask_execute_task_teardown(
+    session: Session, task: PTask
+) -> Generator[None, Any, Any]:
+    """Store the products and the log of a successful task in the cache."""
+    result = yield
+    key = task.attributes.pop("stata_output_cache_key", None)
+    if key is not None:
+        session.config["stata_output_cache"].put(
+            key, task.name, _get_files(session, task)
+        )
+    return result
+
+
+@hookimpl(wrapper=True)
+def pytask_execute_task_process_report(
+    report: ExecutionReport,
+) -> Generator[None, Any, Any]:
+    """Report restored tasks as persisted before other plugins see the report.
+
+    Otherwise, plugins which handle failed Stata tasks, like the log archive, would
+    treat the restored task as a failure.
+
+    """
+    if report.exc_info and isinstance(report.exc_info[1], Restored):
+        report.outcome = TaskOutcome.PERSISTENCE
+    return (yield)
+
+
+@hookimpl
+def pytask_unconfigure(session: Session) -> None:
+    """Evict the least recently used entries from the cache."""
+    cache = session.config.get("stata_output_cache")
+    max_size = session.config.get("stata_output_cache_max_size")
+    if cache is not None and max_size is not None:
+        cache.evict(max_size)
+
+
+def _create_key(session: Session, task: PTask) -> str | None:
+    """Create the key of a task from the hashes of its inputs.
+
+    Paths are relative to the project's root and files are hashed by their content, so
+    that clones in different directories share entries. The states of pytask are not
+    used since they are modification times in older versions. Tasks with products which
+    are not files or with Python nodes as dependencies whose values are not hashed
+    cannot be cached.
+
+    """
+    root = session.config["root"]
+    files = _get_files(session, task)
+    if files is None:
+        return None
+
+    scan_cache: ScanCache = session.config["stata_scan_cache"]
+    dependencies = []
+    for name, value in task.depends_on.items():
+        if name in _INTERNAL_DEPENDENCIES:
+            continue
+        for node in tree_leaves(value):  # ty: ignore[invalid-argument-type]
+            if isinstance(node, DtaNode):
+                # The state of the node ignores the timestamp of the dataset.
+                path = _relative(node.path, root)
+                dependencies.append([name, path, node.state()])
+            elif isinstance(node, PPathNode):
+                path = _relative(node.path, root)
+                state = scan_cache.digest(node.path) if node.path.exists() else None
+                dependencies.append([name, path, state])
+            elif isinstance(node, PythonNode) and is_frame(node.value):
+                # Frames are part of the key by the hashes in the paths of their files.
+                continue
+            elif isinstance(node, PythonNode) and not node.hash:
+                return None
+            elif isinstance(node, PNode):
+                dependencies.append([name, node.name, node.state()])
+
+    script = cast("PathNode", task.depends_on["_script"])
+    options = cast("PythonNode", task.depends_on["_options"]).load()
+    cwd = Path(cast("PythonNode", task.depends_on["_cwd"]).load())
+    executable = cast("PythonNode", task.depends_on["_executable"]).load()
+    includes = [
+        [_relative(path, root), scan_cache.digest(path)]
+        for path in find_includes(
+            scan_cache, script.path, options, cwd, session.config["stata_adopath"]
+        )
+    ]
+    info = (
+        get_stata_info(session.config)
+        if executable == session.config["stata"]
+        else find_stata(root, executable)
+    )
+
+    inputs = {
+        "version": CACHE_VERSION,
+        "script": [_relative(script.path, root), scan_cache.digest(script.path)],
+        "includes": includes,
+        "options": options,
+        "frames": [
+            _relative(Path(path), root)
+            for path in task.attributes.get(FRAME_ARGUMENTS, [])
+        ],
+        "cwd": _relative(cwd, root),
+        "dependencies": sorted(dependencies, key=str),
+        "products": sorted(files.keys() - {LOG}),
+        # The path of the executable differs between machines, but not the results.
+        "stata": None if info is None else [info.version, info.edition],
+    }
+    text = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _get_files(session: Session, task: PTask) -> dict[str, Path] | None:
+    """Get the files of a task which are stored by their names in the cache.
+
+    Returns ``None`` if the task has products which cannot be stored.
+
+    """
+    root = session.config["root"]
+    files = {LOG: get_log_path_of_task(session, task)}
+    frame_products = get_frame_products(task)
+    for name, value in task.produces.items():
+        if name in frame_products:
+            path = get_frame_product_path(session, task, name)
+            files[_relative(path, root)] = path
+            continue
+        for node in tree_leaves(value):  # ty: ignore[invalid-argument-type]
+            if not isinstance(node, PathNode):
+                return None
+            files[_relative(node.path, root)] = node.path
+    return files
+
+
+def _relative(path: Path, root: Path) -> str:
+    """Get a path relative to the root if it is inside the root.
+
+    Examples
+    --------
+    >>> _relative(Path("/project/data/a.dta"), Path("/project"))
+    'data/a.dta'
+    >>> _relative(Path("/ado/plus/a.ado"), Path("/project"))
+    '/ado/plus/a.ado'
+
+    """
+    if path.is_relative_to(root):
+        return path.relative_to(root).as_posix()
+    return path.as_posix()
+
+
+def _hash_file(path: Path) -> str:
+    """Hash the content of a file in blocks."""
+    hasher = hashlib.sha256()
+    with path.open("rb") as file:
+        while block := file.read(BLOCK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _copy(source: Path, target: Path) -> None:
+    """Copy a file to a temporary file next to the target and rename it."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    shutil.copyfile(source, tmp)
+    tmp.replace(target)
@@ -0,0 +1,185 @@
+"""Run partitioned Stata tasks on the partitions of their input dataset.
+
+A Stata task with ``partition_by`` in its mark is replaced by three kinds of tasks
+after the collection.
+
+1. A task splits the input dataset into ``n_partitions`` datasets by the key.
+2. One Stata task per partition runs the do-file. The paths of the partition and of the
+   partial output are appended to the options, so the do-file reads them with ``args``.
+3. A task appends the partial outputs to the product of the original task.
+
+The Stata tasks of the partitions are independent, so they run in parallel with
+pytask-parallel or the ``async`` backend. The ``batch`` backend runs them one after
+another in one Stata process.
+
+"""
+
+from __future__ import annotations
+
+import functools
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import cast
+
+from pytask import NodeInfo
+from pytask import PathNode
+from pytask import PPathNode
+from pytask import PythonNode
+from pytask import Task
+from pytask import TaskWithoutPath
+from pytask import get_marks
+from pytask import has_mark
+from pytask import hookimpl
+from pytask.tree_util import tree_leaves
+
+from pytask_stata.dta import DTA_SUFFIX
+from pytask_stata.dta import DtaExpectation
+from pytask_stata.dta import check_expectation
+from pytask_stata.dta import read_dta_header
+from pytask_stata.partitions import PARTITIONS_DIRECTORY
+from pytask_stata.partitions import Partitioning
+from pytask_stata.partitions import append_dta
+from pytask_stata.partitions import split_dta
+from pytask_stata.usage import get_usage_path
+
+if TYPE_CHECKING:
+    from pytask import PTask
+    from pytask import Session
+
+
+@hookimpl
+def pytask_collect_modify_tasks(session: Session, tasks: list[PTask]) -> None:
+    """Replace partitioned Stata tasks with the tasks which split, run and append."""
+    for task in list(tasks):
+        if not has_mark(task, "stata"):
+            continue
+        kwargs = get_marks(task, "stata")[0].kwargs
+        if "partition_by" not in kwargs:
+            continue
+        partitioning = Partitioning(
+            key=kwargs["partition_by"], n_partitions=kwargs["n_partitions"]
+        )
+        tasks.remove(task)
+        tasks.extend(_partition_task(session, task, partitioning))
+
+
+def _partition_task(
+    session: Session, task: PTask, partitioning: Partitioning
+) -> list[PTask]:
+    """Create the tasks which split the input, run the script and append the outputs."""
+    name, dataset = next(
+        (name, node)
+        for name, node in task.depends_on.items()
+        if not name.startswith("_")
+        and isinstance(node, PPathNode)
+        and node.path.suffix == DTA_SUFFIX
+    )
+    product = tree_leaves(task.produces)[0]  # ty: ignore[invalid-argument-type]
+    log_name = cast("PythonNode", task.depends_on["_log_name"]).load()
+    options = cast("PythonNode", task.depends_on["_options"]).load()
+    directory = session.config["root"] / PARTITIONS_DIRECTORY / log_name
+    inputs = [
+        PathNode.from_path(directory / f"input-{i}.dta")
+        for i in range(partitioning.n_partitions)
+    ]
+    outputs = [
+        PathNode.from_path(directory / f"output-{i}.dta")
+        for i in range(partitioning.n_partitions)
+    ]
+    expectation = (
+        get_marks(task, "stata")[0]
+        .kwargs.get("expect", {})
+        .get(cast("PPathNode", product).path)
+    )
+
+    tasks = [
+        _create_task(
+            task,
+            "split",
+            function=functools.partial(_split, key=partitioning.key),
+            depends_on={"path": dataset},
+            produces={"produces": inputs},
+        ),
+        _create_task(
+            task,
+            "append",
+            function=functools.partial(_append, expectation=expectation),
+            depends_on={"paths": outputs},
+            produces={"produces": product},
+        ),
+    ]
+    for i, (input_, output) in enumerate(zip(inputs, outputs, strict=True)):
+        subtask = _create_task(
+            task,
+            f"partition-{i}",
+            function=task.function,
+            depends_on={**task.depends_on, name: input_},
+            produces={"_partition": output},
+            markers=list(task.markers),
+            attributes=dict(task.attributes),
+        )
+        subtask.depends_on["_options"] = _collect_node(
+            session,
+            task,
+            subtask,
+            "_options",
+            [*options, input_.path.as_posix(), output.path.as_posix()],
+        )
+        subtask.depends_on["_log_name"] = _collect_node(
+            session,
+            task,
+            subtask,
+            "_log_name",
+            PythonNode(value=f"{log_name}_partition_{i}"),
+        )
+        subtask.function = functools.partial(
+            subtask.function,
+            _usage_file=get_usage_path(session.config["root"], subtask),
+        )
+        tasks.append(subtask)
+    return tasks
+
+
+def _create_task(task: PTask, suffix: str, **kwargs: Any) -> PTask:
+    """Create a task whose name is the name of the original task with a suffix."""
+    if isinstance(task, Task):
+        return Task(base_name=f"{task.base_name}[{suffix}]", path=task.path, **kwargs)
+    return TaskWithoutPath(name=f"{task.name}[{suffix}]", **kwargs)
+
+
+def _collect_node(
+    session: Session, task: PTask, subtask: PTask, arg_name: str, value: Any
+) -> Any:
+    """Collect a node of a task which is created for a partition."""
+    path = getattr(task, "path", None)
+    return session.hook.pytask_collect_node(
+        session=session,
+        path=Path.cwd() if path is None else path.parent,
+        node_info=NodeInfo(
+            arg_name=arg_name,
+            path=(),
+            value=value,
+            task_path=path,
+            task_name=getattr(subtask, "base_name", subtask.name),
+        ),
+    )
+
+
+def _split(path: Path, produces: list[Path], key: str) -> None:
+    """Split the input dataset into the partitions."""
+    split_dta(path, produces, key)
+
+
+def _append(
+    paths: list[Path], produces: Path, expectation: DtaExpectation | None
+) -> None:
+    """Append the partial outputs and check the expectations of the product."""
+    append_dta(paths, produces)
+    if expectation is not None:
+        problems = check_expectation(read_dta_header(produces), expectation)
+        if problems:
+            raise RuntimeError(
+                "The dataset produced by the task is invalid.\n\n"
+                + "\n".join(f"- {problem}" for problem in problems)
+            )
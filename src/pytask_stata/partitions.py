@@ -0,0 +1,352 @@
+"""Split ``.dta`` files into partitions by a key and append the partial results.
+
+A partitioned Stata task runs the same do-file on every partition of its input dataset
+and the partial outputs are appended to the product. Observations with the same value
+of the key are always in the same partition, so do-files which work by group give the
+same results as on the whole dataset.
+
+Datasets in the formats 117 to 119 store observations as records of a fixed width. The
+records are copied between files without decoding them, so splitting and appending only
+read the data twice and hold one buffer per partition in memory. The header, the
+descriptions of the variables and the value labels are copied from the input, and only
+the number of observations and the offsets in the map are changed.
+
+"""
+
+from __future__ import annotations
+
+import itertools
+import mmap
+import zlib
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from typing import Any
+
+from pytask_stata.dta import DtaHeader
+from pytask_stata.dta import get_type_width
+from pytask_stata.dta import read_dta_header
+from pytask_stata.frames import iter_dta
+from pytask_stata.frames import write_dta
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+
+PARTITIONS_DIRECTORY = ".pytask/stata-partitions"
+"""The directory of partitions and partial outputs relative to the project's root."""
+
+BUFFER_SIZE = 1024 * 1024
+"""The number of bytes collected per partition before they are written."""
+
+_MAP_SIZE = 14
+_SORTLIST_SECTION = 4
+_FORMATS_SECTION = 5
+_DATA_SECTION = 9
+_STRLS_SECTION = 10
+_NUMERIC_TYPES = ("byte", "int", "long", "float", "double")
+
+
+@dataclass(frozen=True)
+class Partitioning:
+    """The partitioning of a Stata task.
+
+    Attributes
+    ----------
+    key
+        The name of the variable whose values assign observations to partitions.
+    n_partitions
+        The number of partitions.
+
+    """
+
+    key: str
+    n_partitions: int
+
+
+@dataclass(frozen=True)
+class _Layout:
+    """The positions of the sections of a ``.dta`` file in the formats 117 to 119."""
+
+    header: DtaHeader
+    offsets: tuple[int, ...]
+    n_position: int
+    n_size: int
+    row_size: int
+
+    @property
+    def data_end(self) -> int:
+        return self.header.data_offset + self.header.data_size
+
+
+def parse_partitioning(partition_by: Any, n_partitions: Any) -> Partitioning | None:
+    """Parse the arguments of the Stata mark which partition a task.
+
+    Examples
+    --------
+    >>> parse_partitioning("county", 8)
+    Partitioning(key='county', n_partitions=8)
+    >>> parse_partitioning(None, None) is None
+    True
+
+    """
+    if partition_by is None and n_partitions is None:
+        return None
+    if not isinstance(partition_by, str) or not partition_by:
+        msg = (
+            "'partition_by' must be the name of the variable which partitions the "
+            f"dataset, but it is {partition_by!r}."
+        )
+        raise ValueError(msg)
+    if n_partitions is None:
+        msg = (
+            f"'n_partitions' must be given with 'partition_by={partition_by!r}' since "
+            "the number of partitions defines the tasks and their outputs."
+        )
+        raise ValueError(msg)
+    if isinstance(n_partitions, bool) or not isinstance(n_partitions, int):
+        msg = f"'n_partitions' must be an integer, but it is {n_partitions!r}."
+        raise TypeError(msg)
+    if n_partitions < 1:
+        msg = f"'n_partitions' must be at least 1, but it is {n_partitions}."
+        raise ValueError(msg)
+    return Partitioning(key=partition_by, n_partitions=n_partitions)
+
+
+def split_dta(path: Path, targets: list[Path], key: str) -> list[int]:
+    """Split a dataset into one dataset per target by the values of a key.
+
+    An observation is assigned to a partition by the hash of the stored value of the
+    key. Empty partitions are written as datasets without observations.
+
+    Returns
+    -------
+    list[int]
+        The number of observations in every partition.
+
+    """
+    layout = _read_layout(path)
+    names = [variable.name for variable in layout.header.variables]
+    if key not in names:
+        msg = f"{path.as_posix()!r} has no variable {key!r} to partition it by."
+        raise ValueError(msg)
+    index = names.index(key)
+    types = [variable.type for variable in layout.header.variables]
+    start = sum(map(get_type_width, types[:index]))
+    key_slice = slice(start, start + get_type_width(types[index]))
+    is_string = types[index].startswith("str")
+
+    with path.open("rb") as file, _map(file) as buffer:
+        counts = [0] * len(targets)
+        for partition, _ in _assign_rows(
+            buffer, layout, key_slice, len(targets), is_string=is_string
+        ):
+            counts[partition] += 1
+
+        for target in targets:
+            target.parent.mkdir(parents=True, exist_ok=True)
+        with ExitStack() as stack:
+            files = [stack.enter_context(target.open("wb")) for target in targets]
+            for file_, count in zip(files, counts, strict=True):
+                file_.write(_render_head(buffer, layout, count))
+
+            buffers = [bytearray() for _ in targets]
+            for partition, row in _assign_rows(
+                buffer, layout, key_slice, len(targets), is_string=is_string
+            ):
+                buffers[partition] += row
+                if len(buffers[partition]) >= BUFFER_SIZE:
+                    files[partition].write(buffers[partition])
+                    buffers[partition].clear()
+
+            for file_, rest in zip(files, buffers, strict=True):
+                file_.write(rest)
+                file_.write(buffer[layout.data_end :])
+    return counts
+
+
+def append_dta(sources: list[Path], target: Path) -> int:
+    """Append datasets with the same variables to one dataset.
+
+    If all datasets have the same descriptions of variables and value labels, their
+    records are copied and the header of the first dataset is kept. Otherwise, the
+    types of variables are widened to fit all datasets, like ``str5`` and ``str8`` to
+    ``str8`` or ``long`` and ``float`` to ``double``, and the observations are written
+    to a new dataset without labels.
+
+    Returns
+    -------
+    int
+        The number of observations of the appended dataset.
+
+    """
+    layouts = [_read_layout(source) for source in sources]
+    n_obs = sum(layout.header.n_obs for layout in layouts)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.tmp")
+
+    if _have_same_descriptions(sources, layouts):
+        with sources[0].open("rb") as file, _map(file) as first, tmp.open("wb") as out:
+            out.write(_render_head(first, layouts[0], n_obs, clear_sort=True))
+            for source, layout in zip(sources, layouts, strict=True):
+                with source.open("rb") as file_, _map(file_) as buffer:
+                    for start in range(
+                        layout.header.data_offset, layout.data_end, BUFFER_SIZE
+                    ):
+                        out.write(
+                            buffer[start : min(start + BUFFER_SIZE, layout.data_end)]
+                        )
+            out.write(first[layouts[0].data_end :])
+        tmp.replace(target)
+        return n_obs
+
+    types = _widen_types(sources, layouts)
+    write_dta(
+        target, types, n_obs, itertools.chain.from_iterable(map(iter_dta, sources))
+    )
+    return n_obs
+
+
+def _read_layout(path: Path) -> _Layout:
+    """Read the positions of the sections of a dataset."""
+    header = read_dta_header(path)
+    if header.release < 117:  # noqa: PLR2004
+        msg = (
+            f"{path.as_posix()!r} has the format {header.release}, but partitions need "
+            "datasets in the formats 117 to 119 of Stata 13 and later."
+        )
+        raise ValueError(msg)
+    if any(variable.type == "strL" for variable in header.variables):
+        msg = f"{path.as_posix()!r} contains long strings (strL) which cannot be split."
+        raise ValueError(msg)
+
+    with path.open("rb") as file, _map(file) as buffer:
+        head = buffer[: header.data_offset]
+        map_position = head.index(b"<map>") + len(b"<map>")
+        offsets = tuple(
+            int.from_bytes(
+                head[map_position + 8 * i : map_position + 8 * (i + 1)],
+                header.byteorder,
+            )
+            for i in range(_MAP_SIZE)
+        )
+    return _Layout(
+        header=header,
+        offsets=offsets,
+        n_position=head.index(b"<N>") + len(b"<N>"),
+        n_size=4 if header.release == 117 else 8,  # noqa: PLR2004
+        row_size=sum(get_type_width(variable.type) for variable in header.variables),
+    )
+
+
+def _render_head(
+    buffer: mmap.mmap, layout: _Layout, n_obs: int, *, clear_sort: bool = False
+) -> bytes:
+    """Render the part of a dataset before the data for a number of observations."""
+    order = layout.header.byteorder
+    head = bytearray(buffer[: layout.header.data_offset])
+    head[layout.n_position : layout.n_position + layout.n_size] = n_obs.to_bytes(
+        layout.n_size, order
+    )
+    # The sections after the data move by the change of its size.
+    shift = (n_obs - layout.header.n_obs) * layout.row_size
+    map_position = layout.offsets[1] + len(b"<map>")
+    for i in range(_STRLS_SECTION, _MAP_SIZE):
+        position = map_position + 8 * i
+        head[position : position + 8] = (layout.offsets[i] + shift).to_bytes(8, order)
+    if clear_sort:
+        start = layout.offsets[_SORTLIST_SECTION] + len(b"<sortlist>")
+        end = layout.offsets[_FORMATS_SECTION] - len(b"</sortlist>")
+        head[start:end] = bytes(end - start)
+    return bytes(head)
+
+
+def _assign_rows(
+    buffer: mmap.mmap, layout: _Layout, key: slice, n: int, *, is_string: bool
+) -> Iterator[tuple[int, bytes]]:
+    """Assign the records to partitions by the hash of the stored value of the key.
+
+    Strings are hashed up to their terminating null byte, since the bytes after it are
+    not defined.
+
+    """
+    for row in _iter_rows(buffer, layout):
+        value = row[key]
+        if is_string:
+            value = value.split(b"\x00", 1)[0]
+        yield zlib.crc32(value) % n, row
+
+
+def _iter_rows(buffer: mmap.mmap, layout: _Layout) -> Iterator[bytes]:
+    """Iterate over the records of all observations."""
+    size = layout.row_size
+    if size == 0:
+        return
+    step = max(BUFFER_SIZE // size, 1) * size
+    for start in range(layout.header.data_offset, layout.data_end, step):
+        block = buffer[start : min(start + step, layout.data_end)]
+        for position in range(0, len(block), size):
+            yield block[position : position + size]
+
+
+def _have_same_descriptions(sources: list[Path], layouts: list[_Layout]) -> bool:
+    """Check whether datasets have the same variables, formats and labels."""
+    first = layouts[0]
+
+    def describe(path: Path, layout: _Layout) -> tuple[Any, ...]:
+        offsets = layout.offsets
+        with path.open("rb") as file, _map(file) as buffer:
+            return (
+                layout.header.release,
+                layout.header.byteorder,
+                buffer[offsets[2] : offsets[_SORTLIST_SECTION]],
+                buffer[offsets[_FORMATS_SECTION] : offsets[_DATA_SECTION]],
+                buffer[layout.data_end :],
+            )
+
+    expected = describe(sources[0], first)
+    return all(
+        describe(source, layout) == expected
+        for source, layout in zip(sources[1:], layouts[1:], strict=True)
+    )
+
+
+def _widen_types(sources: list[Path], layouts: list[_Layout]) -> dict[str, str]:
+    """Find the types of variables which hold the values of all datasets."""
+    types = {variable.name: variable.type for variable in layouts[0].header.variables}
+    for source, layout in zip(sources[1:], layouts[1:], strict=True):
+        other = {variable.name: variable.type for variable in layout.header.variables}
+        if list(other) != list(types):
+            msg = (
+                f"{source.as_posix()!r} has the variables {list(other)}, but the first "
+                f"partial output has {list(types)}."
+            )
+            raise ValueError(msg)
+        types = {name: _widen(type_, other[name]) for name, type_ in types.items()}
+    return types
+
+
+def _widen(first: str, second: str) -> str:
+    """Get the narrowest type which holds the values of two types.
+
+    Examples
+    --------
+    >>> _widen("str5", "str8"), _widen("byte", "int"), _widen("long", "float")
+    ('str8', 'int', 'double')
+
+    """
+    if first == second:
+        return first
+    if first.startswith("str") and second.startswith("str"):
+        return f"str{max(get_type_width(first), get_type_width(second))}"
+    if first.startswith("str") or second.startswith("str"):
+        msg = f"A variable is stored as {first} and {second} in the partial outputs."
+        raise ValueError(msg)
+    if {first, second} == {"long", "float"}:
+        return "double"
+    return max(first, second, key=_NUMERIC_TYPES.index)
+
+
+def _map(file: Any) -> mmap.mmap:
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
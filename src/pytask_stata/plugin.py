@@ -6,10 +6,20 @@ from typing import TYPE_CHECKING
 
 from _pytask.config import hookimpl
 
+from pytask_stata import archive
+from pytask_stata import asynchronous
+from pytask_stata import batch
 from pytask_stata import cli
 from pytask_stata import collect
 from pytask_stata import config
+from pytask_stata import durations
 from pytask_stata import execute
+from pytask_stata import hashing
+from pytask_stata import output_cache
+from pytask_stata import partitioning
+from pytask_stata import profiling
+from pytask_stata import resources
+from pytask_stata import usage
 
 if TYPE_CHECKING:
     from pluggy import PluginManager
@@ -18,7 +28,17 @@ if TYPE_CHECKING:
 @hookimpl
 def pytask_add_hooks(pm: PluginManager) -> None:
     """Register hook implementations."""
+    pm.register(archive)
+    pm.register(asynchronous)
+    pm.register(batch)
     pm.register(cli)
     pm.register(collect)
     pm.register(config)
+    pm.register(durations)
     pm.register(execute)
+    pm.register(hashing)
+    pm.register(output_cache)
+    pm.register(partitioning)
+    pm.register(profiling)
+    pm.register(resources)
+    pm.register(usage)
@@ -0,0 +1,266 @@
+"""A pool of persistent Stata sessions which run many do-files.
+
+Starting Stata is expensive because of the license check, ``profile.do`` and loading
+the ado-paths. For many small do-files, the startup costs more than running the
+scripts. The pool keeps Stata sessions in console mode alive and sends each do-file to
+an idle session.
+
+"""
+
+from __future__ import annotations
+
+import atexit
+import queue
+import subprocess
+import sys
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import cast
+
+from pytask_stata.driver import parse_return_code
+from pytask_stata.driver import render_run_commands
+from pytask_stata.process import POLL_INTERVAL
+from pytask_stata.process import Watchdog
+from pytask_stata.process import create_watchdog
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from pytask_stata.shared import StataResources
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """The configuration of a pool of Stata sessions.
+
+    Attributes
+    ----------
+    size
+        The maximum number of Stata sessions running at the same time.
+    max_tasks
+        The number of tasks after which a session is replaced with a new one.
+    max_memory
+        The memory in bytes after which a session is replaced with a new one.
+
+    """
+
+    size: int = 1
+    max_tasks: int | None = None
+    max_memory: int | None = None
+
+
+class StataWorker:
+    """A Stata session in console mode which receives commands via stdin."""
+
+    def __init__(self, executable: str) -> None:
+        self.n_tasks = 0
+        self.process = subprocess.Popen(  # noqa: S603
+            [executable, "-q"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+        )
+
+    @property
+    def is_alive(self) -> bool:
+        """Indicate whether the Stata session is still running."""
+        return self.process.poll() is None
+
+    def run(  # noqa: PLR0913
+        self,
+        script: Path,
+        options: Sequence[str],
+        cwd: Path,
+        log: Path,
+        resources: StataResources | None = None,
+        *,
+        n_lines: int = 10,
+        profile: bool = False,
+    ) -> int:
+        """Run a do-file and return Stata's return code.
+
+        If the task exceeds the limits of its resources, the session is killed and an
+        error with the last ``n_lines`` lines of the log is raised.
+
+        """
+        token = uuid.uuid4().hex
+        commands = render_run_commands(
+            script, options, cwd, log, token, resources, profile=profile
+        )
+
+        assert self.process.stdin is not None  # noqa: S101
+        assert self.process.stdout is not None  # noqa: S101
+        self.process.stdin.write("\n".join(commands) + "\n")
+        self.process.stdin.flush()
+        self.n_tasks += 1
+
+        reasons: list[str] = []
+        watchdog = create_watchdog(resources, log, self.memory)
+        if watchdog is not None:
+            is_finished = threading.Event()
+            thread = threading.Thread(
+                target=self._supervise,
+                args=(watchdog, is_finished, reasons),
+                daemon=True,
+            )
+            thread.start()
+        try:
+            for line in self.process.stdout:
+                return_code = parse_return_code(line, token)
+                if return_code is not None:
+                    return return_code
+        finally:
+            if watchdog is not None:
+                is_finished.set()
+                thread.join()
+
+        if reasons:
+            raise RuntimeError(
+                cast("Watchdog", watchdog).format_error(reasons[0], n_lines)
+            )
+        msg = f"The Stata session terminated while running {script.as_posix()!r}."
+        raise RuntimeError(msg)
+
+    def _supervise(
+        self, watchdog: Watchdog, is_finished: threading.Event, reasons: list[str]
+    ) -> None:
+        """Kill the session if the running task exceeds its limits."""
+        while not is_finished.wait(POLL_INTERVAL):
+            reason = watchdog.check()
+            if reason is not None:
+                reasons.append(reason)
+                self.process.kill()
+                return
+
+    def memory(self) -> int | None:
+        """Return the resident memory of the session in bytes if it is available."""
+        return get_resident_memory(self.process.pid)
+
+    def close(self) -> None:
+        """Close the Stata session."""
+        if self.is_alive:
+            try:
+                assert self.process.stdin is not None  # noqa: S101
+                self.process.stdin.write("exit, clear\n")
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+
+
+class StataWorkerPool:
+    """A pool of Stata sessions which are recycled after some tasks or memory."""
+
+    def __init__(self, executable: str, config: PoolConfig) -> None:
+        self.executable = executable
+        self.config = config
+        self._idle: queue.SimpleQueue[StataWorker] = queue.SimpleQueue()
+        self._n_workers = 0
+        self._lock = threading.Lock()
+
+    def run(  # noqa: PLR0913
+        self,
+        script: Path,
+        options: Sequence[str],
+        cwd: Path,
+        log: Path,
+        resources: StataResources | None = None,
+        *,
+        n_lines: int = 10,
+        profile: bool = False,
+    ) -> int:
+        """Run a do-file in an idle Stata session and return Stata's return code."""
+        worker = self._acquire()
+        try:
+            return worker.run(
+                script, options, cwd, log, resources, n_lines=n_lines, profile=profile
+            )
+        finally:
+            self._release(worker)
+
+    def close(self) -> None:
+        """Close all idle Stata sessions."""
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+            with self._lock:
+                self._n_workers -= 1
+
+    def _acquire(self) -> StataWorker:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_start_worker = self._n_workers < self.config.size
+            if can_start_worker:
+                self._n_workers += 1
+
+        if can_start_worker:
+            return StataWorker(self.executable)
+        return self._idle.get()
+
+    def _release(self, worker: StataWorker) -> None:
+        if self._needs_recycling(worker):
+            worker.close()
+            # Replace the worker so that threads waiting for a session continue.
+            worker = StataWorker(self.executable)
+        self._idle.put(worker)
+
+    def _needs_recycling(self, worker: StataWorker) -> bool:
+        if not worker.is_alive:
+            return True
+        if self.config.max_tasks is not None and (
+            worker.n_tasks >= self.config.max_tasks
+        ):
+            return True
+        if self.config.max_memory is not None:
+            memory = worker.memory()
+            return memory is not None and memory > self.config.max_memory
+        return False
+
+
+_POOLS: dict[tuple[str, PoolConfig], StataWorkerPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(executable: str, config: PoolConfig) -> StataWorkerPool:
+    """Get the pool for the executable in this process or create it."""
+    with _POOLS_LOCK:
+        key = (executable, config)
+        if key not in _POOLS:
+            _POOLS[key] = StataWorkerPool(executable, config)
+        return _POOLS[key]
+
+
+@atexit.register
+def close_pools() -> None:
+    """Close all pools of this process."""
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.close()
+        _POOLS.clear()
+
+
+def get_resident_memory(pid: int) -> int | None:
+    """Get the resident memory of a process in bytes.
+
+    The information is only available on Linux where it is read from ``/proc``.
+
+    """
+    if sys.platform != "linux":
+        return None
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) * 1024
+    return None
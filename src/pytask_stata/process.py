@@ -0,0 +1,571 @@
+"""Run and supervise Stata processes."""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import functools
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import cast
+
+from pytask_stata.driver import render_wrapper
+from pytask_stata.logs import UncapturedErrorDetector
+from pytask_stata.logs import find_error_code
+from pytask_stata.logs import read_log_tail
+from pytask_stata.shared import StataResources
+from pytask_stata.shared import format_memory
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Sequence
+
+
+POLL_INTERVAL = 0.1
+"""The number of seconds between two checks of a running Stata process."""
+
+TERMINATION_TIMEOUT = 5
+"""The number of seconds a process has to exit before it is killed."""
+
+MEMORY_INTERVAL = 1.0
+"""The number of seconds between two measurements of the memory of a process."""
+
+
+@dataclass(frozen=True)
+class ProcessUsage:
+    """The resources used by a Stata process.
+
+    Attributes
+    ----------
+    wall_time
+        The number of seconds from the start until the end of the process.
+    user_time
+        The number of seconds the process spent in user mode.
+    system_time
+        The number of seconds the process spent in kernel mode.
+    max_rss
+        The peak resident memory in bytes.
+
+    """
+
+    wall_time: float
+    user_time: float | None = None
+    system_time: float | None = None
+    max_rss: int | None = None
+
+
+class _Reaper:
+    """Wait for a process and collect its resource usage with ``os.wait4``."""
+
+    def __init__(self, process: subprocess.Popen[Any]) -> None:
+        self.process = process
+        self.start = time.perf_counter()
+        self.rusage: Any = None
+
+    def poll(self) -> int | None:
+        """Return the exit code if the process has finished."""
+        return self._wait(block=False)
+
+    def wait(self) -> int | None:
+        """Wait until the process has finished and return its exit code."""
+        return self._wait(block=True)
+
+    def usage(self) -> ProcessUsage:
+        """Return the resource usage of the finished process."""
+        wall_time = time.perf_counter() - self.start
+        if self.rusage is None:
+            return ProcessUsage(wall_time=wall_time)
+        # Linux reports the peak resident memory in kilobytes, macOS in bytes.
+        factor = 1 if sys.platform == "darwin" else 1024
+        return ProcessUsage(
+            wall_time=wall_time,
+            user_time=self.rusage.ru_utime,
+            system_time=self.rusage.ru_stime,
+            max_rss=self.rusage.ru_maxrss * factor,
+        )
+
+    def _wait(self, *, block: bool) -> int | None:
+        if sys.platform == "win32" or self.process.returncode is not None:
+            return self.process.wait() if block else self.process.poll()
+
+        pid, status, rusage = os.wait4(self.process.pid, 0 if block else os.WNOHANG)
+        if pid:
+            self.process.returncode = os.waitstatus_to_exitcode(status)
+            self.rusage = rusage
+        return self.process.returncode
+
+
+class LogFollower:
+    """Read the lines which are appended to a log file while Stata is running."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._position = 0
+        self._remainder = b""
+
+    def read_lines(self) -> list[str]:
+        """Read all complete lines which were added since the last call."""
+        try:
+            with self.path.open("rb") as file:
+                file.seek(self._position)
+                content = file.read()
+        except FileNotFoundError:
+            return []
+
+        self._position += len(content)
+        *lines, self._remainder = (self._remainder + content).split(b"\n")
+        return [line.decode(errors="replace").rstrip("\r") for line in lines]
+
+    def read_remainder(self) -> list[str]:
+        """Read the remaining lines including an incomplete last line."""
+        lines = self.read_lines()
+        if self._remainder:
+            lines.append(self._remainder.decode(errors="replace").rstrip("\r"))
+            self._remainder = b""
+        return lines
+
+
+class Watchdog:
+    """Check whether a running Stata process exceeds the limits of its task.
+
+    The log is idle if its size did not change since the last check. The memory is
+    measured at most every :data:`MEMORY_INTERVAL` seconds and only on Linux.
+
+    """
+
+    def __init__(
+        self,
+        resources: StataResources,
+        log: Path,
+        memory: Callable[[], int | None],
+    ) -> None:
+        self.resources = resources
+        self.log = log
+        self.memory = memory
+        self.start = time.monotonic()
+        self._last_activity = self.start
+        self._last_memory_check = -MEMORY_INTERVAL
+        self._log_size: int | None = None
+
+    def check(self) -> str | None:
+        """Return why the process must be stopped or ``None`` if it is within limits."""
+        now = time.monotonic()
+        timeout = self.resources.timeout
+        if timeout is not None and now - self.start > timeout:
+            return f"Stata ran longer than the timeout of {timeout:g} seconds."
+
+        idle_timeout = self.resources.idle_timeout
+        if idle_timeout is not None:
+            size = self.log.stat().st_size if self.log.exists() else 0
+            if size != self._log_size:
+                self._log_size, self._last_activity = size, now
+            elif now - self._last_activity > idle_timeout:
+                return f"The log did not grow for {idle_timeout:g} seconds."
+
+        max_rss = self.resources.max_rss
+        if max_rss is not None and now - self._last_memory_check >= MEMORY_INTERVAL:
+            self._last_memory_check = now
+            memory = self.memory()
+            if memory is not None and memory > max_rss:
+                return (
+                    f"Stata used {format_memory(memory)} of memory which exceeds the "
+                    f"limit of {format_memory(max_rss)}."
+                )
+        return None
+
+    def format_error(self, reason: str, n_lines: int) -> str:
+        """Format the error of a stopped process with the tail of its log."""
+        tail = read_log_tail(self.log, n_lines) if self.log.exists() else []
+        return (
+            f"{reason} The process was stopped. Here are the last {n_lines} lines of "
+            "the log:\n\n" + "\n".join(tail)
+        )
+
+
+def create_watchdog(
+    resources: StataResources | None, log: Path, memory: Callable[[], int | None]
+) -> Watchdog | None:
+    """Create a watchdog if the task limits its Stata process."""
+    if resources is None or not resources.has_limits():
+        return None
+    return Watchdog(resources, log, memory)
+
+
+def run_stata_process(  # noqa: PLR0913
+    cmd: list[str],
+    cwd: Path,
+    log: Path,
+    *,
+    follow_log: bool = False,
+    n_lines: int = 10,
+    on_line: Callable[[str], None] = print,
+    resources: StataResources | None = None,
+) -> ProcessUsage:
+    """Run a Stata process and return its resource usage.
+
+    If the log is followed, every new line is passed to ``on_line`` while Stata is
+    running. As soon as an uncaptured error like ``r(601)`` appears, the process group
+    is terminated and an error with the last ``n_lines`` lines of the log is raised. The
+    same happens if the process exceeds the limits of the resources.
+
+    The CPU times and the peak memory are only available on Unix.
+
+    """
+    if follow_log:
+        # Remove the log of a previous run such that its errors are not reported.
+        log.unlink(missing_ok=True)
+
+    process = subprocess.Popen(cmd, cwd=cwd, **_new_process_group_kwargs())  # noqa: S603
+    reaper = _Reaper(process)
+    watchdog = create_watchdog(
+        resources, log, functools.partial(get_process_group_memory, process.pid)
+    )
+    try:
+        if follow_log or watchdog is not None:
+            _supervise(
+                reaper,
+                LogFollower(log) if follow_log else None,
+                watchdog,
+                n_lines,
+                on_line,
+            )
+        else:
+            reaper.wait()
+    except BaseException:
+        terminate_process_group(process)
+        raise
+
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+    return reaper.usage()
+
+
+def _supervise(
+    reaper: _Reaper,
+    follower: LogFollower | None,
+    watchdog: Watchdog | None,
+    n_lines: int,
+    on_line: Callable[[str], None],
+) -> None:
+    """Follow the log and enforce the limits until the process exits.
+
+    New lines of the log are passed to a callback, and the process is stopped on
+    uncaptured errors or if it exceeds its limits.
+
+    """
+    tail: collections.deque[str] = collections.deque(maxlen=n_lines)
+    detector = UncapturedErrorDetector()
+    while True:
+        is_running = reaper.poll() is None
+        if follower is None:
+            lines = []
+        else:
+            lines = follower.read_lines() if is_running else follower.read_remainder()
+        for i, line in enumerate(lines):
+            on_line(line)
+            tail.append(line)
+            if detector.feed(line) is not None:
+                # Add the lines which Stata writes after the error code.
+                time.sleep(POLL_INTERVAL)
+                tail.extend(
+                    lines[i + 1 :] + cast("LogFollower", follower).read_remainder()
+                )
+                terminate_process_group(reaper.process)
+                msg = (
+                    f"An error occurred. Here are the last {n_lines} lines of the log:"
+                    "\n\n" + "\n".join(tail)
+                )
+                raise RuntimeError(msg)
+
+        if not is_running:
+            return
+
+        reason = None if watchdog is None else watchdog.check()
+        if reason is not None:
+            terminate_process_group(reaper.process)
+            raise RuntimeError(cast("Watchdog", watchdog).format_error(reason, n_lines))
+        time.sleep(POLL_INTERVAL)
+
+
+def terminate_process_group(process: subprocess.Popen[Any]) -> None:
+    """Terminate a process and all its children and kill them if they do not exit."""
+    if process.poll() is not None:
+        return
+
+    if sys.platform == "win32":
+        process.kill()
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        try:
+            process.wait(timeout=TERMINATION_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+    process.wait()
+
+
+def _new_process_group_kwargs() -> dict[str, Any]:
+    """Start a process in a new process group to be able to stop all its children."""
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def get_process_group_memory(pgid: int) -> int | None:
+    """Get the resident memory of all processes in a process group in bytes.
+
+    The information is only available on Linux where it is read from ``/proc``.
+
+    """
+    if sys.platform != "linux":
+        return None
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = None
+    for path in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # The name of the command in parentheses might contain spaces.
+            stat = path.read_text().rsplit(")", maxsplit=1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(stat[2]) == pgid:
+            total = (total or 0) + int(stat[21]) * page_size
+    return total
+
+
+@dataclass(frozen=True)
+class DoFileResult:
+    """The result of running a do-file.
+
+    Attributes
+    ----------
+    script
+        The path to the do-file.
+    log
+        The path to the log.
+    returncode
+        The exit code of the Stata process. Stata exits with zero even if the do-file
+        failed.
+    error_code
+        The error code like ``601`` for ``r(601)`` found in the log or ``None`` if the
+        do-file finished successfully.
+    tail
+        The last lines of the log.
+    usage
+        The usage of the Stata process which only contains the wall time.
+
+    """
+
+    script: Path
+    log: Path
+    returncode: int
+    error_code: int | None
+    tail: list[str]
+    usage: ProcessUsage
+
+    @property
+    def is_success(self) -> bool:
+        """Indicate whether Stata exited normally and the log contains no error."""
+        return self.returncode == 0 and self.error_code is None
+
+
+async def run_do_file(  # noqa: PLR0913
+    executable: str,
+    script: Path,
+    options: Sequence[str] = (),
+    *,
+    cwd: Path | None = None,
+    log: Path | None = None,
+    resources: StataResources | None = None,
+    follow_log: bool = False,
+    n_lines: int = 10,
+    max_bytes: int | None = None,
+    on_line: Callable[[str], None] | None = None,
+    profile: bool = False,
+) -> DoFileResult:
+    """Run a do-file in a new Stata process and parse its log.
+
+    Errors in the do-file do not raise an exception. They are reported by the
+    ``error_code`` of the result. If the process exceeds the limits of the resources,
+    like a timeout, the process group is stopped and a :class:`RuntimeError` with the
+    tail of the log is raised.
+
+    Parameters
+    ----------
+    executable
+        The Stata executable.
+    script
+        The path to the do-file.
+    options
+        The arguments passed to the do-file.
+    cwd
+        The working directory of the do-file. Defaults to the directory of the script.
+    log
+        The path to the log. Defaults to a log named after the script in the working
+        directory.
+    resources
+        The resources which are applied before the script runs and the limits of the
+        process.
+    follow_log
+        Whether the log is read while Stata is running. The process is stopped as soon
+        as an uncaptured error appears.
+    n_lines
+        The number of lines at the end of the log which are searched for errors.
+    max_bytes
+        The maximum number of bytes read from the end of the log.
+    on_line
+        A function which receives every line of the log if it is followed.
+    profile
+        Whether Stata reports the time of every command in the log.
+
+    """
+    cwd = script.parent if cwd is None else cwd
+    log = cwd / f"{script.stem}.log" if log is None else log
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        cmd = _prepare_wrapper(
+            executable, script, options, cwd, log, resources, Path(tmp), profile=profile
+        )
+        process = await asyncio.create_subprocess_exec(
+            *cmd, cwd=log.parent, **_new_process_group_kwargs()
+        )
+        watchdog = create_watchdog(
+            resources, log, functools.partial(get_process_group_memory, process.pid)
+        )
+        tail: list[str] | None = None
+        try:
+            if follow_log or watchdog is not None:
+                tail = await _supervise_async(
+                    process,
+                    LogFollower(log) if follow_log else None,
+                    watchdog,
+                    n_lines,
+                    on_line or print,
+                )
+            else:
+                await process.wait()
+        except BaseException:
+            await terminate_process_group_async(process)
+            raise
+
+    if tail is None:
+        tail = await asyncio.to_thread(_read_log_tail, log, n_lines, max_bytes)
+    return DoFileResult(
+        script=script,
+        log=log,
+        returncode=cast("int", process.returncode),
+        error_code=find_error_code(tail),
+        tail=tail,
+        usage=ProcessUsage(wall_time=time.perf_counter() - start),
+    )
+
+
+def _prepare_wrapper(  # noqa: PLR0913, PLR0917
+    executable: str,
+    script: Path,
+    options: Sequence[str],
+    cwd: Path,
+    log: Path,
+    resources: StataResources | None,
+    tmp: Path,
+    *,
+    profile: bool = False,
+) -> list[str]:
+    """Write a wrapper named after the log and return the command which runs it.
+
+    Stata writes the log to the directory where it starts and names it after the
+    do-file, so the wrapper changes into the working directory of the script. The log
+    of a previous run is removed such that its errors are not reported.
+
+    """
+    log.parent.mkdir(parents=True, exist_ok=True)
+    log.unlink(missing_ok=True)
+    wrapper = tmp / f"{log.stem}.do"
+    wrapper.write_text(
+        render_wrapper(
+            script,
+            options,
+            resources or StataResources(),
+            cwd=None if cwd == log.parent else cwd,
+            profile=profile,
+        )
+    )
+    return [executable, "-e", "do", wrapper.as_posix(), f"-{log.stem}"]
+
+
+async def _supervise_async(
+    process: asyncio.subprocess.Process,
+    follower: LogFollower | None,
+    watchdog: Watchdog | None,
+    n_lines: int,
+    on_line: Callable[[str], None],
+) -> list[str] | None:
+    """Follow the log and enforce the limits like :func:`_supervise` without blocking.
+
+    If the log is followed, the tail of the log is returned.
+
+    """
+    tail: collections.deque[str] = collections.deque(maxlen=n_lines)
+    detector = UncapturedErrorDetector()
+    waiter = asyncio.ensure_future(process.wait())
+    while True:
+        done, _ = await asyncio.wait({waiter}, timeout=POLL_INTERVAL)
+        if follower is None:
+            lines = []
+        else:
+            lines = follower.read_remainder() if done else follower.read_lines()
+        for i, line in enumerate(lines):
+            on_line(line)
+            tail.append(line)
+            if detector.feed(line) is not None:
+                # Add the lines which Stata writes after the error code.
+                await asyncio.sleep(POLL_INTERVAL)
+                tail.extend(
+                    lines[i + 1 :] + cast("LogFollower", follower).read_remainder()
+                )
+                await terminate_process_group_async(process)
+                return list(tail)
+
+        if done:
+            return None if follower is None else list(tail)
+
+        reason = None if watchdog is None else watchdog.check()
+        if reason is not None:
+            await terminate_process_group_async(process)
+            raise RuntimeError(cast("Watchdog", watchdog).format_error(reason, n_lines))
+
+
+async def terminate_process_group_async(
+    process: asyncio.subprocess.Process,
+) -> None:
+    """Terminate a process and all its children and kill them if they do not exit."""
+    if process.returncode is not None:
+        return
+
+    if sys.platform == "win32":
+        process.kill()
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), TERMINATION_TIMEOUT)
+        except asyncio.TimeoutError:
+            os.killpg(process.pid, signal.SIGKILL)
+    await process.wait()
+
+
+def _read_log_tail(log: Path, n_lines: int, max_bytes: int | None) -> list[str]:
+    return read_log_tail(log, n_lines, max_bytes) if log.exists() else []
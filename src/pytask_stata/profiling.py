@@ -0,0 +1,228 @@
+"""Profile which commands of do-files take the time.
+
+With ``stata_profile``, do-files run with ``set rmsg on`` and Stata reports the
+duration of every command in the log with a line like ``r; t=0.52 14:03:11``. The
+teardown of a task parses these lines from its log and attaches the profile to the
+task. At the end, the slowest source lines and the commands which took the most time in
+the whole build are shown.
+
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from pytask import ExecutionReport
+from pytask import Session
+from pytask import TaskOutcome
+from pytask import console
+from pytask import hookimpl
+from rich.markup import escape
+from rich.table import Table
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from collections.abc import Sequence
+    from pathlib import Path
+
+    from pytask import PTask
+
+
+TIMING = re.compile(r"r(?:\([0-9]+\))?; t=\s*([0-9]+(?:\.[0-9]+)?)")
+N_ENTRIES = 10
+
+_PREFIXES = {"capture": 3, "noisily": 1, "quietly": 3}
+_INTERNAL_COMMANDS = ("set rmsg", "local pytask_stata_rc")
+
+
+@dataclass
+class LineProfile:
+    """The time which Stata spent on one source line of a do-file.
+
+    Attributes
+    ----------
+    source
+        The source line as it is echoed in the log.
+    line
+        The number of the line in the do-file if it is found.
+    calls
+        How often the line was executed.
+    seconds
+        The total number of seconds spent on the line.
+
+    """
+
+    source: str
+    line: int | None = None
+    calls: int = 0
+    seconds: float = 0.0
+
+    @property
+    def command(self) -> str:
+        """The name of the Stata command of the line."""
+        return get_command_name(self.source)
+
+
+def get_command_name(source: str) -> str:
+    """Get the name of the command of a source line without its prefixes.
+
+    Examples
+    --------
+    >>> get_command_name("quietly regress price mpg")
+    'regress'
+    >>> get_command_name("cap noi: save out, replace")
+    'save'
+
+    """
+    words = source.replace(":", " ").split()
+    while len(words) > 1 and any(
+        prefix.startswith(words[0]) and len(words[0]) >= length
+        for prefix, length in _PREFIXES.items()
+    ):
+        words.pop(0)
+    return words[0].rstrip(",") if words else ""
+
+
+def parse_profile(
+    lines: Iterable[str], source: Iterable[str] = ()
+) -> list[LineProfile]:
+    """Parse the durations of commands from the lines of a log.
+
+    The timing which follows a command belongs to the last echoed line. Nested do-files
+    echo their own commands, so the timing of a ``do`` command which follows ``end of
+    do-file`` is skipped because it is already split among the commands of the nested
+    do-file. The lines of the do-file are used to find the numbers of the source lines.
+
+    Examples
+    --------
+    >>> log = [
+    ...     ". sysuse auto",
+    ...     "(1978 automobile data)",
+    ...     "r; t=0.01 10:00:00",
+    ...     ". regress price mpg",
+    ...     "r; t=0.50 10:00:01",
+    ... ]
+    >>> print(format_profile(parse_profile(log, ["sysuse auto", "regress price mpg"])))
+        time  calls   line  command
+       0.50s      1      2  regress price mpg
+       0.01s      1      1  sysuse auto
+
+    """
+    numbers: dict[str, int] = {}
+    for i, line in enumerate(source, start=1):
+        numbers.setdefault(line.strip(), i)
+
+    profile: dict[str, LineProfile] = {}
+    current: str | None = None
+    for line in lines:
+        if line.startswith(". "):
+            current = line[2:].strip()
+        elif line.strip() == "end of do-file":
+            current = None
+        elif current is not None and (match := TIMING.match(line)):
+            if not current.startswith(_INTERNAL_COMMANDS):
+                entry = profile.setdefault(
+                    current, LineProfile(current, numbers.get(current))
+                )
+                entry.calls += 1
+                entry.seconds += float(match.group(1))
+            current = None
+    return sorted(profile.values(), key=lambda entry: entry.seconds, reverse=True)
+
+
+def read_profile(log: Path, script: Path) -> list[LineProfile]:
+    """Read the profile of a do-file from its log."""
+    try:
+        source = script.read_text(errors="replace").splitlines()
+    except OSError:
+        source = []
+    with log.open(errors="replace") as file:
+        return parse_profile((line.rstrip("\r\n") for line in file), source)
+
+
+def format_profile(profile: Sequence[LineProfile]) -> str:
+    """Format the profile of a do-file as a table."""
+    rows = [f"{'time':>8}  {'calls':>5}  {'line':>5}  command"]
+    for entry in profile:
+        line = "" if entry.line is None else str(entry.line)
+        rows.append(
+            f"{entry.seconds:>7.2f}s  {entry.calls:>5}  {line:>5}  {entry.source}"
+        )
+    return "\n".join(rows)
+
+
+@hookimpl
+def pytask_execute_task_process_report(report: ExecutionReport) -> None:
+    """Attach the slowest source lines of a task to its report."""
+    profile = report.task.attributes.get("stata_profile")
+    if profile and report.outcome in (TaskOutcome.SUCCESS, TaskOutcome.FAIL):
+        report.sections.append(
+            ("call", "stata profile", format_profile(profile[:N_ENTRIES]))
+        )
+
+
+@hookimpl
+def pytask_execute_log_end(session: Session, reports: list[ExecutionReport]) -> None:
+    """Print the slowest source lines and commands of all profiled tasks."""
+    if not session.config["stata_profile"]:
+        return
+
+    profiles = [
+        (report.task, entry)
+        for report in reports
+        for entry in report.task.attributes.get("stata_profile", [])
+    ]
+    if not profiles:
+        return
+
+    console.print()
+    console.print(_create_lines_table(profiles))
+    console.print()
+    console.print(_create_commands_table(profiles))
+
+
+def _create_lines_table(profiles: Sequence[tuple[PTask, LineProfile]]) -> Table:
+    table = Table(title="Slowest Stata source lines", title_justify="left")
+    table.add_column("Task")
+    table.add_column("Line", justify="right")
+    table.add_column("Source")
+    table.add_column("Calls", justify="right")
+    table.add_column("Time", justify="right")
+
+    slowest = sorted(profiles, key=lambda x: x[1].seconds, reverse=True)
+    for task, entry in slowest[:N_ENTRIES]:
+        table.add_row(
+            escape(task.name),
+            "" if entry.line is None else str(entry.line),
+            escape(entry.source),
+            str(entry.calls),
+            f"{entry.seconds:.2f}s",
+        )
+    return table
+
+
+def _create_commands_table(profiles: Sequence[tuple[PTask, LineProfile]]) -> Table:
+    commands: dict[str, tuple[int, float, set[str]]] = {}
+    for task, entry in profiles:
+        calls, seconds, tasks = commands.get(entry.command, (0, 0.0, set()))
+        tasks.add(task.signature)
+        commands[entry.command] = (calls + entry.calls, seconds + entry.seconds, tasks)
+    total = sum(seconds for _, seconds, _ in commands.values())
+
+    table = Table(title="Hot Stata commands", title_justify="left")
+    table.add_column("Command")
+    for column in ("Tasks", "Calls", "Time", "Share"):
+        table.add_column(column, justify="right")
+
+    hottest = sorted(commands.items(), key=lambda x: x[1][1], reverse=True)
+    for command, (calls, seconds, tasks) in hottest[:N_ENTRIES]:
+        table.add_row(
+            escape(command),
+            str(len(tasks)),
+            str(calls),
+            f"{seconds:.2f}s",
+            f"{seconds / total:.0%}" if total else "",
+        )
+    return table
@@ -0,0 +1,170 @@
+"""Admit Stata tasks only if their requested resources fit the host's budget.
+
+Stata MP uses all licensed processors by default, so running many MP tasks in parallel
+oversubscribes the host. Tasks can request cores and memory with the Stata mark. The
+scheduler of pytask is wrapped such that ready tasks are only handed out while the sum
+of the requested resources of all running tasks stays within the budget. Tasks without
+requests are always admitted.
+
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import fields
+from typing import TYPE_CHECKING
+from typing import Any
+
+from pytask import get_marks
+from pytask import has_mark
+from pytask import hookimpl
+
+from pytask_stata.shared import StataResources
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+    from pytask import PTask
+    from pytask import Session
+
+
+@dataclass
+class ResourceScheduler:
+    """A scheduler which admits tasks within a budget of cores and memory.
+
+    The wrapped scheduler marks tasks as processing once it returns them. Tasks which
+    do not fit the budget are kept as pending and returned as soon as enough resources
+    are free. Pending tasks are admitted by the priorities of the wrapped scheduler, so
+    an important task which becomes ready later does not wait behind older tasks.
+
+    Attributes
+    ----------
+    scheduler
+        The wrapped scheduler.
+    resources
+        The requested resources by task signature.
+    cores
+        The number of cores which may be used at the same time.
+    memory
+        The amount of memory in bytes which may be used at the same time.
+
+    """
+
+    scheduler: Any
+    resources: dict[str, StataResources]
+    cores: int | None = None
+    memory: int | None = None
+    _pending: list[str] = field(default_factory=list)
+    _running: set[str] = field(default_factory=set)
+
+    def get_ready(self, n: int = 1) -> list[str]:
+        """Get up to ``n`` tasks which are ready and fit the budget."""
+        # The wrapped scheduler returns tasks by ascending priority, with the most
+        # important last.
+        new_tasks = list(
+            reversed(self.scheduler.get_ready(len(self.scheduler.dag.nodes)))
+        )
+        self._pending.extend(new_tasks)
+        # The sort is stable, so tasks with the same priority keep their order.
+        priorities = getattr(self.scheduler, "priorities", {})
+        self._pending.sort(key=lambda name: -priorities.get(name, 0))
+
+        admitted = []
+        for name in list(self._pending):
+            if len(admitted) >= n:
+                break
+            if self._fits(name):
+                self._pending.remove(name)
+                self._running.add(name)
+                admitted.append(name)
+        return list(reversed(admitted))
+
+    def is_active(self) -> bool:
+        """Indicate whether there are still tasks left."""
+        return self.scheduler.is_active()
+
+    def done(self, *nodes: str) -> None:
+        """Mark some tasks as done and release their resources."""
+        self._running.difference_update(nodes)
+        self.scheduler.done(*nodes)
+
+    def rebuild(self, dag: Any) -> ResourceScheduler:
+        """Rebuild the wrapped scheduler while preserving pending and running tasks."""
+        return ResourceScheduler(
+            scheduler=self.scheduler.rebuild(dag),
+            resources=self.resources,
+            cores=self.cores,
+            memory=self.memory,
+            _pending=self._pending.copy(),
+            _running=self._running.copy(),
+        )
+
+    def _fits(self, name: str) -> bool:
+        """Check whether a task fits into the remaining budget.
+
+        A task which requests more than the whole budget is admitted when no other
+        task with requests is running. Otherwise, it would never run.
+
+        """
+        requested = self.resources.get(name)
+        if requested is None:
+            return True
+        if not any(task in self.resources for task in self._running):
+            return True
+
+        used = [
+            self.resources[task] for task in self._running if task in self.resources
+        ]
+        return _fits_budget(
+            requested.cores, [resources.cores for resources in used], self.cores
+        ) and _fits_budget(
+            requested.memory, [resources.memory for resources in used], self.memory
+        )
+
+
+@hookimpl(wrapper=True)
+def pytask_execute_build(session: Session) -> Generator[None, Any, Any]:
+    """Wrap the scheduler if Stata tasks request resources."""
+    resources = {
+        task.signature: requested
+        for task in session.tasks
+        if (requested := get_resources(task)).cores is not None
+        or requested.memory is not None
+    }
+    if resources and session.scheduler is not None:
+        session.scheduler = ResourceScheduler(
+            scheduler=session.scheduler,
+            resources=resources,
+            cores=session.config["stata_cores"],
+            memory=session.config["stata_memory"],
+        )
+    return (yield)
+
+
+def get_resources(task: PTask) -> StataResources:
+    """Get the resources requested by the Stata mark of a task."""
+    kwargs = get_marks(task, "stata")[0].kwargs if has_mark(task, "stata") else {}
+    return StataResources(
+        **{field.name: kwargs.get(field.name) for field in fields(StataResources)}
+    )
+
+
+def _fits_budget(
+    requested: int | None, used: list[int | None], budget: int | None
+) -> bool:
+    """Check whether a request fits into a budget.
+
+    Examples
+    --------
+    >>> _fits_budget(4, [8, None, 4], 16)
+    True
+    >>> _fits_budget(4, [8, 8], 16)
+    False
+    >>> _fits_budget(None, [16], 16)
+    True
+
+    """
+    if requested is None or budget is None:
+        return True
+    return requested + sum(value for value in used if value is not None) <= budget
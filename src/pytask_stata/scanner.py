@@ -0,0 +1,377 @@
+"""Scan do-files for the files they read and write.
+
+The scanner understands a subset of Stata's syntax which is enough to find the targets
+of the most common commands for reading and writing data. It removes comments, joins
+continued lines, and expands local macros defined with ``args`` or ``local``. Targets
+which still contain macros after the expansion are ignored since they cannot be
+resolved without running Stata.
+
+The results of scanning a do-file only depend on its content. They are cached by the
+hash of the file such that collecting projects with many do-files stays fast. The
+hashes are cached by the modification time of the files.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import shlex
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Literal
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from collections.abc import Sequence
+
+TargetKind = Literal["dependency", "product", "include", "erase", "local"]
+
+CACHE_FILE = "stata-scans.json"
+CACHE_VERSION = 3
+
+_COMMAND_NAME = re.compile(r"[a-z_][a-z0-9_]*")
+
+_PREFIXES = {"capture", "cap", "noisily", "noi", "quietly", "qui"}
+
+_DEPENDENCY_COMMANDS = {"use", "merge", "append", "joinby", "cross", "insheet"}
+_IMPORT_COMMANDS = {"import", "infile", "infix"}
+_PRODUCT_COMMANDS = {"save", "saveold", "outsheet"}
+_INCLUDE_COMMANDS = {"do", "run", "include"}
+_ERASE_COMMANDS = {"erase", "rm"}
+
+_DEFAULT_SUFFIXES: dict[str, str] = {
+    "dependency": ".dta",
+    "product": ".dta",
+    "include": ".do",
+}
+
+
+@dataclass
+class ScanResult:
+    """The result of scanning a do-file.
+
+    Attributes
+    ----------
+    args
+        The names of the local macros defined with ``args`` in the order of the
+        command line arguments.
+    targets
+        The kinds and raw targets of commands which read or write files and of local
+        macro definitions. Macros in the targets are not expanded.
+    commands
+        The names of all commands which are used in the do-file.
+
+    """
+
+    args: list[str] = field(default_factory=list)
+    targets: list[tuple[TargetKind, str]] = field(default_factory=list)
+    commands: list[str] = field(default_factory=list)
+
+    def resolve(self, options: Sequence[str], cwd: Path) -> dict[str, list[Path]]:
+        """Resolve the targets with the command line options of a task.
+
+        Files which are saved and erased later by the same do-file, like scratch
+        datasets, are not products. They are listed under ``"temporary"``.
+
+        """
+        macros = dict(zip(self.args, options, strict=False))
+        resolved: dict[str, list[Path]] = {
+            "dependency": [],
+            "product": [],
+            "include": [],
+            "temporary": [],
+        }
+        for kind, raw_target in self.targets:
+            if kind == "local":
+                name, _, value = raw_target.partition(" ")
+                macros[name] = expand_local_macros(value, macros)
+                continue
+
+            target = expand_local_macros(raw_target, macros)
+            if not target or "`" in target or "$" in target:
+                continue
+
+            path = Path(target)
+            if not path.suffix and kind in _DEFAULT_SUFFIXES:
+                path = path.with_suffix(_DEFAULT_SUFFIXES[kind])
+            if not path.is_absolute():
+                path = cwd / path
+            if kind == "erase":
+                if path in resolved["product"]:
+                    resolved["product"].remove(path)
+                    resolved["temporary"].append(path)
+            elif path not in resolved[kind]:
+                resolved[kind].append(path)
+        return resolved
+
+
+class ScanCache:
+    """A cache of scan results keyed by the hash of the do-file.
+
+    The cache also keeps an index of the modification time, size and hash of every
+    scanned file. Files whose modification time and size did not change are not read
+    again.
+
+    """
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = path
+        self._results: dict[str, ScanResult] = {}
+        self._files: dict[str, tuple[int, int, str]] = {}
+        self._is_modified = False
+        if path is not None:
+            self._load(path)
+
+    def digest(self, path: Path) -> str:
+        """Return the hash of a file's content."""
+        stat = path.stat()
+        key = path.as_posix()
+        entry = self._files.get(key)
+        if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry[2]
+
+        hasher = hashlib.sha256()
+        with path.open("rb") as file:
+            # Dependencies like datasets are hashed in blocks to limit the memory.
+            while block := file.read(1024 * 1024):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        self._files[key] = (stat.st_mtime_ns, stat.st_size, digest)
+        self._is_modified = True
+        return digest
+
+    def scan(self, path: Path) -> ScanResult:
+        """Scan a do-file or return the cached result."""
+        key = self.digest(path)
+        if key not in self._results:
+            source = path.read_text(errors="replace")
+            self._results[key] = scan_do_file(source)
+            self._is_modified = True
+        return self._results[key]
+
+    def save(self) -> None:
+        """Save the cache to disk if results were added."""
+        if self.path is None or not self._is_modified:
+            return
+        data = {
+            "version": CACHE_VERSION,
+            "files": self._files,
+            "results": {key: asdict(result) for key, result in self._results.items()},
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(data))
+        self._is_modified = False
+
+    def _load(self, path: Path) -> None:
+        try:
+            data: dict[str, Any] = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return
+        self._files = {key: tuple(value) for key, value in data["files"].items()}
+        for key, value in data["results"].items():
+            self._results[key] = ScanResult(
+                args=value["args"],
+                targets=[(kind, target) for kind, target in value["targets"]],
+                commands=value["commands"],
+            )
+
+
+def find_includes(
+    cache: ScanCache,
+    script: Path,
+    options: Sequence[str],
+    cwd: Path,
+    adopath: Sequence[Path] = (),
+) -> list[Path]:
+    """Find all do-files and ado-files which a script runs directly or indirectly.
+
+    Scripts called with ``do``, ``run`` or ``include`` are resolved relative to the
+    working directory like Stata does. Commands which are defined by an ado-file in one
+    of the directories of the ``adopath`` add the ado-file. Included files are scanned
+    as well until the transitive closure is found.
+
+    """
+    includes: list[Path] = []
+    seen = {script}
+    queue = [(script, options)]
+    while queue:
+        path, arguments = queue.pop(0)
+        result = cache.scan(path)
+        candidates = result.resolve(arguments, cwd)["include"]
+        candidates += [
+            ado for command in result.commands if (ado := find_ado(command, adopath))
+        ]
+        for candidate in candidates:
+            if candidate in seen or not candidate.is_file():
+                continue
+            seen.add(candidate)
+            includes.append(candidate)
+            queue.append((candidate, ()))
+    return includes
+
+
+def find_ado(command: str, adopath: Sequence[Path]) -> Path | None:
+    """Find the ado-file which defines a command.
+
+    Like Stata, the file is searched directly in each directory and in the
+    subdirectory named after the first letter of the command.
+
+    """
+    if not _COMMAND_NAME.fullmatch(command):
+        return None
+    for directory in adopath:
+        for candidate in (
+            directory / f"{command}.ado",
+            directory / command[0] / f"{command}.ado",
+        ):
+            if candidate.is_file():
+                return candidate
+    return None
+
+
+def scan_do_file(source: str) -> ScanResult:
+    r"""Scan the source of a do-file for the files it reads and writes.
+
+    Examples
+    --------
+    >>> result = scan_do_file("args input\nuse `input', clear\nsave out, replace")
+    >>> result.args
+    ['input']
+    >>> result.targets
+    [('dependency', "`input'"), ('product', 'out')]
+
+    """
+    result = ScanResult()
+    for line in iter_commands(source):
+        command, rest = _remove_prefixes(line)
+        name = command.split(",", maxsplit=1)[0]
+        if name and name not in result.commands:
+            result.commands.append(name)
+        if command == "args" and not result.args:
+            result.args = rest.split()
+        elif command == "local":
+            result.targets.append(("local", _parse_local(rest)))
+        else:
+            result.targets.extend(_parse_targets(command, rest))
+    return result
+
+
+def iter_commands(source: str) -> Iterable[str]:
+    r"""Iterate over the commands of a do-file without comments.
+
+    Examples
+    --------
+    >>> list(iter_commands("* note\nuse a /* note */, clear // note\nsave ///\n b"))
+    ['use a , clear', 'save b']
+
+    """
+    source = re.sub(r"/\*.*?\*/", " ", source, flags=re.DOTALL)
+    source = re.sub(r"///[^\n]*\n", " ", source)
+
+    for raw_line in source.splitlines():
+        line = re.sub(r"(^|\s)//.*$", "", raw_line).strip()
+        if line and not line.startswith("*"):
+            yield re.sub(r"\s+", " ", line)
+
+
+def expand_local_macros(text: str, macros: dict[str, str]) -> str:
+    """Expand local macros which are defined and keep all others.
+
+    Examples
+    --------
+    >>> expand_local_macros("`dir'/`file'.dta", {"dir": "data"})
+    "data/`file'.dta"
+
+    """
+    return re.sub(
+        r"`(?!\")([^'`]+)'",
+        lambda match: macros.get(match.group(1), match.group(0)),
+        text,
+    )
+
+
+def _remove_prefixes(line: str) -> tuple[str, str]:
+    command, _, rest = line.partition(" ")
+    while command.rstrip(":").lower() in _PREFIXES:
+        command, _, rest = rest.strip().partition(" ")
+    return command.lower(), rest.strip()
+
+
+def _parse_local(rest: str) -> str:
+    name, _, value = rest.partition(" ")
+    value = value.strip()
+    if value.startswith("="):
+        value = value.removeprefix("=").strip()
+    return f"{name} {_strip_quotes(value)}"
+
+
+def _parse_targets(command: str, rest: str) -> list[tuple[TargetKind, str]]:
+    arguments = rest.split(",", maxsplit=1)[0]
+    if command in _DEPENDENCY_COMMANDS:
+        kind: TargetKind = "dependency"
+        files = _after_using(arguments) if " using " in f" {arguments} " else None
+        if files is None:
+            files = _split(arguments)[:1] if command == "use" else []
+    elif command in _IMPORT_COMMANDS:
+        kind = "dependency"
+        files = _after_using(arguments)
+        if files is None:
+            files = _split(arguments)[1:2] if command == "import" else []
+    elif command in _PRODUCT_COMMANDS:
+        kind = "product"
+        files = _after_using(arguments)
+        if files is None:
+            files = _split(arguments)[:1]
+    elif command == "export":
+        kind = "product"
+        files = _after_using(arguments) or []
+    elif command in _INCLUDE_COMMANDS:
+        kind = "include"
+        files = _split(arguments)[:1]
+    elif command in _ERASE_COMMANDS:
+        kind = "erase"
+        files = _split(arguments)[:1]
+    else:
+        return []
+    return [(kind, file) for file in files]
+
+
+def _after_using(arguments: str) -> list[str] | None:
+    """Return the files after the ``using`` keyword."""
+    _, keyword, files = f" {arguments} ".partition(" using ")
+    return _split(files) if keyword else None
+
+
+def _split(text: str) -> list[str]:
+    r"""Split arguments while respecting quotes and keeping macros.
+
+    Backslashes are not escape characters since they separate directories in paths
+    on Windows.
+
+    Examples
+    --------
+    >>> _split(r'data\x.dta "my file.dta"')
+    ['data\\x.dta', 'my file.dta']
+
+    """
+    text = re.sub(r"`\"(.*?)\"'", r'"\1"', text)
+    lexer = shlex.shlex(text, posix=True)
+    lexer.whitespace_split = True
+    lexer.escape = ""
+    try:
+        return list(lexer)
+    except ValueError:
+        return text.split()
+
+
+def _strip_quotes(text: str) -> str:
+    text = re.sub(r"^`\"(.*)\"'$", r"\1", text)
+    return text.strip('"')
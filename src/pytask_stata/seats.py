@@ -0,0 +1,253 @@
+"""Limit the number of Stata processes which run at the same time.
+
+Network licenses only allow a limited number of concurrent Stata sessions. A seat is a
+lock file in a directory which is shared by all pytask processes using the same
+license, for example, by all builds on a host or by all nodes of a cluster with a
+shared file system. A process occupies a seat as long as it holds an exclusive lock on
+the file. The operating system releases the lock when the process dies, so seats
+cannot leak.
+
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import random
+import re
+import sys
+import time
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import IO
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import TypeVar
+
+from pytask_stata.logs import read_log_tail
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+    from collections.abc import Awaitable
+    from collections.abc import Callable
+    from collections.abc import Iterator
+    from pathlib import Path
+
+
+T = TypeVar("T")
+
+SEATS_DIRECTORY = ".pytask/stata-seats"
+"""The default directory of the lock files relative to the project's root."""
+
+POLL_INTERVAL = 0.5
+"""The average number of seconds between two attempts to acquire a seat."""
+
+RETRY_DELAY = 5.0
+"""The number of seconds before the first retry of a task which found no license."""
+
+LICENSE_BUSY = re.compile(
+    r"licen[cs]e.*(not available|in use|exceeded|reached|busy)"
+    r"|maximum number of (concurrent )?users",
+    flags=re.IGNORECASE,
+)
+"""The pattern of messages which Stata prints if no license seat is available."""
+
+
+@dataclass(frozen=True)
+class SeatLimiter:
+    """Seats for Stata processes shared via lock files.
+
+    Attributes
+    ----------
+    directory
+        The directory of the lock files.
+    n_seats
+        The number of Stata processes which may run at the same time.
+
+    """
+
+    directory: Path
+    n_seats: int
+
+    @contextmanager
+    def seat(self) -> Iterator[int]:
+        """Wait for a free seat and hold it while the context is active.
+
+        Seats are tried in random order with a randomized interval between attempts
+        such that waiting processes get free seats in no particular order.
+
+        """
+        while (acquired := self._try_acquire()) is None:
+            time.sleep(POLL_INTERVAL * random.uniform(0.5, 1.5))  # noqa: S311
+        i, file = acquired
+        try:
+            yield i
+        finally:
+            _release(file)
+
+    @asynccontextmanager
+    async def async_seat(self) -> AsyncIterator[int]:
+        """Wait for a free seat without blocking the event loop."""
+        # Seats are released by other processes, so there is nothing to wait for.
+        while (acquired := self._try_acquire()) is None:  # noqa: ASYNC110
+            await asyncio.sleep(POLL_INTERVAL * random.uniform(0.5, 1.5))  # noqa: S311
+        i, file = acquired
+        try:
+            yield i
+        finally:
+            _release(file)
+
+    def _try_acquire(self) -> tuple[int, IO[Any]] | None:
+        """Try to lock any of the seats once."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for i in random.sample(range(self.n_seats), self.n_seats):
+            file = self.directory.joinpath(f"seat-{i}.lock").open("a+b")
+            if _try_lock(file):
+                return i, file
+            file.close()
+        return None
+
+
+def create_limiter(config: dict[str, Any]) -> SeatLimiter | None:
+    """Create the limiter of concurrent Stata processes if there is a limit."""
+    if config["stata_max_concurrent"] is None:
+        return None
+    return SeatLimiter(
+        directory=config["stata_license_dir"], n_seats=config["stata_max_concurrent"]
+    )
+
+
+@contextmanager
+def acquire_seat(limiter: SeatLimiter | None) -> Iterator[None]:
+    """Hold a seat of the limiter or do nothing if there is no limit."""
+    if limiter is None:
+        yield
+    else:
+        with limiter.seat():
+            yield
+
+
+def run_with_seat(
+    run: Callable[[], T], limiter: SeatLimiter | None, log: Path, retries: int = 0
+) -> T:
+    """Run Stata while holding a seat and retry if the license was busy.
+
+    The log is checked for messages about unavailable licenses. The delay between
+    retries doubles with every attempt.
+
+    """
+    for attempt in itertools.count():
+        if retries:
+            log.unlink(missing_ok=True)
+
+        with acquire_seat(limiter):
+            try:
+                result = run()
+            except Exception:
+                if not _can_retry(log, attempt, retries):
+                    raise
+            else:
+                if _is_finished(log, attempt, retries):
+                    return result
+
+        time.sleep(_get_retry_delay(attempt))
+    raise AssertionError  # pragma: no cover
+
+
+async def run_with_seat_async(
+    run: Callable[[], Awaitable[T]],
+    limiter: SeatLimiter | None,
+    log: Path,
+    retries: int = 0,
+) -> T:
+    """Run Stata like :func:`run_with_seat` without blocking the event loop."""
+    for attempt in itertools.count():
+        if retries:
+            log.unlink(missing_ok=True)  # noqa: ASYNC240
+
+        async with _acquire_seat_async(limiter):
+            try:
+                result = await run()
+            except Exception:
+                if not _can_retry(log, attempt, retries):
+                    raise
+            else:
+                if _is_finished(log, attempt, retries):
+                    return result
+
+        await asyncio.sleep(_get_retry_delay(attempt))
+    raise AssertionError  # pragma: no cover
+
+
+def _can_retry(log: Path, attempt: int, retries: int) -> bool:
+    """Check whether a failed attempt is retried because the license was busy."""
+    return attempt < retries and is_license_busy(log)
+
+
+def _is_finished(log: Path, attempt: int, retries: int) -> bool:
+    """Check whether a successful attempt got a license or no attempts are left."""
+    if not is_license_busy(log):
+        return True
+    if attempt >= retries:
+        msg = (
+            f"No Stata license was available after {attempt + 1} attempts. See the "
+            f"log at {log.as_posix()!r}."
+        )
+        raise RuntimeError(msg)
+    return False
+
+
+def _get_retry_delay(attempt: int) -> float:
+    """Get the delay before the next attempt which doubles with every attempt."""
+    return RETRY_DELAY * 2**attempt * random.uniform(1, 1.5)  # noqa: S311
+
+
+@asynccontextmanager
+async def _acquire_seat_async(limiter: SeatLimiter | None) -> AsyncIterator[None]:
+    if limiter is None:
+        yield
+    else:
+        async with limiter.async_seat():
+            yield
+
+
+def is_license_busy(log: Path, n_lines: int = 20) -> bool:
+    """Check whether the log reports that no license was available."""
+    if not log.exists():
+        return False
+    return any(LICENSE_BUSY.search(line) for line in read_log_tail(log, n_lines))
+
+
+def _try_lock(file: IO[Any]) -> bool:
+    """Try to lock a file exclusively without blocking."""
+    try:
+        if sys.platform == "win32":
+            import msvcrt  # noqa: PLC0415
+
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl  # noqa: PLC0415
+
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _release(file: IO[Any]) -> None:
+    _unlock(file)
+    file.close()
+
+
+def _unlock(file: IO[Any]) -> None:
+    if sys.platform == "win32":
+        import msvcrt  # noqa: PLC0415
+
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl  # noqa: PLC0415
+
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
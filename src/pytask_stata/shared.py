@@ -2,9 +2,11 @@
 
 from __future__ import annotations
 
+import re
 import sys
 from collections.abc import Iterable
 from collections.abc import Sequence
+from dataclasses import dataclass
 from typing import TYPE_CHECKING
 from typing import Any
 
@@ -44,21 +46,141 @@ else:
     STATA_COMMANDS = []
 
 
-def stata(
+STATA_BACKENDS = ["subprocess", "pool", "batch", "async", "cluster"]
+
+STATA_EDITIONS = ["MP", "SE", "BE"]
+
+_EDITION_ALIASES = {"IC": "BE"}
+
+_MEMORY_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+@dataclass(frozen=True)
+class StataResources:
+    """The resources which a task requests from Stata and the limits of its process.
+
+    Attributes
+    ----------
+    cores
+        The number of processors Stata MP may use.
+    memory
+        The maximum memory in bytes Stata may allocate for data.
+    edition
+        The edition of Stata like ``"MP"``, ``"SE"``, or ``"BE"``.
+    timeout
+        The number of seconds after which the Stata process is stopped.
+    idle_timeout
+        The number of seconds without new output in the log after which the Stata
+        process is stopped.
+    max_rss
+        The resident memory in bytes above which the Stata process is stopped.
+
+    """
+
+    cores: int | None = None
+    memory: int | None = None
+    edition: str | None = None
+    timeout: float | None = None
+    idle_timeout: float | None = None
+    max_rss: int | None = None
+
+    def has_limits(self) -> bool:
+        """Indicate whether the Stata process needs to be supervised."""
+        return (
+            self.timeout is not None
+            or self.idle_timeout is not None
+            or self.max_rss is not None
+        )
+
+    def setup_commands(self) -> list[str]:
+        """Render the commands which apply the resources to a Stata session.
+
+        Examples
+        --------
+        >>> StataResources(cores=4, memory=8 * 1024**3).setup_commands()
+        ['set processors 4', 'set max_memory 8g']
+
+        """
+        commands = []
+        if self.cores is not None:
+            commands.append(f"set processors {self.cores}")
+        if self.memory is not None:
+            commands.append(f"set max_memory {format_memory(self.memory)}")
+        return commands
+
+    def reset_commands(self) -> list[str]:
+        """Render the commands which undo the resources in a persistent session."""
+        commands = []
+        if self.cores is not None:
+            commands.append("set processors `c(processors_lic)'")
+        if self.memory is not None:
+            commands.append("set max_memory .")
+        return commands
+
+
+def stata(  # noqa: PLR0913
     *,
     script: str | Path,
     options: str | Iterable[str] | None = None,
-) -> tuple[str | Path | None, str | Iterable[str] | None]:
-    """Specify command line options for Stata.
+    cores: int | None = None,
+    memory: str | int | None = None,
+    edition: str | None = None,
+    timeout: float | None = None,
+    idle_timeout: float | None = None,
+    max_rss: str | int | None = None,
+) -> tuple[str | Path | None, str | Iterable[str] | None, StataResources]:
+    """Specify command line options and resources for Stata.
 
     Parameters
     ----------
     options : str | Iterable[str] | None
         One or multiple command line options passed to Stata.
+    cores : int | None
+        The number of processors Stata MP may use.
+    memory : str | int | None
+        The maximum memory for data like ``"8G"``.
+    edition : str | None
+        The edition of Stata which runs the script, ``"mp"``, ``"se"``, or ``"be"``.
+    timeout : float | None
+        The number of seconds after which the Stata process is stopped.
+    idle_timeout : float | None
+        The number of seconds without new output in the log after which the Stata
+        process is stopped.
+    max_rss : str | int | None
+        The resident memory like ``"16G"`` above which the Stata process is stopped.
 
     """
     options = [] if options is None else list(map(str, _to_list(options)))
-    return script, options
+
+    if cores is not None and (not isinstance(cores, int) or cores < 1):
+        msg = f"'cores' must be a positive integer, but it is {cores!r}."
+        raise ValueError(msg)
+
+    if edition is not None:
+        edition = _EDITION_ALIASES.get(edition.upper(), edition.upper())
+        if edition not in STATA_EDITIONS:
+            msg = f"'edition' must be one of {STATA_EDITIONS}, but it is {edition!r}."
+            raise ValueError(msg)
+        if cores is not None and edition != "MP":
+            msg = f"'cores' can only be set for Stata MP, but the edition is {edition}."
+            raise ValueError(msg)
+
+    for name, value in (("timeout", timeout), ("idle_timeout", idle_timeout)):
+        if value is not None and (
+            isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0
+        ):
+            msg = f"{name!r} must be a positive number of seconds, but it is {value!r}."
+            raise ValueError(msg)
+
+    resources = StataResources(
+        cores=cores,
+        memory=None if memory is None else parse_memory(memory),
+        edition=edition,
+        timeout=timeout,
+        idle_timeout=idle_timeout,
+        max_rss=None if max_rss is None else parse_memory(max_rss),
+    )
+    return script, options, resources
 
 
 def convert_task_id_to_name_of_log_file(task: PTask) -> str:
@@ -91,6 +213,73 @@ def convert_task_id_to_name_of_log_file(task: PTask) -> str:
     )
 
 
+def get_log_directory(cwd: Path, root: Path, log_dir: Path | None) -> Path:
+    """Get the directory of the logs of tasks running in a working directory.
+
+    Logs are written to the working directory of the task. If a directory for logs is
+    configured, the directories of the project are mirrored inside it such that task
+    modules with the same name in different directories do not share their logs.
+
+    Examples
+    --------
+    >>> from pathlib import Path
+    >>> get_log_directory(Path("/p/src"), Path("/p"), None).as_posix()
+    '/p/src'
+    >>> get_log_directory(Path("/p/src"), Path("/p"), Path("/tmp/logs")).as_posix()
+    '/tmp/logs/src'
+
+    """
+    if log_dir is None:
+        return cwd
+    try:
+        return log_dir / cwd.relative_to(root)
+    except ValueError:
+        return log_dir
+
+
+def parse_memory(value: str | int) -> int:
+    """Parse an amount of memory like ``"8G"`` to bytes.
+
+    Examples
+    --------
+    >>> parse_memory("8G")
+    8589934592
+    >>> parse_memory("512m")
+    536870912
+    >>> parse_memory(1024)
+    1024
+
+    """
+    if isinstance(value, int):
+        return value
+
+    match = re.fullmatch(r"\s*([0-9]+(?:\.[0-9]+)?)\s*([bkmgt]?)b?\s*", value.lower())
+    if match is None:
+        msg = f"Cannot parse the amount of memory {value!r}. Use values like '8G'."
+        raise ValueError(msg)
+    number, unit = match.groups()
+    return int(float(number) * _MEMORY_UNITS[unit])
+
+
+def format_memory(value: int) -> str:
+    """Format an amount of memory in bytes for Stata.
+
+    Examples
+    --------
+    >>> format_memory(8 * 1024**3)
+    '8g'
+    >>> format_memory(1536 * 1024**2)
+    '1536m'
+    >>> format_memory(1000)
+    '1000b'
+
+    """
+    for unit in ("g", "m", "k"):
+        if value % _MEMORY_UNITS[unit] == 0:
+            return f"{value // _MEMORY_UNITS[unit]}{unit}"
+    return f"{value}b"
+
+
 def _to_list(scalar_or_iter: Any) -> list[Any]:
     """Convert scalars and iterables to list.
 
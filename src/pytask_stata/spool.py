@@ -0,0 +1,233 @@
+"""A local stand-in for a cluster scheduler which runs jobs from a spool directory.
+
+The ``cluster`` backend submits job scripts with a command like ``sbatch``. Without a
+cluster, jobs are submitted to a spool directory instead, which behaves like a tiny
+batch scheduler on the local machine.
+
+.. code-block:: console
+
+    $ python -m pytask_stata.spool submit <spool> <job-script>
+    $ python -m pytask_stata.spool cancel <spool> <job-id>
+    $ python -m pytask_stata.spool status <spool> <job-id>
+    $ python -m pytask_stata.spool work <spool> [--slots N] [--idle SECONDS]
+
+``submit`` queues the job script, prints the id of the job and starts a worker if none
+is running. The worker runs queued jobs with ``sh`` in at most ``--slots`` processes at
+the same time and exits after it was idle for ``--idle`` seconds. ``cancel`` removes a
+queued job or terminates a running one. ``status`` prints whether a job is ``queued`` or
+``running`` and exits with 1 if the job finished or is unknown.
+
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import os
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from pytask_stata.process import terminate_process_group
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+POLL_INTERVAL = 0.1
+IDLE_TIMEOUT = 5.0
+
+
+def submit(spool: Path, job: Path) -> str:
+    """Queue a job script, start a worker if needed and return the id of the job."""
+    _create_directories(spool)
+
+    job_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    tmp = spool / "queue" / f".{job_id}.tmp"
+    tmp.write_text(job.resolve().as_posix())
+    tmp.replace(spool / "queue" / f"{job_id}.job")
+    _ensure_worker(spool)
+    return job_id
+
+
+def cancel(spool: Path, job_id: str) -> None:
+    """Remove a queued job or ask the worker to terminate a running job."""
+    try:
+        spool.joinpath("queue", f"{job_id}.job").replace(
+            spool / "done" / f"{job_id}.job"
+        )
+    except OSError:
+        spool.joinpath("cancel", job_id).touch()
+
+
+def get_status(spool: Path, job_id: str) -> str | None:
+    """Return whether a job is queued or running, or ``None`` if it does not exist.
+
+    If the worker died while jobs were queued, a new worker is started.
+
+    """
+    if spool.joinpath("running", f"{job_id}.job").exists():
+        return "running"
+    if spool.joinpath("queue", f"{job_id}.job").exists():
+        _ensure_worker(spool)
+        return "queued"
+    return None
+
+
+def work(spool: Path, slots: int, idle: float = IDLE_TIMEOUT) -> None:
+    """Run queued jobs until no job was queued or running for ``idle`` seconds."""
+    _create_directories(spool)
+    running: dict[str, subprocess.Popen[bytes]] = {}
+    last_activity = time.monotonic()
+    while True:
+        for job_id, process in list(running.items()):
+            if spool.joinpath("cancel", job_id).exists():
+                terminate_process_group(process)
+            if process.poll() is not None:
+                del running[job_id]
+                spool.joinpath("cancel", job_id).unlink(missing_ok=True)
+                spool.joinpath("running", f"{job_id}.job").replace(
+                    spool / "done" / f"{job_id}.job"
+                )
+
+        for job_id in _list_queue(spool)[: max(slots - len(running), 0)]:
+            process = _start_job(spool, job_id)
+            if process is not None:
+                running[job_id] = process
+
+        if running or _list_queue(spool):
+            last_activity = time.monotonic()
+        elif time.monotonic() - last_activity > idle:
+            _release_worker(spool)
+            # A job might have been queued while the lock was released.
+            if not _list_queue(spool) or not _acquire_worker(spool, os.getpid()):
+                return
+            last_activity = time.monotonic()
+        time.sleep(POLL_INTERVAL)
+
+
+def _create_directories(spool: Path) -> None:
+    for directory in ("queue", "running", "done", "cancel"):
+        spool.joinpath(directory).mkdir(parents=True, exist_ok=True)
+
+
+def _list_queue(spool: Path) -> list[str]:
+    """List the ids of queued jobs in the order of their submission."""
+    return sorted(path.stem for path in spool.joinpath("queue").glob("*.job"))
+
+
+def _start_job(spool: Path, job_id: str) -> subprocess.Popen[bytes] | None:
+    """Claim a queued job and start it unless another worker claimed it before."""
+    claimed = spool / "running" / f"{job_id}.job"
+    try:
+        spool.joinpath("queue", f"{job_id}.job").replace(claimed)
+    except OSError:
+        return None
+
+    job = Path(claimed.read_text())
+    with spool.joinpath("done", f"{job_id}.out").open("wb") as output:
+        return subprocess.Popen(  # noqa: S603
+            ["sh", job.as_posix()],  # noqa: S607
+            cwd=job.parent,
+            stdout=output,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+
+def _ensure_worker(spool: Path) -> None:
+    """Start a worker unless one is running."""
+    if not _acquire_worker(spool, None):
+        return
+    with spool.joinpath("worker.log").open("ab") as output:
+        process = subprocess.Popen(  # noqa: S603
+            [sys.executable, "-m", "pytask_stata.spool", "work", spool.as_posix()],
+            stdout=output,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    spool.joinpath("worker.pid").write_text(str(process.pid))
+
+
+def _acquire_worker(spool: Path, pid: int | None) -> bool:
+    """Acquire the lock of the worker and remove the lock of a worker which died."""
+    lock = spool / "worker.pid"
+    if _create_lock(lock, pid):
+        return True
+    if _is_alive(lock):
+        return False
+    lock.unlink(missing_ok=True)
+    return _create_lock(lock, pid)
+
+
+def _create_lock(lock: Path, pid: int | None) -> bool:
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.write(fd, b"" if pid is None else str(pid).encode())
+    os.close(fd)
+    return True
+
+
+def _release_worker(spool: Path) -> None:
+    lock = spool / "worker.pid"
+    with contextlib.suppress(OSError):
+        if lock.read_text() == str(os.getpid()):
+            lock.unlink()
+
+
+def _is_alive(lock: Path) -> bool:
+    """Check whether the worker of a lock is alive or is just being started."""
+    try:
+        content = lock.read_text()
+    except OSError:
+        return False
+    if not content:
+        # The lock was just created and the worker is being started.
+        return time.time() - lock.stat().st_mtime < IDLE_TIMEOUT
+    try:
+        os.kill(int(content), 0)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def main(args: Sequence[str] | None = None) -> int:
+    """Run the command line interface of the spool."""
+    parser = argparse.ArgumentParser(prog="python -m pytask_stata.spool")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit_parser = commands.add_parser("submit", help="Queue a job script.")
+    submit_parser.add_argument("spool", type=Path)
+    submit_parser.add_argument("job", type=Path)
+    cancel_parser = commands.add_parser("cancel", help="Cancel a job.")
+    cancel_parser.add_argument("spool", type=Path)
+    cancel_parser.add_argument("job_id")
+    status_parser = commands.add_parser("status", help="Show the status of a job.")
+    status_parser.add_argument("spool", type=Path)
+    status_parser.add_argument("job_id")
+    work_parser = commands.add_parser("work", help="Run queued jobs.")
+    work_parser.add_argument("spool", type=Path)
+    work_parser.add_argument("--slots", type=int, default=os.cpu_count() or 1)
+    work_parser.add_argument("--idle", type=float, default=IDLE_TIMEOUT)
+    parsed = parser.parse_args(args)
+
+    if parsed.command == "submit":
+        print(submit(parsed.spool, parsed.job))  # noqa: T201
+    elif parsed.command == "cancel":
+        cancel(parsed.spool, parsed.job_id)
+    elif parsed.command == "status":
+        status = get_status(parsed.spool, parsed.job_id)
+        if status is None:
+            return 1
+        print(status)  # noqa: T201
+    else:
+        work(parsed.spool, parsed.slots, parsed.idle)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,168 @@
+"""Record the resources which Stata used for every task.
+
+The task function measures the Stata process and writes the usage to a file in the
+``.pytask`` folder because it might run in another process with pytask-parallel. The
+main process reads the file when the report of the task is processed, attaches the
+usage to the task and its report, and summarizes the slowest tasks at the end.
+
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+from dataclasses import asdict
+from dataclasses import fields
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Any
+
+from pytask import ExecutionReport
+from pytask import PTask
+from pytask import Session
+from pytask import TaskOutcome
+from pytask import console
+from pytask import has_mark
+from pytask import hookimpl
+from rich.table import Table
+
+from pytask_stata.process import ProcessUsage
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+USAGE_DIRECTORY = ".pytask/stata-usage"
+
+
+def get_usage_path(root: Path, task: PTask) -> Path:
+    """Get the path of the file with the usage of a task."""
+    return root / USAGE_DIRECTORY / f"{task.signature}.json"
+
+
+def write_usage(path: Path, usage: ProcessUsage) -> None:
+    """Write the usage of a Stata process to a file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(asdict(usage)))
+
+
+def read_usage(path: Path) -> ProcessUsage | None:
+    """Read and remove the usage of a Stata process if it exists."""
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    path.unlink(missing_ok=True)
+    return ProcessUsage(**data)
+
+
+@hookimpl(tryfirst=True)
+def pytask_execute_task_process_report(
+    session: Session, report: ExecutionReport
+) -> None:
+    """Attach the usage of the Stata process to the task and its report."""
+    task = report.task
+    if not has_mark(task, "stata") or report.outcome not in (
+        TaskOutcome.SUCCESS,
+        TaskOutcome.FAIL,
+    ):
+        return
+
+    usage = read_usage(get_usage_path(session.config["root"], task))
+    if usage is not None:
+        task.attributes["stata_usage"] = usage
+        report.sections.append(("call", "stata usage", format_usage(usage)))
+
+
+@hookimpl
+def pytask_execute_log_end(session: Session, reports: list[ExecutionReport]) -> None:
+    """Print the slowest Stata tasks and write the usage of all tasks to a file."""
+    usages = [
+        (report.task, report.task.attributes["stata_usage"])
+        for report in reports
+        if "stata_usage" in report.task.attributes
+    ]
+    if not usages:
+        return
+
+    n_slowest = session.config["stata_slowest"]
+    if n_slowest:
+        slowest = sorted(usages, key=lambda x: x[1].wall_time, reverse=True)
+        console.print()
+        console.print(_create_table(slowest[:n_slowest]))
+
+    if session.config["stata_usage_file"] is not None:
+        write_usage_file(Path(session.config["stata_usage_file"]), usages)
+
+
+def write_usage_file(path: Path, usages: Sequence[tuple[PTask, ProcessUsage]]) -> None:
+    """Write the usage of all tasks to a CSV file or, otherwise, a JSON file."""
+    rows = [{"task": task.name, **asdict(usage)} for task, usage in usages]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".csv":
+        with path.open("w", newline="") as file:
+            names = ["task", *(field.name for field in fields(ProcessUsage))]
+            writer = csv.DictWriter(file, fieldnames=names)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        path.write_text(json.dumps(rows, indent=2))
+
+
+def format_usage(usage: ProcessUsage) -> str:
+    """Format the usage of a Stata process.
+
+    Examples
+    --------
+    >>> print(format_usage(ProcessUsage(1.5, 1.0, 0.25, 200 * 1024**2)))
+    wall 1.50s, user 1.00s, system 0.25s, peak memory 200.0 MiB
+
+    """
+    parts = [f"wall {usage.wall_time:.2f}s"]
+    if usage.user_time is not None:
+        parts.append(f"user {usage.user_time:.2f}s")
+    if usage.system_time is not None:
+        parts.append(f"system {usage.system_time:.2f}s")
+    if usage.max_rss is not None:
+        parts.append(f"peak memory {_format_bytes(usage.max_rss)}")
+    return ", ".join(parts)
+
+
+def _create_table(usages: Sequence[tuple[PTask, ProcessUsage]]) -> Table:
+    table = Table(title="Slowest Stata tasks", title_justify="left")
+    table.add_column("Task")
+    for column in ("Wall", "User", "System", "Peak memory"):
+        table.add_column(column, justify="right")
+
+    for task, usage in usages:
+        table.add_row(
+            task.name,
+            f"{usage.wall_time:.2f}s",
+            _format_optional(usage.user_time, "{:.2f}s"),
+            _format_optional(usage.system_time, "{:.2f}s"),
+            "" if usage.max_rss is None else _format_bytes(usage.max_rss),
+        )
+    return table
+
+
+def _format_optional(value: Any, template: str) -> str:
+    return "" if value is None else template.format(value)
+
+
+def _format_bytes(value: int) -> str:
+    """Format bytes with binary units.
+
+    Examples
+    --------
+    >>> _format_bytes(512)
+    '512 B'
+    >>> _format_bytes(3 * 1024**3)
+    '3.0 GiB'
+
+    """
+    size = float(value)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":  # noqa: PLR2004
+            return f"{value} B" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    raise AssertionError  # pragma: no cover
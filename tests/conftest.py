@@ -12,7 +12,7 @@ import pytest
 from click.testing import CliRunner
 from pytask import storage
 
-from pytask_stata.config import STATA_COMMANDS
+from pytask_stata.shared import STATA_COMMANDS
 
 if TYPE_CHECKING:
     from collections.abc import Callable
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+import textwrap
+import time
+from pathlib import Path
+
+import pytest
+from pytask import ExitCode
+from pytask import cli
+
+from pytask_stata.archive import LogArchive
+from pytask_stata.archive import _find_archive_directory
+from tests.conftest import needs_stata
+
+
+def _stream(archive, entry):
+    chunks = []
+    archive.stream(entry, chunks.append)
+    return b"".join(chunks)
+
+
+def _add(archive, tmp_path, task, content):
+    log = tmp_path.joinpath("script.log")
+    log.write_bytes(content)
+    return archive.add(task, log, "success")
+
+
+def test_add_and_stream_logs(tmp_path):
+    archive = LogArchive(tmp_path / "archive", run="run-1")
+    large = b"".join(f"line {i}\n".encode() for i in range(100_000))
+    _add(archive, tmp_path, "/project/task_a.py::task_a", b"first log\n")
+    _add(archive, tmp_path, "/project/task_a.py::task_b", large)
+
+    entry = archive.find("task_b")
+    assert entry.size == len(large)
+    assert entry.length < entry.size
+    assert _stream(archive, entry) == large
+    assert _stream(archive, archive.find("task_a.py::task_a")) == b"first log\n"
+    assert len(list(archive.directory.iterdir())) == 2  # noqa: PLR2004
+
+
+def test_find_latest_log_of_task(tmp_path):
+    directory = tmp_path / "archive"
+    _add(LogArchive(directory, run="run-1"), tmp_path, "/p/task_a.py::task_a", b"old")
+    _add(LogArchive(directory, run="run-2"), tmp_path, "/p/task_a.py::task_a", b"new")
+
+    archive = LogArchive(directory)
+    assert archive.runs() == ["run-1", "run-2"]
+    assert _stream(archive, archive.find("task_a")) == b"new"
+    assert _stream(archive, archive.find("task_a", run="run-1")) == b"old"
+
+
+def test_find_raises_error_for_unknown_and_ambiguous_tasks(tmp_path):
+    archive = LogArchive(tmp_path / "archive", run="run-1")
+    _add(archive, tmp_path, "/p/task_a.py::task_x", b"a")
+    _add(archive, tmp_path, "/p/task_b.py::task_x", b"b")
+
+    with pytest.raises(LookupError, match="no archived log"):
+        archive.find("task_y")
+    with pytest.raises(LookupError, match="matches multiple tasks"):
+        archive.find("task_x")
+
+
+def test_evict_runs_by_age_and_size(tmp_path):
+    directory = tmp_path / "archive"
+    for run in ("run-1", "run-2", "run-3"):
+        _add(LogArchive(directory, run=run), tmp_path, "task_a", os.urandom(1_000))
+
+    old = time.time() - 3 * 86_400
+    os.utime(directory / "run-1.index", (old, old))
+
+    LogArchive(directory, run="run-3").evict(max_age=2)
+    assert LogArchive(directory).runs() == ["run-2", "run-3"]
+
+    LogArchive(directory, run="run-3").evict(max_size=1)
+    assert LogArchive(directory).runs() == ["run-3"]
+
+
+def test_find_archive_directory(tmp_path):
+    tmp_path.joinpath(".pytask", "stata-logs").mkdir(parents=True)
+    tmp_path.joinpath("src").mkdir()
+
+    assert _find_archive_directory(tmp_path / "src") == (
+        tmp_path / ".pytask" / "stata-logs"
+    )
+
+
+@needs_stata
+def test_archive_logs_and_show_them(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("auto.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text('display "archived"\nsave auto\n')
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-log-archive"])
+
+    assert result.exit_code == ExitCode.OK
+    assert not tmp_path.joinpath("task_example_py_task_run_do_file.log").exists()
+
+    archive_dir = Path(tmp_path, ".pytask", "stata-logs").as_posix()
+    result = runner.invoke(
+        cli, ["stata-log", "task_run_do_file", "--archive-dir", archive_dir]
+    )
+    assert result.exit_code == ExitCode.OK
+    assert "archived" in result.output
+
+    result = runner.invoke(cli, ["stata-log", "--list", "--archive-dir", archive_dir])
+    assert result.exit_code == ExitCode.OK
+    assert "success" in result.output
+
+    result = runner.invoke(
+        cli, ["stata-log", "task_unknown", "--archive-dir", archive_dir]
+    )
+    assert result.exit_code == ExitCode.FAILED
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+from pytask import cli
+
+from pytask_stata import run_do_file
+from tests.conftest import _find_stata_executable
+from tests.conftest import needs_stata
+
+
+@needs_stata
+def test_run_do_files_concurrently(tmp_path):
+    tmp_path.joinpath("script.do").write_text(
+        "args produces\nsleep 200\nsysuse auto, clear\nsave `produces'\n"
+    )
+    executable = _find_stata_executable()
+
+    async def main():
+        return await asyncio.gather(
+            *(
+                run_do_file(
+                    executable,
+                    tmp_path / "script.do",
+                    [f"out_{i}"],
+                    log=tmp_path / f"log_{i}.log",
+                )
+                for i in range(3)
+            )
+        )
+
+    results = asyncio.run(main())
+
+    assert all(result.is_success for result in results)
+    for i, result in enumerate(results):
+        assert tmp_path.joinpath(f"out_{i}.dta").exists()
+        assert result.log == tmp_path / f"log_{i}.log"
+        assert any("save" in line for line in result.tail)
+
+
+@needs_stata
+@pytest.mark.parametrize("follow_log", [False, True])
+def test_run_do_file_parses_error_code(tmp_path, follow_log):
+    tmp_path.joinpath("script.do").write_text("use missing\nsave out\n")
+    logs_dir = tmp_path / "logs"
+
+    result = asyncio.run(
+        run_do_file(
+            _find_stata_executable(),
+            tmp_path / "script.do",
+            log=logs_dir / "script.log",
+            follow_log=follow_log,
+            on_line=lambda line: None,  # noqa: ARG005
+        )
+    )
+
+    assert not result.is_success
+    assert result.error_code == 601  # noqa: PLR2004
+    assert any("r(601)" in line for line in result.tail)
+    assert logs_dir.joinpath("script.log").exists()
+    assert not tmp_path.joinpath("out.dta").exists()
+
+
+@needs_stata
+def test_run_tasks_with_async_backend(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+    from pytask import task
+
+    for i in range(3):
+
+        @task
+        @pytask.mark.stata(script=Path("script.do"), options=f"out_{i}")
+        def task_run_do_file(produces=Path(f"out_{i}.dta")):
+            pass
+
+    @pytask.mark.stata(script=Path("failing.do"))
+    def task_fail(produces=Path("never.dta")):
+        pass
+
+    def task_merge(
+        depends_on=[Path(f"out_{i}.dta") for i in range(3)],
+        produces=Path("merged.txt"),
+    ):
+        produces.write_text("merged")
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text(
+        "args produces\nsleep 100\nsysuse auto, clear\nsave `produces'\n"
+    )
+    tmp_path.joinpath("failing.do").write_text("error 601\n")
+
+    result = runner.invoke(
+        cli,
+        [
+            tmp_path.as_posix(),
+            "--stata-backend",
+            "async",
+            "--stata-async-max-tasks",
+            "2",
+        ],
+    )
+
+    assert result.exit_code == ExitCode.FAILED
+    assert "4  Succeeded" in result.output
+    assert "1  Failed" in result.output
+    assert "r(601)" in result.output
+    assert tmp_path.joinpath("merged.txt").exists()
+
+
+@needs_stata
+def test_async_backend_records_usage(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("sysuse auto, clear\nsave out\n")
+
+    session = build(paths=tmp_path, stata_backend="async")
+
+    assert session.exit_code == ExitCode.OK
+    assert session.tasks[0].attributes["stata_usage"].wall_time > 0
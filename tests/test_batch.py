@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import TaskOutcome
+from pytask import build
+from pytask import cli
+
+from pytask_stata.process import run_stata_process
+from tests.conftest import needs_stata
+
+
+@needs_stata
+def test_run_parametrized_tasks_in_one_batch(runner, tmp_path, monkeypatch):
+    task_source = """
+    import pytask
+    from pathlib import Path
+    from pytask import task
+
+    for i in range(3):
+
+        @task
+        @pytask.mark.stata(script="script.do", options=f"out_{i}")
+        def task_run_do_file(produces=Path(f"out_{i}.dta")):
+            pass
+
+    def task_merge(
+        depends_on=[Path(f"out_{i}.dta") for i in range(3)],
+        produces=Path("merged.txt"),
+    ):
+        produces.write_text("merged")
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+
+    do_file = """
+    args produces
+    sysuse auto, clear
+    save "`produces'"
+    """
+    tmp_path.joinpath("script.do").write_text(textwrap.dedent(do_file))
+
+    calls = []
+
+    def _run(cmd, **kwargs):
+        calls.append(cmd)
+        return run_stata_process(cmd, **kwargs)
+
+    monkeypatch.setattr("pytask_stata.batch.run_stata_process", _run)
+
+    result = runner.invoke(
+        cli,
+        [
+            tmp_path.as_posix(),
+            "--stata-backend",
+            "batch",
+            "--stata-usage-file",
+            "usage.json",
+        ],
+    )
+
+    assert result.exit_code == ExitCode.OK
+    assert len(calls) == 1
+    for i in range(3):
+        assert tmp_path.joinpath(f"out_{i}.dta").exists()
+    assert tmp_path.joinpath("merged.txt").exists()
+
+    # Every task of the batch is attributed the usage of the Stata process.
+    usages = json.loads(tmp_path.joinpath("usage.json").read_text())
+    assert len(usages) == 3  # noqa: PLR2004
+    assert len({usage["wall_time"] for usage in usages}) == 1
+
+
+@needs_stata
+def test_failing_task_in_batch_does_not_fail_others(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+    from pytask import task
+
+    for name in ("good", "bad"):
+
+        @task(id=name)
+        @pytask.mark.stata(script=f"{name}.do")
+        def task_run_do_file(produces=Path(f"{name}.dta")):
+            pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("good.do").write_text("sysuse auto, clear\nsave good\n")
+    tmp_path.joinpath("bad.do").write_text("error 601\n")
+
+    session = build(paths=tmp_path, stata_backend="batch")
+
+    assert session.exit_code == ExitCode.FAILED
+    reports = {
+        report.task.name.rsplit("[")[-1]: report for report in session.execution_reports
+    }
+    assert reports["good]"].outcome == TaskOutcome.SUCCESS
+    assert reports["bad]"].outcome == TaskOutcome.FAIL
+    assert "r(601)" in str(reports["bad]"].exc_info[1])
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{"stata_stream_log": True}, {"stata_timeout": 60}, {"stata_max_rss": "1G"}],
+)
+def test_batch_backend_rejects_streaming_and_limits(tmp_path, options):
+    session = build(paths=tmp_path, stata_backend="batch", **options)
+
+    assert session.exit_code == ExitCode.CONFIGURATION_FAILED
+
+
+def test_batch_backend_rejects_limits_of_tasks(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"), timeout=60)
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("save out\n")
+
+    session = build(paths=tmp_path, stata_backend="batch")
+
+    assert session.exit_code == ExitCode.COLLECTION_FAILED
+    message = str(session.collection_reports[0].exc_info[1])
+    assert "the 'batch' backend cannot enforce limits" in message
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+from pytask import ExitCode
+from pytask import cli
+
+from pytask_stata import spool
+from pytask_stata.cluster import JobLostError
+from pytask_stata.cluster import _wait_for_status
+from pytask_stata.cluster import render_job_script
+from tests.conftest import needs_stata
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="Job scripts need a POSIX shell."
+)
+
+_TASK_SOURCE = """
+import pytask
+from pathlib import Path
+
+@pytask.mark.stata(script=Path("script.do"), timeout={timeout})
+def task_run_do_file(produces=Path("out.dta")):
+    pass
+"""
+
+
+def _wait_for(path, timeout=10):
+    start = time.monotonic()
+    while not path.exists():
+        if time.monotonic() - start > timeout:
+            msg = f"{path} does not exist."
+            raise TimeoutError(msg)
+        time.sleep(0.05)
+
+
+@pytest.mark.parametrize(("executable", "status"), [("true", "0"), ("false", "1")])
+def test_job_script_writes_exit_status(tmp_path, executable, status):
+    job = tmp_path / "job.sh"
+    job.write_text(
+        render_job_script(
+            executable,
+            tmp_path / "wrapper.do",
+            tmp_path / "logs" / "task.log",
+            tmp_path / "status",
+            header=["#SBATCH --job-name=task"],
+        )
+    )
+    tmp_path.joinpath("logs").mkdir()
+
+    subprocess.run(["sh", job.as_posix()], check=False)  # noqa: S603, S607
+
+    assert tmp_path.joinpath("status").read_text().strip() == status
+
+
+def test_spool_runs_and_cancels_jobs(tmp_path):
+    directory = tmp_path / "spool"
+    tmp_path.joinpath("quick.sh").write_text("echo done > quick.txt\n")
+    tmp_path.joinpath("slow.sh").write_text(
+        "trap 'echo 143 > slow.txt; exit 143' TERM\nsleep 30 & wait\n"
+    )
+
+    spool.submit(directory, tmp_path / "quick.sh")
+    job_id = spool.submit(directory, tmp_path / "slow.sh")
+    _wait_for(directory / "running" / f"{job_id}.job")
+    spool.cancel(directory, job_id)
+
+    _wait_for(tmp_path / "slow.txt")
+    assert tmp_path.joinpath("quick.txt").read_text() == "done\n"
+    _wait_for(directory / "done" / f"{job_id}.job")
+
+
+def test_spool_reports_status_of_jobs(tmp_path, monkeypatch):
+    directory = tmp_path / "spool"
+    for name in ("queue", "done"):
+        directory.joinpath(name).mkdir(parents=True)
+    directory.joinpath("queue", "1.job").write_text("job.sh")
+    monkeypatch.setattr(spool, "_ensure_worker", lambda _: None)
+
+    assert spool.get_status(directory, "1") == "queued"
+    spool.cancel(directory, "1")
+    assert spool.get_status(directory, "1") is None
+    assert spool.main(["status", directory.as_posix(), "1"]) == 1
+    assert spool.get_status(directory, "unknown") is None
+
+
+def test_spool_reports_running_jobs(tmp_path):
+    directory = tmp_path / "spool"
+    tmp_path.joinpath("slow.sh").write_text("sleep 30 & wait\n")
+
+    job_id = spool.submit(directory, tmp_path / "slow.sh")
+    _wait_for(directory / "running" / f"{job_id}.job")
+    assert spool.get_status(directory, job_id) == "running"
+
+    spool.cancel(directory, job_id)
+    _wait_for(directory / "done" / f"{job_id}.job")
+    assert spool.get_status(directory, job_id) is None
+
+
+def test_wait_for_status_fails_if_job_is_gone(tmp_path):
+    status = tmp_path / "status"
+    with pytest.raises(JobLostError):
+        _wait_for_status(status, lambda: False, None, 0.01, 10)
+
+    status.write_text("0\n")
+    assert _wait_for_status(status, lambda: False, None, 0.01, 10) == 0
+
+
+@needs_stata
+def test_run_tasks_on_local_spool(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+
+    @pytask.mark.stata(script=Path("failing.do"))
+    def task_fail(produces=Path("never.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text('display "on the cluster"\nsave out\n')
+    tmp_path.joinpath("failing.do").write_text("error 601\n")
+
+    result = runner.invoke(
+        cli,
+        [
+            tmp_path.as_posix(),
+            "--stata-backend",
+            "cluster",
+            "--stata-cluster-poll-interval",
+            "0.1",
+        ],
+    )
+
+    assert result.exit_code == ExitCode.FAILED
+    assert "1  Succeeded" in result.output
+    assert "r(601)" in result.output
+    assert tmp_path.joinpath("out.dta").exists()
+    assert (
+        "on the cluster"
+        in tmp_path.joinpath("task_example_py_task_run_do_file.log").read_text()
+    )
+
+
+@needs_stata
+def test_submit_with_custom_command(runner, tmp_path):
+    source = _TASK_SOURCE.format(timeout=None)
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("script.do").write_text("save out\n")
+
+    result = runner.invoke(
+        cli,
+        [
+            tmp_path.as_posix(),
+            "--stata-backend",
+            "cluster",
+            "--stata-cluster-submit",
+            "sh {script}",
+        ],
+    )
+
+    assert result.exit_code == ExitCode.OK
+    assert tmp_path.joinpath("out.dta").exists()
+
+
+@needs_stata
+def test_cancel_job_after_timeout(runner, tmp_path):
+    source = _TASK_SOURCE.format(timeout=0.5)
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("script.do").write_text("sleep 10000\nsave out\n")
+
+    start = time.monotonic()
+    result = runner.invoke(
+        cli,
+        [
+            tmp_path.as_posix(),
+            "--stata-backend",
+            "cluster",
+            "--stata-cluster-poll-interval",
+            "0.1",
+        ],
+    )
+
+    assert result.exit_code == ExitCode.FAILED
+    assert time.monotonic() - start < 10  # noqa: PLR2004
+    assert "timeout of 0.5 seconds" in result.output
+    # The spool terminates the cancelled job in the background.
+    (job,) = tmp_path.joinpath(".pytask", "stata-jobs").glob("*/job.sh")
+    _wait_for(job.with_name("status"))
+    assert job.with_name("status").read_text().strip() == "143"
+
+
+@needs_stata
+def test_fail_task_if_job_ends_without_status(runner, tmp_path):
+    source = _TASK_SOURCE.format(timeout=None)
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("script.do").write_text("save out\n")
+
+    # The scheduler accepts the job but it is gone before it wrote its status.
+    result = runner.invoke(
+        cli,
+        [
+            tmp_path.as_posix(),
+            "--stata-backend",
+            "cluster",
+            "--stata-cluster-submit",
+            "echo 1",
+            "--stata-cluster-status",
+            "false",
+            "--stata-cluster-poll-interval",
+            "0.1",
+        ],
+    )
+
+    assert result.exit_code == ExitCode.FAILED
+    assert "JobLostError" in result.output
+
+
+def test_fail_task_if_spooled_job_is_killed(runner, tmp_path):
+    source = _TASK_SOURCE.format(timeout=None)
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("script.do").write_text("save out\n")
+    # Stata kills the job script with SIGKILL which cannot be trapped.
+    stata = tmp_path / "stata"
+    stata.write_text("#!/bin/sh\nkill -9 $PPID\n")
+    stata.chmod(0o755)
+    tmp_path.joinpath("pyproject.toml").write_text(
+        f"[tool.pytask.ini_options]\nstata = {stata.as_posix()!r}\n"
+    )
+
+    start = time.monotonic()
+    result = runner.invoke(
+        cli,
+        [
+            tmp_path.as_posix(),
+            "--stata-backend",
+            "cluster",
+            "--stata-cluster-poll-interval",
+            "0.1",
+        ],
+    )
+
+    assert result.exit_code == ExitCode.FAILED
+    assert time.monotonic() - start < 10  # noqa: PLR2004
+    assert "JobLostError" in result.output
@@ -7,6 +7,7 @@ from pytask import Mark
 
 from pytask_stata.collect import _parse_stata_mark
 from pytask_stata.collect import stata
+from pytask_stata.shared import StataResources
 
 
 @pytest.mark.parametrize(
@@ -16,13 +17,37 @@ from pytask_stata.collect import stata
             (),
             {"script": "script.do", "options": "--option"},
             does_not_raise(),
-            ("script.do", ["--option"]),
+            ("script.do", ["--option"], StataResources()),
         ),
         (
             (),
             {"script": "script.do", "options": [1]},
             does_not_raise(),
-            ("script.do", ["1"]),
+            ("script.do", ["1"], StataResources()),
+        ),
+        (
+            (),
+            {"script": "script.do", "cores": 4, "memory": "1G", "edition": "mp"},
+            does_not_raise(),
+            ("script.do", [], StataResources(cores=4, memory=1024**3, edition="MP")),
+        ),
+        (
+            (),
+            {"script": "script.do", "edition": "ic"},
+            does_not_raise(),
+            ("script.do", [], StataResources(edition="BE")),
+        ),
+        (
+            (),
+            {"script": "script.do", "cores": 4, "edition": "se"},
+            pytest.raises(ValueError, match="only be set for Stata MP"),
+            None,
+        ),
+        (
+            (),
+            {"script": "script.do", "cores": 0},
+            pytest.raises(ValueError, match="positive integer"),
+            None,
         ),
     ],
 )
@@ -40,6 +65,11 @@ def test_stata(args, kwargs, expectation, expected):
             does_not_raise(),
             Mark("stata", (), {"script": "script.do", "options": []}),
         ),
+        (
+            Mark("stata", (), {"script": "script.do", "cores": 2}),
+            does_not_raise(),
+            Mark("stata", (), {"script": "script.do", "options": [], "cores": 2}),
+        ),
     ],
 )
 def test_parse_stata_mark(
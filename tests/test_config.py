@@ -1,10 +1,103 @@
 from __future__ import annotations
 
+import json
+import os
+import sys
+
+import pytest
+from pytask import ExitCode
 from pytask import build
 
+from pytask_stata.discovery import CACHE_FILE
+from pytask_stata.discovery import StataInfo
+from pytask_stata.discovery import find_stata
+from pytask_stata.discovery import get_stata_info
+from pytask_stata.discovery import locate_stata
+from pytask_stata.shared import STATA_COMMANDS
+from tests.conftest import needs_stata
+
 
 def test_marker_is_configured(tmp_path):
     session = build(paths=tmp_path)
 
     assert "stata" in session.config
     assert "stata" in session.config["markers"]
+
+
+def test_stata_is_not_started_during_configuration(tmp_path, monkeypatch):
+    def _fail(*args, **kwargs):  # noqa: ARG001
+        msg = "Stata should not be probed without Stata tasks."
+        raise AssertionError(msg)
+
+    monkeypatch.setattr("pytask_stata.discovery.probe_stata", _fail)
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    assert "stata_info" not in session.config
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Needs executable scripts.")
+def test_location_of_stata_is_cached(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    executable = bin_dir / STATA_COMMANDS[0]
+    executable.write_text("#!/bin/sh\n")
+    executable.chmod(0o755)
+    monkeypatch.setenv("PATH", bin_dir.as_posix())
+
+    assert locate_stata(tmp_path) == STATA_COMMANDS[0]
+
+    searched = []
+    monkeypatch.setattr(
+        "pytask_stata.discovery.shutil.which",
+        lambda name: searched.append(name) or executable.as_posix(),
+    )
+    assert locate_stata(tmp_path) == STATA_COMMANDS[0]
+    assert searched == []
+
+    # A changed executable is searched again.
+    os.utime(executable, (0, 0))
+    assert locate_stata(tmp_path) == STATA_COMMANDS[0]
+    assert searched == [STATA_COMMANDS[0]]
+
+
+@needs_stata
+def test_stata_executable_is_probed_and_cached(tmp_path, monkeypatch):
+    session = build(paths=tmp_path)
+
+    info = get_stata_info(session.config)
+    assert isinstance(info, StataInfo)
+    assert session.config["stata"] == info.executable
+    assert info.edition in ("MP", "SE", "BE")
+    assert info.version is not None
+
+    def _fail(*args, **kwargs):  # noqa: ARG001
+        msg = "The PATH should not be searched again."
+        raise AssertionError(msg)
+
+    monkeypatch.setattr("pytask_stata.discovery.shutil.which", _fail)
+
+    assert find_stata(tmp_path, info.executable) == info
+
+
+@needs_stata
+def test_cache_is_invalidated_if_executable_changes(tmp_path, monkeypatch):
+    info = find_stata(tmp_path)
+    assert info is not None
+
+    cache_path = tmp_path / ".pytask" / CACHE_FILE
+    cache = json.loads(cache_path.read_text())
+    for entry in cache.values():
+        entry["mtime"] = 0.0
+        entry["version"] = "outdated"
+    cache_path.write_text(json.dumps(cache))
+
+    probed = []
+    monkeypatch.setattr(
+        "pytask_stata.discovery.probe_stata",
+        lambda executable, path: probed.append(executable) or info,  # noqa: ARG005
+    )
+
+    assert find_stata(tmp_path) == info
+    assert probed == [info.executable]
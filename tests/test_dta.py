@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import TaskOutcome
+from pytask import build
+from pytask import cli
+
+from pytask_stata import read_dta_header
+from pytask_stata.dta import DtaHashCache
+from pytask_stata.dta import hash_dta
+from pytask_stata.hashing import DtaNode
+from tests.conftest import needs_stata
+from tests.conftest import restore_sys_path_and_module_after_test_execution
+
+
+def _create_xml_dta(timestamp: bytes, data: bytes) -> bytes:
+    return (
+        b"<stata_dta><header><release>118</release><byteorder>MSF</byteorder>"
+        b"<K>\x00\x01</K><N>" + (2).to_bytes(8, "big") + b"</N>"
+        b"<label>\x00\x0b<timestamp></label>"
+        b"<timestamp>" + bytes([len(timestamp)]) + timestamp + b"</timestamp>"
+        b"</header><data>" + data + b"</data></stata_dta>"
+    )
+
+
+def _create_binary_dta(timestamp: bytes, data: bytes) -> bytes:
+    return bytes([114, 2, 1, 0]) + bytes(87) + timestamp.ljust(18, b"\x00") + data
+
+
+@pytest.mark.parametrize("create", [_create_xml_dta, _create_binary_dta])
+def test_hash_ignores_timestamp(tmp_path, create):
+    path = tmp_path / "data.dta"
+    path.write_bytes(create(b"18 Oct 2026 14:05", b"\x01\x02"))
+    digest = hash_dta(path)
+
+    path.write_bytes(create(b"19 Oct 2026 09:30", b"\x01\x02"))
+    assert hash_dta(path) == digest
+
+    path.write_bytes(create(b"18 Oct 2026 14:05", b"\x01\x03"))
+    assert hash_dta(path) != digest
+
+
+def _create_binary_dataset(n_obs: int) -> bytes:
+    header = bytes([114, 2, 1, 0]) + (2).to_bytes(2, "little")
+    header += n_obs.to_bytes(4, "little") + b"Prices".ljust(81, b"\x00")
+    header += b"18 Oct 2026 14:05".ljust(18, b"\x00")
+    descriptors = bytes([253, 5])
+    descriptors += b"id".ljust(33, b"\x00") + b"make".ljust(33, b"\x00")
+    descriptors += bytes(2 * 3)
+    descriptors += b"%12.0g".ljust(49, b"\x00") + b"%5s".ljust(49, b"\x00")
+    descriptors += b"idlabel".ljust(33, b"\x00") + bytes(33)
+    descriptors += b"Identifier".ljust(81, b"\x00") + bytes(81)
+    expansion = bytes(5)
+    return header + descriptors + expansion + bytes(9 * n_obs)
+
+
+def test_read_header_of_binary_format(tmp_path):
+    path = tmp_path / "data.dta"
+    path.write_bytes(_create_binary_dataset(4))
+
+    header = read_dta_header(path)
+
+    assert (header.release, header.n_obs, header.n_vars) == (114, 4, 2)
+    assert (header.label, header.timestamp) == ("Prices", "18 Oct 2026 14:05")
+    assert [(var.name, var.type) for var in header.variables] == [
+        ("id", "long"),
+        ("make", "str5"),
+    ]
+    assert header.variables[0].value_label == "idlabel"
+    assert header.variables[0].label == "Identifier"
+    assert header.data_size == 36  # noqa: PLR2004
+
+
+@pytest.mark.parametrize("content", [b"", b"not a dataset"])
+def test_read_header_of_invalid_file(tmp_path, content):
+    path = tmp_path / "data.dta"
+    path.write_bytes(content)
+    with pytest.raises(ValueError, match=r"data\.dta"):
+        read_dta_header(path)
+
+
+def test_detect_truncated_binary_dataset(tmp_path):
+    path = tmp_path / "data.dta"
+    path.write_bytes(_create_binary_dataset(4)[:-1])
+    with pytest.raises(ValueError, match="needs 36 bytes"):
+        read_dta_header(path)
+
+
+def test_hash_other_files_completely(tmp_path):
+    path = tmp_path / "data.dta"
+    path.write_bytes(b"")
+    empty = hash_dta(path)
+    path.write_bytes(b"not a dataset")
+    assert hash_dta(path) != empty
+
+
+def test_cache_hashes_by_size_and_modification_time(tmp_path):
+    path = tmp_path / "data.dta"
+    path.write_bytes(_create_xml_dta(b"18 Oct 2026 14:05", b"\x01"))
+    cache_path = tmp_path / ".pytask" / "stata-dta-hashes.json"
+    cache = DtaHashCache(cache_path)
+    digest = cache.digest(path)
+    cache.save()
+
+    cache = DtaHashCache(cache_path)
+    assert cache.digest(path) == digest
+    assert DtaNode.from_path(path).state() == digest
+    assert DtaNode.from_path(tmp_path / "missing.dta").state() is None
+
+
+@needs_stata
+@pytest.mark.parametrize("hash_dta", [False, True])
+def test_skip_tasks_if_dataset_is_unchanged(monkeypatch, tmp_path, hash_dta):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("data.dta")):
+        pass
+
+    def task_summarize(path=Path("data.dta"), produces=Path("summary.txt")):
+        produces.write_text(str(path.stat().st_size))
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("save data\n")
+
+    monkeypatch.setenv("STATA_MOCK_TIMESTAMP", "18 Oct 2026 14:05")
+    with restore_sys_path_and_module_after_test_execution():
+        session = build(paths=tmp_path, stata_hash_dta=hash_dta)
+    assert session.exit_code == ExitCode.OK
+
+    monkeypatch.setenv("STATA_MOCK_TIMESTAMP", "18 Oct 2026 14:06")
+    tmp_path.joinpath("script.do").write_text("* Save the data again.\nsave data\n")
+    session = build(paths=tmp_path, stata_hash_dta=hash_dta)
+
+    assert session.exit_code == ExitCode.OK
+    outcomes = {
+        report.task.name.rsplit("::", 1)[-1]: report.outcome
+        for report in session.execution_reports
+    }
+    assert outcomes["task_run_do_file"] == TaskOutcome.SUCCESS
+    assert outcomes["task_summarize"] == (
+        TaskOutcome.SKIP_UNCHANGED if hash_dta else TaskOutcome.SUCCESS
+    )
+
+
+@needs_stata
+def test_read_header_of_dataset_saved_by_stata(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("data.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text(
+        "set obs 3\ngenerate long id = _n\ngenerate price = 1\nsave data\n"
+    )
+
+    result = runner.invoke(cli, [tmp_path.as_posix()])
+    assert result.exit_code == ExitCode.OK
+
+    path = tmp_path / "data.dta"
+    header = read_dta_header(path)
+    assert (header.release, header.n_obs) == (118, 3)
+    assert [(var.name, var.type) for var in header.variables] == [
+        ("id", "long"),
+        ("price", "float"),
+    ]
+
+    content = path.read_bytes()
+    path.write_bytes(content[:-20])
+    with pytest.raises(ValueError, match="not a valid Stata dataset"):
+        read_dta_header(path)
+
+
+@needs_stata
+def test_check_expectations_of_datasets(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(
+        script=Path("script.do"),
+        expect={
+            "data.dta": {"n_obs": 5, "variables": ["id", "income"]},
+            "other.dta": {"types": {"id": "long"}},
+        },
+    )
+    def task_run_do_file(produces=[Path("data.dta"), Path("other.dta")]):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text(
+        "set obs 3\ngenerate long id = _n\nsave data\nsave other\n"
+    )
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.FAILED
+    message = str(session.execution_reports[0].exc_info[1])
+    assert "The dataset has 3 observations, but 5 are expected." in message
+    assert "The variables ['income'] are missing." in message
+    assert "other.dta" not in message
+
+
+def test_raise_error_if_expectations_refer_to_other_files(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"), expect={"missing.dta": {"n_obs": 1}})
+    def task_run_do_file(produces=Path("data.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("save data\n")
+
+    result = runner.invoke(cli, [tmp_path.as_posix()])
+
+    assert result.exit_code == ExitCode.COLLECTION_FAILED
+    assert "which are not .dta products of the task" in result.output
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import textwrap
+
+from pytask import ExitCode
+from pytask import build
+
+from pytask_stata.durations import DurationHistory
+from tests.conftest import needs_stata
+from tests.conftest import restore_sys_path_and_module_after_test_execution
+
+
+def test_record_durations(tmp_path):
+    path = tmp_path / ".pytask" / "stata-durations.json"
+    history = DurationHistory(path)
+    history.record("task_a", "abc", 10.0)
+    history.record("task_a", "abc", 20.0)
+    history.record("task_b", None, 5.0)
+    history.save()
+
+    history = DurationHistory(path)
+    assert history.get("task_a", "abc") == 15.0  # noqa: PLR2004
+    assert history.get("task_a", "changed") is None
+    assert history.get("task_b", None) is None
+
+    history.record("task_a", "changed", 1.0)
+    assert history.get("task_a", "changed") == 1.0
+
+
+@needs_stata
+def test_start_tasks_on_critical_path_first(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+    from pytask import task
+
+    for name in ("short", "long", "chain"):
+
+        @task(id=name)
+        @pytask.mark.stata(script=Path(f"{name}.do"))
+        def task_run_do_file(produces=Path(f"{name}.dta")):
+            pass
+
+    @pytask.mark.stata(script=Path("after_chain.do"))
+    def task_after_chain(
+        depends_on=Path("chain.dta"), produces=Path("after_chain.dta")
+    ):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    for name in ("short", "long", "chain", "after_chain"):
+        tmp_path.joinpath(f"{name}.do").write_text(f"save {name}\n")
+
+    with restore_sys_path_and_module_after_test_execution():
+        session = build(paths=tmp_path)
+    assert session.exit_code == ExitCode.OK
+
+    # Pretend that the long task and the chain of two tasks take the longest.
+    seconds = {"short": 1, "long": 100, "chain": 30, "after_chain": 80}
+    durations = {}
+    for task in session.tasks:
+        name = task.depends_on["_script"].path.stem
+        digest = hashlib.sha256(task.depends_on["_script"].path.read_bytes())
+        durations[task.name] = {
+            "script": digest.hexdigest(),
+            "duration": seconds[name],
+        }
+    tmp_path.joinpath(".pytask", "stata-durations.json").write_text(
+        json.dumps(durations)
+    )
+
+    session = build(paths=tmp_path, force=True)
+
+    assert session.exit_code == ExitCode.OK
+    order = [
+        report.task.depends_on["_script"].path.stem
+        for report in session.execution_reports
+    ]
+    assert order == ["chain", "long", "after_chain", "short"]
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import os
+import subprocess
 import sys
 import textwrap
+import time
 from contextlib import ExitStack as does_not_raise  # noqa: N813
 from pathlib import Path
 
@@ -13,10 +16,12 @@ from pytask import Task
 from pytask import build
 from pytask import cli
 
-from pytask_stata.config import STATA_COMMANDS
 from pytask_stata.execute import pytask_execute_task_setup
+from pytask_stata.shared import STATA_COMMANDS
 from tests.conftest import needs_stata
 
+_MAX_SECONDS_UNTIL_ABORT = 30
+
 
 @pytest.mark.parametrize(
     ("stata", "expectation"),
@@ -63,10 +68,7 @@ def test_run_do_file(runner, tmp_path):
     assert result.exit_code == ExitCode.OK
     assert tmp_path.joinpath("auto.dta").exists()
 
-    if sys.platform == "win32":
-        assert tmp_path.joinpath("task_example_py_task_run_do_file.log").exists()
-    else:
-        assert tmp_path.joinpath("script.log").exists()
+    assert tmp_path.joinpath("task_example_py_task_run_do_file.log").exists()
 
 
 @needs_stata
@@ -94,10 +96,7 @@ def test_run_do_file_w_task_decorator(runner, tmp_path):
     assert result.exit_code == ExitCode.OK
     assert tmp_path.joinpath("auto.dta").exists()
 
-    if sys.platform == "win32":
-        assert tmp_path.joinpath("task_example_py_run_do_file.log").exists()
-    else:
-        assert tmp_path.joinpath("script.log").exists()
+    assert tmp_path.joinpath("task_example_py_run_do_file.log").exists()
 
 
 @needs_stata
@@ -166,7 +165,7 @@ def test_raise_error_if_stata_is_not_found(tmp_path, monkeypatch):
 
     # Hide Stata if available.
     monkeypatch.setattr(
-        "pytask_stata.config.shutil.which",
+        "pytask_stata.discovery.shutil.which",
         lambda x: None,  # noqa: ARG005
     )
 
@@ -294,7 +293,119 @@ def test_with_task_without_path(runner, tmp_path):
     assert result.exit_code == ExitCode.OK
     assert tmp_path.joinpath("auto.dta").exists()
 
-    if sys.platform == "win32":
-        assert tmp_path.joinpath("task_example_py_lambda.log").exists()
-    else:
-        assert not tmp_path.joinpath("task_example_py_lambda.log").exists()
+    assert tmp_path.joinpath("task_example_py_lambda.log").exists()
+
+
+@needs_stata
+def test_stream_log_of_successful_do_file(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script="script.do")
+    def task_run_do_file(produces=Path("auto.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("sysuse auto, clear\nsave auto\n")
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-stream-log"])
+
+    assert result.exit_code == ExitCode.OK
+    assert "[script.do] . save auto" in result.output
+    assert tmp_path.joinpath("auto.dta").exists()
+
+
+@needs_stata
+def test_stream_log_prints_lines_while_task_is_running(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script="script.do")
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    do_file = """
+    display "first line"
+    sleep 3000
+    sysuse auto, clear
+    save out
+    """
+    tmp_path.joinpath("script.do").write_text(textwrap.dedent(do_file))
+
+    # pytask captures the output of tasks by default.
+    process = subprocess.Popen(  # noqa: S603
+        [sys.executable, "-m", "pytask", tmp_path.as_posix(), "--stata-stream-log"],
+        stdout=subprocess.PIPE,
+        text=True,
+        env={**os.environ, "COLUMNS": "200"},
+    )
+    try:
+        for line in process.stdout:
+            if "[script.do] . display" in line:
+                assert process.poll() is None
+                assert not tmp_path.joinpath("out.dta").exists()
+                break
+        else:
+            pytest.fail("The log was not streamed.")
+        assert "[script.do] . save out" in process.stdout.read()
+    finally:
+        process.stdout.close()
+        process.wait()
+
+    assert process.returncode == ExitCode.OK
+
+
+@needs_stata
+def test_stream_log_continues_after_captured_errors(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script="script.do")
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+
+    do_file = """
+    capture noisily error 601
+    sysuse auto, clear
+    save out
+    """
+    tmp_path.joinpath("script.do").write_text(textwrap.dedent(do_file))
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-stream-log"])
+
+    assert result.exit_code == ExitCode.OK
+    assert tmp_path.joinpath("out.dta").exists()
+
+
+@needs_stata
+def test_stream_log_stops_stata_on_uncaptured_error(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script="script.do")
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+
+    do_file = """
+    error 601
+    sleep 60000
+    save out
+    """
+    tmp_path.joinpath("script.do").write_text(textwrap.dedent(do_file))
+
+    start = time.time()
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-stream-log"])
+
+    assert time.time() - start < _MAX_SECONDS_UNTIL_ABORT
+    assert result.exit_code == ExitCode.FAILED
+    assert "r(601)" in result.output
+    assert not tmp_path.joinpath("out.dta").exists()
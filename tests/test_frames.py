@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import math
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import Session
+from pytask import build
+
+from pytask_stata import read_dta_header
+from pytask_stata.execute import _materialize_frame
+from pytask_stata.frames import FRAMES_DIRECTORY
+from pytask_stata.frames import iter_dta
+from pytask_stata.frames import materialize_frame
+from pytask_stata.frames import read_frame
+from pytask_stata.frames import write_dta
+from tests.conftest import needs_stata
+from tests.conftest import restore_sys_path_and_module_after_test_execution
+
+
+def test_write_and_read_dataset_in_chunks(tmp_path):
+    path = tmp_path / "data.dta"
+    types = {"id": "long", "price": "double", "make": "str6"}
+    chunks = [
+        {"id": [1, 2], "price": [1.5, None], "make": ["AMC", "Buick"]},
+        {"id": [3, None], "price": [math.nan, 4.0], "make": ["Ford", None]},
+    ]
+
+    write_dta(path, types, 4, chunks, chunk_size=2)
+
+    header = read_dta_header(path)
+    assert (header.release, header.n_obs, header.timestamp) == (118, 4, "")
+    assert [(var.name, var.type) for var in header.variables] == list(types.items())
+    assert list(iter_dta(path, chunk_size=3)) == [
+        {"id": [1, 2, 3], "price": [1.5, None, None], "make": ["AMC", "Buick", "Ford"]},
+        {"id": [None], "price": [4.0], "make": [""]},
+    ]
+
+
+@pytest.mark.parametrize(
+    ("chunks", "match"),
+    [
+        ([{"id": [1, 2, 3]}], "at most 2 are allowed"),
+        ([{"id": [1]}], "1 observations instead of 3"),
+    ],
+)
+def test_reject_invalid_chunks(tmp_path, chunks, match):
+    with pytest.raises(ValueError, match=match):
+        write_dta(tmp_path / "data.dta", {"id": "long"}, 3, chunks, chunk_size=2)
+
+
+def test_materialize_frame_once_per_content(tmp_path):
+    pd = pytest.importorskip("pandas")
+    frame = pd.DataFrame({"id": [1, 2, 3], "make": ["AMC", "Buick", None]})
+
+    path = materialize_frame(frame, tmp_path, chunk_size=2)
+    modified = path.stat().st_mtime_ns
+
+    assert materialize_frame(frame.copy(), tmp_path) == path
+    assert path.stat().st_mtime_ns == modified
+    assert materialize_frame(frame.head(2), tmp_path) != path
+    assert not list(tmp_path.glob(".*.tmp"))
+
+    result = read_frame(path, "pandas", chunk_size=2)
+    assert result["id"].tolist() == [1, 2, 3]
+    assert result["make"].tolist() == ["AMC", "Buick", ""]
+
+
+def test_materialize_frame_once_per_session(tmp_path, monkeypatch):
+    converted = []
+
+    def _materialize(frame, directory):
+        converted.append(frame)
+        path = directory / f"{len(converted)}.dta"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+        return path
+
+    monkeypatch.setattr("pytask_stata.execute.materialize_frame", _materialize)
+    session = Session(config={"root": tmp_path})
+    frame, other = object(), object()
+
+    path = _materialize_frame(session, frame)
+    assert _materialize_frame(session, frame) == path
+    assert _materialize_frame(session, other) != path
+    assert converted == [frame, other]
+
+    # A removed file is written again.
+    path.unlink()
+    _materialize_frame(session, frame)
+    assert converted == [frame, other, frame]
+
+
+def test_round_trip_of_pyarrow_table(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table({"id": pa.array([1, None], pa.int32()), "x": [0.5, 1.5]})
+
+    path = materialize_frame(table, tmp_path)
+
+    assert read_frame(path, "pyarrow").to_pydict() == {"id": [1, None], "x": [0.5, 1.5]}
+
+
+@needs_stata
+def test_pass_frames_to_do_file(tmp_path):
+    pytest.importorskip("pandas")
+    task_source = """
+    import pandas as pd
+    import pytask
+    from pathlib import Path
+    from typing import Annotated
+    from pytask import Product
+    from pytask import PythonNode
+
+    frame = PythonNode(name="frame", value=pd.DataFrame({"id": [1, 2]}))
+    result = PythonNode(name="result")
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(result: Annotated[pd.DataFrame, result, Product], frame=frame):
+        pass
+
+    def task_check(
+        result: Annotated[pd.DataFrame, result],
+    ) -> Annotated[str, Path("out.txt")]:
+        return str(len(result))
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text(
+        "args frame result\nuse `frame'\nset obs 3\ngenerate long id = _n\n"
+        "save `result'\n"
+    )
+
+    with restore_sys_path_and_module_after_test_execution():
+        session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    assert tmp_path.joinpath("out.txt").read_text() == "3"
+    assert len(list(tmp_path.joinpath(FRAMES_DIRECTORY).glob("*.dta"))) == 1
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import sys
+import textwrap
+import time
+from contextlib import ExitStack as does_not_raise  # noqa: N813
+
+import pytest
+from pytask import ExitCode
+from pytask import cli
+
+from pytask_stata.process import Watchdog
+from pytask_stata.shared import StataResources
+from pytask_stata.shared import stata
+from tests.conftest import needs_stata
+
+_BACKENDS = [
+    "subprocess",
+    "async",
+    pytest.param(
+        "pool",
+        marks=pytest.mark.skipif(
+            sys.platform == "win32", reason="Stata's console mode is not available."
+        ),
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "expectation"),
+    [
+        ({"timeout": 10, "idle_timeout": 1.5}, does_not_raise()),
+        ({"max_rss": "2G"}, does_not_raise()),
+        ({"timeout": 0}, pytest.raises(ValueError, match="'timeout' must be")),
+        ({"idle_timeout": "1"}, pytest.raises(ValueError, match="'idle_timeout'")),
+        ({"max_rss": "a lot"}, pytest.raises(ValueError, match="Cannot parse")),
+    ],
+)
+def test_parse_limits(kwargs, expectation):
+    with expectation:
+        _, _, resources = stata(script="script.do", **kwargs)
+        assert resources.has_limits()
+
+
+def test_watchdog_detects_idle_log(tmp_path):
+    log = tmp_path.joinpath("script.log")
+    log.write_text("start\n")
+    watchdog = Watchdog(StataResources(idle_timeout=0.2), log, lambda: None)
+
+    assert watchdog.check() is None
+    time.sleep(0.3)
+    assert watchdog.check() == "The log did not grow for 0.2 seconds."
+
+    log.write_text("start\nmore\n")
+    assert watchdog.check() is None
+
+
+def test_watchdog_detects_memory(tmp_path):
+    watchdog = Watchdog(
+        StataResources(max_rss=1024**2), tmp_path / "script.log", lambda: 2 * 1024**2
+    )
+    assert watchdog.check() == (
+        "Stata used 2m of memory which exceeds the limit of 1m."
+    )
+
+
+@needs_stata
+@pytest.mark.parametrize("backend", _BACKENDS)
+def test_stop_task_after_timeout(runner, tmp_path, backend):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"), timeout=0.5)
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text(
+        'display "before sleeping"\nsleep 10000\nsave out\n'
+    )
+
+    start = time.monotonic()
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-backend", backend])
+
+    assert result.exit_code == ExitCode.FAILED
+    assert time.monotonic() - start < 10  # noqa: PLR2004
+    assert "timeout of 0.5 seconds" in result.output
+    assert "before sleeping" in result.output
+    assert not tmp_path.joinpath("out.dta").exists()
+
+
+@needs_stata
+def test_stop_idle_task_with_global_limit(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("sleep 10000\nsave out\n")
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-idle-timeout", "0.5"])
+
+    assert result.exit_code == ExitCode.FAILED
+    assert "The log did not grow for 0.5 seconds" in result.output
+
+
+@needs_stata
+@pytest.mark.skipif(sys.platform != "linux", reason="Memory is only measured on Linux.")
+def test_stop_task_exceeding_max_rss(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"), max_rss="1k")
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("sleep 10000\nsave out\n")
+
+    result = runner.invoke(cli, [tmp_path.as_posix()])
+
+    assert result.exit_code == ExitCode.FAILED
+    assert "exceeds the limit of 1k" in result.output
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import pytest
+
+from pytask_stata.logs import UncapturedErrorDetector
+from pytask_stata.logs import find_error_code
+from pytask_stata.logs import read_log_tail
+
+LOG = "running do-file\n. sysuse auto\n\n. error 601\nr(601);\n\nend of do-file\n"
+
+
+@pytest.mark.parametrize("n_lines", [1, 2, 3, 10, 100])
+@pytest.mark.parametrize("block_size", [1, 3, 16, 4096])
+@pytest.mark.parametrize("content", [LOG, LOG.rstrip("\n"), "", "é\nü\n" * 50])
+def test_read_log_tail_equals_reading_the_whole_file(
+    tmp_path, content, n_lines, block_size
+):
+    path = tmp_path.joinpath("script.log")
+    path.write_text(content, encoding="utf-8")
+
+    tail = read_log_tail(path, n_lines, block_size=block_size)
+
+    assert tail == content.split("\n")[-n_lines:]
+
+
+def test_read_log_tail_stops_after_max_bytes(tmp_path):
+    path = tmp_path.joinpath("script.log")
+    path.write_text("x" * 1_000 + "\nr(601);\nend of do-file\n")
+
+    tail = read_log_tail(path, 10, max_bytes=30, block_size=8)
+
+    assert tail == ["r(601);", "end of do-file", ""]
+    assert find_error_code(tail) is not None
+
+
+@pytest.mark.parametrize(
+    ("lines", "expected"),
+    [
+        # An error of a do-file run with capture.
+        (["r(601);", "", "end of do-file", ". save out", "r(601);"], None),
+        (["r(601);", "", "end of do-file", "", "r(601);"], 601),
+        (["r(198);", "end of do-file", "r(198); t=0.00 10:00:02"], 198),
+        ([". display 1", "1", "end of do-file"], None),
+    ],
+)
+def test_detect_uncaptured_errors(lines, expected):
+    detector = UncapturedErrorDetector()
+
+    results = [detector.feed(line) for line in lines]
+
+    assert results[-1] == expected
+    assert not any(results[:-1])
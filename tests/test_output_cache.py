@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import os
+import shutil
+import textwrap
+
+from pytask import ExitCode
+from pytask import TaskOutcome
+from pytask import build
+
+from pytask_stata.output_cache import OutputCache
+from tests.conftest import needs_stata
+from tests.conftest import restore_sys_path_and_module_after_test_execution
+
+
+def test_store_and_restore_files(tmp_path):
+    cache = OutputCache(tmp_path / "cache")
+    data = tmp_path / "data.dta"
+    data.write_bytes(b"data")
+    copy = tmp_path / "copy.dta"
+    copy.write_bytes(b"data")
+
+    cache.put("a", "task_a", {"data.dta": data, "copy.dta": copy})
+    data.unlink()
+
+    entry = cache.get("a")
+    assert entry is not None
+    assert entry.files["data.dta"] == entry.files["copy.dta"]
+    assert cache.get("b") is None
+
+    cache.restore(entry, {"data.dta": data, "missing.dta": tmp_path / "missing.dta"})
+    assert data.read_bytes() == b"data"
+    assert not tmp_path.joinpath("missing.dta").exists()
+
+
+def test_evict_least_recently_used_entries(tmp_path):
+    cache = OutputCache(tmp_path / "cache")
+    for i, key in enumerate(("old", "used", "new")):
+        path = tmp_path / f"{key}.dta"
+        path.write_bytes(bytes([i]) * 10)
+        cache.put(key, f"task_{key}", {"data.dta": path})
+        entry = cache.directory / "entries" / f"{key}.json"
+        os.utime(entry, (i, i))
+    assert cache.get("used") is not None
+
+    cache.evict(max_size=20)
+
+    assert cache.get("old") is None
+    assert cache.get("used") is not None
+    assert cache.get("new") is not None
+    assert len(list(cache.directory.joinpath("objects").glob("*/*"))) == 2  # noqa: PLR2004
+
+
+@needs_stata
+def test_restore_products_in_fresh_clone(monkeypatch, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("data.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("set obs 2\ngenerate id = 1\nsave data\n")
+    options = {
+        "stata_output_cache": True,
+        "stata_output_cache_dir": tmp_path / "cache",
+        "stata_keep_log": True,
+    }
+
+    monkeypatch.setenv("STATA_MOCK_TIMESTAMP", "18 Oct 2026 14:05")
+    with restore_sys_path_and_module_after_test_execution():
+        session = build(paths=tmp_path, **options)
+    assert session.execution_reports[0].outcome == TaskOutcome.SUCCESS
+    content = tmp_path.joinpath("data.dta").read_bytes()
+
+    # A fresh clone has neither the products nor the database.
+    shutil.rmtree(tmp_path / ".pytask")
+    tmp_path.joinpath("data.dta").unlink()
+    monkeypatch.setenv("STATA_MOCK_TIMESTAMP", "19 Oct 2026 09:30")
+    with restore_sys_path_and_module_after_test_execution():
+        session = build(paths=tmp_path, **options)
+
+    assert session.exit_code == ExitCode.OK
+    assert session.execution_reports[0].outcome == TaskOutcome.PERSISTENCE
+    assert tmp_path.joinpath("data.dta").read_bytes() == content
+    assert tmp_path.joinpath("task_example_py_task_run_do_file.log").exists()
+
+    tmp_path.joinpath("script.do").write_text("set obs 3\ngenerate id = 1\nsave data\n")
+    with restore_sys_path_and_module_after_test_execution():
+        session = build(paths=tmp_path, **options)
+    assert session.execution_reports[0].outcome == TaskOutcome.SUCCESS
+
+
+@needs_stata
+def test_share_entries_between_clones_and_installations(monkeypatch, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(raw=Path("raw.txt"), produces=Path("data.dta")):
+        pass
+    """
+    options = {"stata_output_cache": True, "stata_output_cache_dir": tmp_path / "cache"}
+    monkeypatch.setenv("STATA_MOCK_TIMESTAMP", "18 Oct 2026 14:05")
+    for clone in ("a", "b"):
+        root = tmp_path / clone
+        root.mkdir()
+        root.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+        root.joinpath("script.do").write_text("set obs 2\ngenerate id = 1\nsave data\n")
+        root.joinpath("raw.txt").write_text("raw")
+
+    with restore_sys_path_and_module_after_test_execution():
+        session = build(paths=tmp_path / "a", **options)
+    assert session.execution_reports[0].outcome == TaskOutcome.SUCCESS
+
+    # The other clone has files with other modification times and Stata is called by
+    # its full path.
+    for path in (tmp_path / "b").iterdir():
+        os.utime(path, (0, 0))
+    executable = shutil.which(session.config["stata"])
+    with restore_sys_path_and_module_after_test_execution():
+        session = build(paths=tmp_path / "b", stata=executable, **options)
+
+    assert session.exit_code == ExitCode.OK
+    assert session.execution_reports[0].outcome == TaskOutcome.PERSISTENCE
@@ -80,3 +80,55 @@ def test_parallel_parametrization_over_source_file_w_loop(runner, tmp_path):
 
     result = runner.invoke(cli, [tmp_path.as_posix(), "-n", 2])
     assert result.exit_code == ExitCode.OK
+
+
+@needs_stata
+def test_parallel_tasks_sharing_a_do_file_write_own_logs(runner, tmp_path):
+    source = """
+    import pytask
+    from pathlib import Path
+    from pytask import task
+
+    for input_ in ("input", "missing"):
+
+        @task
+        @pytask.mark.stata(script=Path("script.do"), options=[input_, f"out_{input_}"])
+        def task_execute_do_file(produces=Path(f"out_{input_}.dta")):
+            pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("input.dta").touch()
+
+    do_file = """
+    args input output
+    sleep 300
+    use `input'
+    save `output'
+    """
+    tmp_path.joinpath("script.do").write_text(textwrap.dedent(do_file))
+
+    result = runner.invoke(
+        cli,
+        [
+            tmp_path.as_posix(),
+            "-n",
+            2,
+            "--stata-keep-log",
+            "--stata-log-dir",
+            tmp_path.joinpath("logs").as_posix(),
+        ],
+    )
+
+    assert result.exit_code == ExitCode.FAILED
+    assert tmp_path.joinpath("out_input.dta").exists()
+    assert "1  Succeeded" in result.output
+    assert "1  Failed" in result.output
+
+    logs = sorted(tmp_path.joinpath("logs").glob("*.log"))
+    assert [log.name for log in logs] == [
+        "task_example_py_task_execute_do_file[produces0].log",
+        "task_example_py_task_execute_do_file[produces1].log",
+    ]
+    assert "r(601)" not in logs[0].read_text()
+    assert "r(601)" in logs[1].read_text()
+    assert not list(tmp_path.glob("*.log"))
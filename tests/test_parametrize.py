@@ -1,9 +1,9 @@
 from __future__ import annotations
 
-import sys
 import textwrap
 
 from pytask import ExitCode
+from pytask import build
 from pytask import cli
 
 from tests.conftest import needs_stata
@@ -68,12 +68,35 @@ def test_parametrize_command_line_options_w_loop(runner, tmp_path):
     assert tmp_path.joinpath("output_1.dta").exists()
     assert tmp_path.joinpath("output_2.dta").exists()
 
-    if sys.platform == "win32":
-        assert tmp_path.joinpath(
-            "task_example_py_task_execute_do_file[produces0].log"
-        ).exists()
-        assert tmp_path.joinpath(
-            "task_example_py_task_execute_do_file[produces1].log"
-        ).exists()
-    else:
-        assert tmp_path.joinpath("script.log").exists()
+    assert tmp_path.joinpath(
+        "task_example_py_task_execute_do_file[produces0].log"
+    ).exists()
+    assert tmp_path.joinpath(
+        "task_example_py_task_execute_do_file[produces1].log"
+    ).exists()
+
+
+def test_parametrized_tasks_share_nodes(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+    from pytask import task
+
+    for i in range (1, 3):
+
+        @task
+        @pytask.mark.stata(script=Path("script.do"), options=f"output_{i}")
+        def task_execute_do_file(produces=Path(f"output_{i}.dta")):
+            pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").touch()
+
+    session = build(paths=tmp_path, dry_run=True)
+
+    assert session.exit_code == ExitCode.OK
+    first, second = session.tasks
+    for name in ("_script", "_executable", "_cwd"):
+        assert first.depends_on[name] is second.depends_on[name]
+    assert first.depends_on["_options"].load() == ["output_1"]
+    assert second.depends_on["_options"].load() == ["output_2"]
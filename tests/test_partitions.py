@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+
+from pytask_stata import read_dta_header
+from pytask_stata.frames import iter_dta
+from pytask_stata.frames import write_dta
+from pytask_stata.partitions import append_dta
+from pytask_stata.partitions import parse_partitioning
+from pytask_stata.partitions import split_dta
+from tests.conftest import needs_stata
+from tests.conftest import restore_sys_path_and_module_after_test_execution
+
+
+def _read(path):
+    columns = {}
+    for chunk in iter_dta(path):
+        for name, values in chunk.items():
+            columns.setdefault(name, []).extend(values)
+    return columns
+
+
+def test_split_by_key_and_append_partitions(tmp_path):
+    source = tmp_path / "data.dta"
+    ids = list(range(100))
+    groups = [f"g{i % 7}" for i in ids]
+    write_dta(
+        source, {"id": "long", "group": "str3"}, 100, [{"id": ids, "group": groups}]
+    )
+    targets = [tmp_path / f"part-{i}.dta" for i in range(3)]
+
+    counts = split_dta(source, targets, "group")
+
+    assert sum(counts) == 100  # noqa: PLR2004
+    seen: set[str] = set()
+    for target, count in zip(targets, counts, strict=True):
+        assert read_dta_header(target).n_obs == count
+        partition = set(_read(target).get("group", []))
+        assert not partition & seen
+        seen |= partition
+
+    append_dta(targets, tmp_path / "out.dta")
+    result = _read(tmp_path / "out.dta")
+    assert sorted(zip(result["id"], result["group"], strict=True)) == list(
+        zip(ids, groups, strict=True)
+    )
+
+
+def test_append_widens_types_of_partial_outputs(tmp_path):
+    first, second = tmp_path / "a.dta", tmp_path / "b.dta"
+    write_dta(first, {"id": "byte", "name": "str2"}, 1, [{"id": [1], "name": ["ab"]}])
+    write_dta(
+        second, {"id": "float", "name": "str4"}, 1, [{"id": [2.5], "name": ["abcd"]}]
+    )
+
+    append_dta([first, second], tmp_path / "out.dta")
+
+    header = read_dta_header(tmp_path / "out.dta")
+    assert [var.type for var in header.variables] == ["float", "str4"]
+    assert _read(tmp_path / "out.dta") == {"id": [1.0, 2.5], "name": ["ab", "abcd"]}
+
+
+@pytest.mark.parametrize(
+    ("partition_by", "n_partitions", "expectation"),
+    [
+        (None, 4, pytest.raises(ValueError, match="partition_by")),
+        ("id", None, pytest.raises(ValueError, match="'n_partitions' must be given")),
+        ("id", 0, pytest.raises(ValueError, match="at least 1")),
+        ("id", "4", pytest.raises(TypeError, match="integer")),
+    ],
+)
+def test_parse_invalid_partitioning(partition_by, n_partitions, expectation):
+    with expectation:
+        parse_partitioning(partition_by, n_partitions)
+
+
+@needs_stata
+def test_run_do_file_on_partitions(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(
+        script=Path("script.do"),
+        partition_by="id",
+        n_partitions=3,
+        expect={"out.dta": {"n_obs": 6}},
+    )
+    def task_run_do_file(data=Path("in.dta"), produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text(
+        "args input output\nuse `input'\nset obs 2\ngenerate long id = 1\n"
+        "save `output'\n"
+    )
+    write_dta(tmp_path / "in.dta", {"id": "long"}, 10, [{"id": list(range(10))}])
+
+    with restore_sys_path_and_module_after_test_execution():
+        session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    names = sorted(
+        report.task.name.rsplit("::", 1)[-1] for report in session.execution_reports
+    )
+    assert names == [
+        "task_run_do_file[append]",
+        "task_run_do_file[partition-0]",
+        "task_run_do_file[partition-1]",
+        "task_run_do_file[partition-2]",
+        "task_run_do_file[split]",
+    ]
+    assert read_dta_header(tmp_path / "out.dta").n_obs == 6  # noqa: PLR2004
+
+
+def test_raise_error_if_partitioned_task_has_multiple_datasets(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"), partition_by="id", n_partitions=2)
+    def task_run_do_file(
+        data=Path("a.dta"), other=Path("b.dta"), produces=Path("out.dta")
+    ):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("save data\n")
+    tmp_path.joinpath("a.dta").touch()
+    tmp_path.joinpath("b.dta").touch()
+
+    with restore_sys_path_and_module_after_test_execution():
+        session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.COLLECTION_FAILED
+    message = str(session.collection_reports[0].exc_info[1])
+    assert "must have exactly one argument with a .dta" in message
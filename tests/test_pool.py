@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import sys
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+from pytask import cli
+
+from pytask_stata.pool import PoolConfig
+from pytask_stata.pool import StataWorker
+from pytask_stata.pool import StataWorkerPool
+from tests.conftest import _find_stata_executable
+from tests.conftest import needs_stata
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="Stata's console mode is not available."
+)
+
+
+@needs_stata
+def test_run_do_files_in_pool(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+    from pytask import task
+
+    for i in range(3):
+
+        @task
+        @pytask.mark.stata(script="script.do", options=f"out_{i}")
+        def task_run_do_file(produces=Path(f"out_{i}.dta")):
+            pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+
+    do_file = """
+    args produces
+    sysuse auto, clear
+    save "`produces'"
+    """
+    tmp_path.joinpath("script.do").write_text(textwrap.dedent(do_file))
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-backend", "pool"])
+
+    assert result.exit_code == ExitCode.OK
+    for i in range(3):
+        assert tmp_path.joinpath(f"out_{i}.dta").exists()
+
+
+@needs_stata
+def test_run_do_file_in_pool_fails_with_stata_error(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script="script.do")
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("error 601\n")
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-backend", "pool"])
+
+    assert result.exit_code == ExitCode.FAILED
+    assert "r(601)" in result.output
+
+
+@needs_stata
+@pytest.mark.parametrize(("max_tasks", "n_sessions"), [(None, 1), (1, 3)])
+def test_pool_recycles_sessions_after_max_tasks(
+    monkeypatch, tmp_path, max_tasks, n_sessions
+):
+    tmp_path.joinpath("script.do").write_text("sysuse auto, clear\nsave out\n")
+
+    started = []
+
+    def _start_worker(executable):
+        started.append(executable)
+        return StataWorker(executable)
+
+    monkeypatch.setattr("pytask_stata.pool.StataWorker", _start_worker)
+    pool = StataWorkerPool(
+        _find_stata_executable(), PoolConfig(size=1, max_tasks=max_tasks)
+    )
+
+    try:
+        for _ in range(2):
+            return_code = pool.run(
+                tmp_path / "script.do", [], tmp_path, tmp_path / "script.log"
+            )
+            assert return_code == 0
+    finally:
+        pool.close()
+
+    assert len(started) == n_sessions
+    assert tmp_path.joinpath("out.dta").exists()
+    assert "save out" in tmp_path.joinpath("script.log").read_text()
+
+
+@pytest.mark.parametrize(
+    "options", [{"stata_max_concurrent": 2}, {"stata_license_retries": 3}]
+)
+def test_pool_backend_rejects_license_seats(tmp_path, options):
+    session = build(paths=tmp_path, stata_backend="pool", **options)
+
+    assert session.exit_code == ExitCode.CONFIGURATION_FAILED
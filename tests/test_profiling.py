@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import sys
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+from pytask import cli
+
+from pytask_stata.profiling import parse_profile
+from tests.conftest import needs_stata
+
+LOG = """\
+. set rmsg on
+r; t=0.00 10:00:00
+
+. do "script.do"
+
+. sysuse auto
+r; t=0.02 10:00:00
+
+. forvalues i = 1/2 {
+  2.     regress price mpg
+  3. }
+r; t=1.50 10:00:02
+
+. do sub
+. regress price mpg weight ///
+> foreign
+r; t=0.25 10:00:02
+
+. sysuse auto
+r; t=0.01 10:00:02
+
+end of do-file
+r; t=0.30 10:00:02
+
+. error 601
+r(601); t=0.00 10:00:02
+
+end of do-file
+"""
+
+
+def test_parse_profile():
+    source = ["sysuse auto", "forvalues i = 1/2 {", "regress price mpg", "}"]
+
+    profile = parse_profile(LOG.splitlines(), source)
+
+    assert [(entry.source, entry.line) for entry in profile] == [
+        ("forvalues i = 1/2 {", 2),
+        ("regress price mpg weight ///", None),
+        ("sysuse auto", 1),
+        ("error 601", None),
+    ]
+    assert profile[2].calls == 2  # noqa: PLR2004
+    assert profile[2].seconds == pytest.approx(0.03)
+    assert [entry.command for entry in profile] == [
+        "forvalues",
+        "regress",
+        "sysuse",
+        "error",
+    ]
+
+
+@needs_stata
+@pytest.mark.parametrize(
+    "backend",
+    [
+        "subprocess",
+        "async",
+        "batch",
+        pytest.param(
+            "pool",
+            marks=pytest.mark.skipif(
+                sys.platform == "win32", reason="Stata's console mode is not available."
+            ),
+        ),
+    ],
+)
+def test_profile_do_files(tmp_path, backend):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text(
+        "sysuse auto, clear\nsleep 300\ndo sub.do\nsave out\n"
+    )
+    tmp_path.joinpath("sub.do").write_text("sleep 100\n")
+
+    session = build(paths=tmp_path, stata_backend=backend, stata_profile=True)
+
+    assert session.exit_code == ExitCode.OK
+    profile = session.tasks[0].attributes["stata_profile"]
+    assert [(entry.source, entry.line) for entry in profile[:2]] == [
+        ("sleep 300", 2),
+        ("sleep 100", None),
+    ]
+    assert "do sub.do" not in [entry.source for entry in profile]
+
+
+@needs_stata
+def test_show_hot_commands(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+
+    @pytask.mark.stata(script=Path("failing.do"))
+    def task_fail(produces=Path("never.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("sleep 200\nsave out\n")
+    tmp_path.joinpath("failing.do").write_text("sleep 100\nerror 601\n")
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-profile"])
+
+    assert result.exit_code == ExitCode.FAILED
+    assert "Slowest Stata source lines" in result.output
+    assert "Hot Stata commands" in result.output
+    assert "sleep 200" in result.output
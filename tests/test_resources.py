@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import textwrap
+from types import SimpleNamespace
+
+from pytask import ExitCode
+from pytask import build
+
+from pytask_stata.resources import ResourceScheduler
+from pytask_stata.shared import StataResources
+from tests.conftest import needs_stata
+
+
+class _Scheduler:
+    """A minimal scheduler where all tasks are ready at once."""
+
+    def __init__(self, names, priorities=None):
+        self.dag = SimpleNamespace(nodes=list(names))
+        self.priorities = priorities or {}
+        self.blocked = set()
+        self._processing = set()
+
+    def get_ready(self, n=1):
+        ready = [
+            name
+            for name in self.dag.nodes
+            if name not in self._processing and name not in self.blocked
+        ]
+        ready = sorted(ready, key=lambda name: -self.priorities.get(name, 0))[:n]
+        self._processing.update(ready)
+        return list(reversed(ready))
+
+    def is_active(self):
+        return bool(self.dag.nodes)
+
+    def done(self, *nodes):
+        for node in nodes:
+            self.dag.nodes.remove(node)
+
+
+def test_scheduler_admits_tasks_within_budget():
+    scheduler = ResourceScheduler(
+        scheduler=_Scheduler(["a", "b", "c", "d"]),
+        resources={
+            "a": StataResources(cores=4),
+            "b": StataResources(cores=4),
+            "c": StataResources(cores=2, memory=8),
+        },
+        cores=8,
+        memory=4,
+    )
+
+    assert sorted(scheduler.get_ready(10)) == ["a", "b", "d"]
+    assert scheduler.get_ready(10) == []
+
+    scheduler.done("a", "b")
+    assert scheduler.get_ready(10) == ["c"]
+    scheduler.done("c", "d")
+    assert not scheduler.is_active()
+
+
+def test_scheduler_respects_number_of_requested_tasks():
+    scheduler = ResourceScheduler(
+        scheduler=_Scheduler(["a", "b"]),
+        resources={"a": StataResources(cores=1), "b": StataResources(cores=1)},
+        cores=8,
+    )
+
+    assert len(scheduler.get_ready(1)) == 1
+    assert len(scheduler.get_ready(1)) == 1
+    assert scheduler.get_ready(1) == []
+
+
+def test_scheduler_admits_pending_tasks_by_priority():
+    wrapped = _Scheduler(["a", "b", "c"], priorities={"a": 1, "b": 0, "c": 5})
+    wrapped.blocked.add("c")
+    scheduler = ResourceScheduler(
+        scheduler=wrapped,
+        resources={name: StataResources(cores=4) for name in "abc"},
+        cores=4,
+    )
+
+    assert scheduler.get_ready(10) == ["a"]
+
+    # The important task becomes ready after the other task is already pending.
+    wrapped.blocked.clear()
+    scheduler.done("a")
+    assert scheduler.get_ready(10) == ["c"]
+    scheduler.done("c")
+    assert scheduler.get_ready(10) == ["b"]
+
+
+@needs_stata
+def test_apply_resources_in_wrapper(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"), options="out", cores=2, memory="1G")
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    do_file = "args produces\nsysuse auto, clear\nsave `produces'\n"
+    tmp_path.joinpath("script.do").write_text(do_file)
+
+    session = build(paths=tmp_path, stata_keep_log=True, stata_cores=4)
+
+    assert session.exit_code == ExitCode.OK
+    log = tmp_path.joinpath("task_example_py_task_run_do_file.log").read_text()
+    assert ". set processors 2" in log
+    assert ". set max_memory 1g" in log
+    assert tmp_path.joinpath("out.dta").exists()
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import textwrap
+from pathlib import Path
+
+import pytest
+from pytask import ExitCode
+from pytask import TaskOutcome
+from pytask import build
+from pytask import cli
+
+from pytask_stata.scanner import ScanCache
+from pytask_stata.scanner import find_includes
+from pytask_stata.scanner import scan_do_file
+from tests.conftest import needs_stata
+
+DO_FILE = """
+args input output
+* Comments are ignored: use ignored.dta
+local dir "data"
+capture noisily use "`input'", clear /* inline comment */
+merge 1:1 id using `dir'/other, nogen
+append using "a.dta" ///
+    b
+import delimited using raw.csv, clear
+export delimited using "tables/out.csv", replace
+save "`output'", replace
+do helper
+include "`unknown'.do"
+"""
+
+
+def test_scan_do_file_and_resolve_targets():
+    result = scan_do_file(textwrap.dedent(DO_FILE))
+    resolved = result.resolve(["in.dta", "out.dta"], Path("/project"))
+
+    assert result.args == ["input", "output"]
+    assert resolved["dependency"] == [
+        Path("/project/in.dta"),
+        Path("/project/data/other.dta"),
+        Path("/project/a.dta"),
+        Path("/project/b.dta"),
+        Path("/project/raw.csv"),
+    ]
+    assert resolved["product"] == [
+        Path("/project/tables/out.csv"),
+        Path("/project/out.dta"),
+    ]
+    assert resolved["include"] == [Path("/project/helper.do")]
+
+
+@pytest.mark.parametrize(
+    ("source", "expected"),
+    [
+        ("use x if y > 1 using data, clear", [("dependency", "data")]),
+        ("qui: saveold old, version(13)", [("product", "old")]),
+        ("import excel sheet.xlsx, firstrow", [("dependency", "sheet.xlsx")]),
+        ('run `"my file.do"\'', [("include", "my file.do")]),
+        ("// save commented", []),
+        (r"save data\x.dta, replace", [("product", r"data\x.dta")]),
+        ('erase "scratch.dta"', [("erase", "scratch.dta")]),
+    ],
+)
+def test_scan_commands(source, expected):
+    assert scan_do_file(source).targets == expected
+
+
+def test_saved_and_erased_files_are_not_products():
+    source = "save scratch\nuse scratch\nerase scratch.dta\nsave out\nerase other.dta"
+    resolved = scan_do_file(source).resolve([], Path("/project"))
+
+    assert resolved["product"] == [Path("/project/out.dta")]
+    assert resolved["temporary"] == [Path("/project/scratch.dta")]
+
+
+def test_scan_cache_is_keyed_by_content(tmp_path, monkeypatch):
+    script = tmp_path.joinpath("script.do")
+    script.write_text("save out\n")
+    cache_path = tmp_path.joinpath(".pytask", "stata-scans.json")
+
+    cache = ScanCache(cache_path)
+    assert cache.scan(script).targets == [("product", "out")]
+    cache.save()
+
+    cached = ScanCache(cache_path)
+    monkeypatch.setattr("pytask_stata.scanner.scan_do_file", _fail)
+    assert cached.scan(script).targets == [("product", "out")]
+    monkeypatch.undo()
+
+    script.write_text("save other\n")
+    assert cached.scan(script).targets == [("product", "other")]
+
+
+def _fail(source):
+    msg = f"The do-file should not be scanned again: {source}"
+    raise AssertionError(msg)
+
+
+@needs_stata
+def test_infer_dependencies_and_products(runner, tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("first.do"))
+    def task_first():
+        pass
+
+    @pytask.mark.stata(script=Path("second.do"), options="out.dta")
+    def task_second():
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("first.do").write_text("sysuse auto, clear\nsave auto\n")
+    second = "args produces\nuse auto, clear\nsave `produces'\n"
+    tmp_path.joinpath("second.do").write_text(second)
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-infer-dependencies"])
+
+    assert result.exit_code == ExitCode.OK
+    assert tmp_path.joinpath("out.dta").exists()
+
+    session = build(paths=tmp_path, stata_infer_dependencies=True)
+
+    assert session.exit_code == ExitCode.OK
+    tasks = {task.name.rsplit("::")[-1]: task for task in session.tasks}
+    assert tasks["task_first"].produces["_inferred_products"][0].path == (
+        tmp_path / "auto.dta"
+    )
+    assert tasks["task_second"].depends_on["_inferred_dependencies"][0].path == (
+        tmp_path / "auto.dta"
+    )
+    assert all(
+        report.outcome == TaskOutcome.SKIP_UNCHANGED
+        for report in session.execution_reports
+    )
+
+
+@needs_stata
+def test_do_not_infer_erased_scratch_datasets(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text(
+        "sysuse auto, clear\nsave scratch\nuse scratch\nerase scratch.dta\nsave out\n"
+    )
+
+    session = build(paths=tmp_path, stata_infer_dependencies=True)
+
+    assert session.exit_code == ExitCode.OK
+    assert "_inferred_products" not in session.tasks[0].produces
+    assert not tmp_path.joinpath("scratch.dta").exists()
+
+
+def test_find_includes_follows_do_files_and_ado_files(tmp_path):
+    tmp_path.joinpath("main.do").write_text(
+        "args helper\ndo `helper'\nmycmd, replace\n"
+    )
+    tmp_path.joinpath("helper.do").write_text("include nested\ndo missing\n")
+    tmp_path.joinpath("nested.do").write_text("do helper\n")
+    ado = tmp_path.joinpath("ado", "m", "mycmd.ado")
+    ado.parent.mkdir(parents=True)
+    ado.write_text("program mycmd\n    othercmd\nend\n")
+    tmp_path.joinpath("ado", "othercmd.ado").write_text("program othercmd\nend\n")
+
+    includes = find_includes(
+        ScanCache(),
+        tmp_path / "main.do",
+        ["helper"],
+        tmp_path,
+        [tmp_path / "ado"],
+    )
+
+    assert includes == [
+        tmp_path / "helper.do",
+        ado,
+        tmp_path / "nested.do",
+        tmp_path / "ado" / "othercmd.ado",
+    ]
+
+
+@needs_stata
+def test_rerun_task_if_included_do_file_changes(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+
+    @pytask.mark.stata(script=Path("script.do"))
+    def task_run_do_file(produces=Path("out.dta")):
+        pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("script.do").write_text("do helper\n")
+    tmp_path.joinpath("helper.do").write_text("include nested\n")
+    tmp_path.joinpath("nested.do").write_text("sysuse auto, clear\nsave out\n")
+
+    session = build(paths=tmp_path, stata_track_includes=True)
+    assert session.execution_reports[0].outcome == TaskOutcome.SUCCESS
+
+    session = build(paths=tmp_path, stata_track_includes=True)
+    assert session.execution_reports[0].outcome == TaskOutcome.SKIP_UNCHANGED
+
+    tmp_path.joinpath("nested.do").write_text("sysuse auto, clear\nsave out, replace\n")
+    session = build(paths=tmp_path, stata_track_includes=True)
+    assert session.execution_reports[0].outcome == TaskOutcome.SUCCESS
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+
+from pytask_stata.seats import SeatLimiter
+from pytask_stata.seats import run_with_seat
+from tests.conftest import needs_stata
+
+
+def test_limiter_never_exceeds_the_number_of_seats(tmp_path):
+    limiter = SeatLimiter(directory=tmp_path, n_seats=2)
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def _run(_):
+        with limiter.seat():
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        list(executor.map(_run, range(6)))
+
+    assert max(max_running) == 2  # noqa: PLR2004
+
+
+def test_retry_if_license_is_busy(tmp_path, monkeypatch):
+    monkeypatch.setattr("pytask_stata.seats.RETRY_DELAY", 0)
+    log = tmp_path.joinpath("script.log")
+    attempts = []
+
+    def _run():
+        attempts.append(1)
+        if len(attempts) < 3:  # noqa: PLR2004
+            log.write_text("License not available: maximum number of users reached.\n")
+        else:
+            log.write_text("end of do-file\n")
+        return len(attempts)
+
+    assert run_with_seat(_run, None, log, retries=2) == 3  # noqa: PLR2004
+
+    attempts.clear()
+    with pytest.raises(RuntimeError, match="No Stata license was available"):
+        run_with_seat(_run, None, log, retries=1)
+
+
+@needs_stata
+def test_run_tasks_with_limited_seats(tmp_path):
+    task_source = """
+    import pytask
+    from pathlib import Path
+    from pytask import task
+
+    for i in range(2):
+
+        @task
+        @pytask.mark.stata(script=Path("script.do"), options=f"out_{i}")
+        def task_run_do_file(produces=Path(f"out_{i}.dta")):
+            pass
+    """
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(task_source))
+    do_file = "args produces\nsysuse auto, clear\nsave `produces'\n"
+    tmp_path.joinpath("script.do").write_text(do_file)
+
+    session = build(paths=tmp_path, stata_max_concurrent=1)
+
+    assert session.exit_code == ExitCode.OK
+    assert tmp_path.joinpath(".pytask", "stata-seats", "seat-0.lock").exists()
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import csv
+import json
+import sys
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+from pytask import cli
+
+from tests.conftest import needs_stata
+
+TASK_SOURCE = """
+import pytask
+from pathlib import Path
+from pytask import task
+
+for i in range(2):
+
+    @task
+    @pytask.mark.stata(script=Path("script.do"), options=f"out_{i}")
+    def task_run_do_file(produces=Path(f"out_{i}.dta")):
+        pass
+"""
+
+DO_FILE = "args produces\nsysuse auto, clear\nsave `produces'\n"
+
+
+@needs_stata
+def test_show_slowest_stata_tasks(runner, tmp_path):
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(TASK_SOURCE))
+    tmp_path.joinpath("script.do").write_text(DO_FILE)
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--stata-slowest", "1"])
+
+    assert result.exit_code == ExitCode.OK
+    assert "Slowest Stata tasks" in result.output
+    assert not list(tmp_path.joinpath(".pytask", "stata-usage").iterdir())
+
+
+@needs_stata
+@pytest.mark.parametrize("suffix", [".json", ".csv"])
+def test_write_usage_file(tmp_path, suffix):
+    tmp_path.joinpath("task_example.py").write_text(textwrap.dedent(TASK_SOURCE))
+    tmp_path.joinpath("script.do").write_text(DO_FILE)
+
+    session = build(paths=tmp_path, stata_usage_file=f"usage{suffix}")
+
+    assert session.exit_code == ExitCode.OK
+    for task in session.tasks:
+        usage = task.attributes["stata_usage"]
+        assert usage.wall_time > 0
+        if sys.platform != "win32":
+            assert usage.max_rss > 0
+
+    path = tmp_path.joinpath(f"usage{suffix}")
+    if suffix == ".csv":
+        with path.open() as file:
+            rows = list(csv.DictReader(file))
+    else:
+        rows = json.loads(path.read_text())
+    assert {row["task"] for row in rows} == {task.name for task in session.tasks}